@@ -0,0 +1,228 @@
+"""
+Offline end-to-end benchmark: run_multistep_review against a MockProvider.
+
+    sdra bench requirements vulnerable_applications/dvwa --latency 2 --jitter 0.5 --tokens-per-s 80
+
+Every model call (fan-out, merge, evaluation, slices, report, diagram conversion)
+goes through the real SDK clients to an in-process mock that answers like the
+pipeline's models would, with configurable latency, jitter, speed and errors.
+Each run works on a fresh copy of the design folder, so parsing is cold and the
+inputs are never written to.
+"""
+import hashlib
+import json
+import shutil
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from time import perf_counter
+from typing import Optional, List, Dict, Any
+
+from .client_pool import ClientPool
+from .config import Config
+from .json_merger import extract_json
+from .mock_provider import MOCK_API_KEY, MockBehavior, MockProvider, MockRequest, Responder
+from .model_router import ModelRouter
+from .phase1_sharding import STRIDE_ORDER
+from .phase2_engine import DREAD_FACTORS, SliceResult, assemble, assign_threats, parse_slice, plan_slices
+from .response_cache import ResponseCache
+from .simplified_sdra import SimplifiedSecurityDesignReviewAgent
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+RECORDED_PHASE1 = PROJECT_ROOT / "firstphaseunmergedoutputs.json"
+
+CONTROLS = {
+    "S": "Enforce strong authentication", "T": "Verify message integrity", "R": "Keep tamper-evident audit logs",
+    "I": "Encrypt sensitive data", "D": "Rate-limit requests", "E": "Enforce least privilege",
+}
+MOCK_MERMAID = "flowchart TD\n  U[User] -->|HTTPS| W[Web Application]\n  W -->|SQL| D[(Database)]"
+
+
+def default_corpus(root: str | Path = PROJECT_ROOT) -> List[Path]:
+    """requirements/ plus every application folder under vulnerable_applications/."""
+    root = Path(root)
+    folders = [root / "requirements"] if (root / "requirements").is_dir() else []
+    apps = root / "vulnerable_applications"
+    if apps.is_dir():
+        folders += sorted(p for p in apps.iterdir() if p.is_dir())
+    return folders
+
+
+def _payload(text: str, marker: str) -> Any:
+    """The JSON value that follows marker in a prompt."""
+    start = text.find("{", text.find(marker))
+    return json.JSONDecoder().raw_decode(text[start:])[0]
+
+
+def _score(*parts: str) -> int:
+    """Deterministic pseudo-random 0-255 from the IDs, so answers are stable run to run."""
+    return hashlib.sha256("/".join(parts).encode("utf-8")).digest()[0]
+
+
+def _slice_answer(payload: Dict[str, Any]) -> Dict[str, Any]:
+    ratings, mitigations = [], []
+    for t in payload.get("threats") or []:
+        tid = t["threat_id"]
+        ratings.append({"threat_id": tid, "dread": {f: 1 + _score(tid, f) % 10 for f in DREAD_FACTORS},
+                        "rationale": f"Mock rating for {t.get('stride')} on {t.get('element_id')}."})
+        mitigations.append({"title": f"{CONTROLS.get(t.get('stride'), 'Mitigate')} for {t.get('element_id')}",
+                            "description": "Mock control.", "threat_ids": [tid], "nist_csf": ["PR.AC-1"],
+                            "effort": "SML"[_score(tid) % 3]})
+    annotations = [{"element_id": e.get("id"), "note": "Mock annotation."} for e in payload.get("elements") or []]
+    return {"ratings": ratings, "mitigations": mitigations, "annotations": annotations}
+
+
+def _shard_answer(payload: Dict[str, Any]) -> Dict[str, Any]:
+    rows = [{"element_id": e["id"], "stride": c, "applies": _score(e["id"], c) % 2 == 0,
+             "example": f"Mock {c} threat against {e.get('label') or e['id']}.",
+             "evidence": [{"source_type": "assumption", "source_id": "ASSUMP-001"}]}
+            for e in payload.get("elements") or [] for c in STRIDE_ORDER]
+    return {"rows": rows}
+
+
+def _phase2_answer(phase1: Any) -> Dict[str, Any]:
+    """Monolithic Phase 2 fallback: the fan-out engine's output, built from mock slice answers."""
+    if not isinstance(phase1, dict):
+        return {}
+    slices = plan_slices(phase1, assign_threats(phase1))
+    results: Dict[int, SliceResult] = {}
+    for s in slices:
+        payload = {"elements": s.elements, "threats": [asdict(t) for t in s.threats]}
+        results[s.index] = parse_slice(json.dumps(_slice_answer(payload)), s)
+    return assemble(phase1, slices, results)
+
+
+def review_scenario(recorded: Optional[List[str]] = None) -> Responder:
+    """
+    Responder that answers every prompt of the review pipeline plausibly: recorded
+    Phase 1 outputs (firstphaseunmergedoutputs.json by default, one per request in
+    turn), synthesized shard/slice answers for the IDs actually asked about, a
+    pass-through merge, no suggestions from the evaluator and a small HTML report.
+    """
+    if recorded is None:
+        recorded = json.loads(RECORDED_PHASE1.read_text(encoding="utf-8")) if RECORDED_PHASE1.exists() else []
+    docs = [d for d in (extract_json(r) for r in recorded) if isinstance(d, dict)]
+    counter = {"phase1": 0}
+
+    def phase1_doc() -> Dict[str, Any]:
+        if not docs:
+            return {}
+        doc = docs[counter["phase1"] % len(docs)]
+        counter["phase1"] += 1
+        return doc
+
+    def respond(req: MockRequest) -> str:
+        system, user = req.system, req.user
+        if system.startswith("Convert architecture diagrams"):
+            return MOCK_MERMAID
+        if "does not satisfy the required JSON schemas" in user:
+            return next((m["content"] for m in reversed(req.messages) if m["role"] == "assistant"), "{}")
+        if "PATCH MODE" in user:
+            return json.dumps({"patches": []})
+        if "SLICE (rate ONLY" in user:
+            return json.dumps(_slice_answer(_payload(user, "SLICE (")))
+        if "SHARD (produce all six" in user:
+            return json.dumps(_shard_answer(_payload(user, "SHARD (")))
+        if "senior application security reviewer" in system:
+            return json.dumps({"suggestions": []}) if req.response_schema else "None"
+        if "senior data engineer" in system:
+            return json.dumps(_payload(user, "-- JSON #1 --")) if "-- JSON #1 --" in user else "{}"
+        if "Report generator" in system:
+            return "<html><body><h1>Security Design Review (mock)</h1></body></html>"
+        if "Context (inputs produced by earlier steps):" in user:
+            return json.dumps(_phase2_answer(extract_json(user.split("Context (inputs produced by earlier steps):", 1)[1])))
+        if '- "dfds"' in system and '- "stride_matrix"' not in system:
+            doc = phase1_doc()
+            return json.dumps({k: v for k, v in doc.items() if k in ("trust_boundaries", "dfds")})
+        return json.dumps(phase1_doc())
+    return respond
+
+
+@dataclass
+class BenchmarkResult:
+    folder: str
+    run: int
+    status: str                                        # "ok" | "failed"
+    wall_s: float
+    stages: Dict[str, float] = field(default_factory=dict)
+    calls: int = 0
+    failures: int = 0
+    retries: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    error: Optional[str] = None
+
+    @property
+    def tokens_per_s(self) -> float:
+        return round((self.prompt_tokens + self.completion_tokens) / self.wall_s, 1) if self.wall_s else 0.0
+
+
+async def run_benchmark(
+    folders: List[str | Path],
+    output_root: str | Path = "runs/bench",
+    behavior: Optional[MockBehavior] = None,
+    runs: int = 1,
+    responder: Optional[Responder] = None,
+    sharding: str = "auto",
+) -> List[BenchmarkResult]:
+    """Review each folder `runs` times against a fresh MockProvider; one result per review."""
+    output_root = Path(output_root)
+    results: List[BenchmarkResult] = []
+    for folder in folders:
+        folder = Path(folder)
+        for run in range(1, runs + 1):
+            work = output_root / f"{folder.name}-{run}"
+            if work.exists():
+                shutil.rmtree(work)
+            design = work / "design"
+            shutil.copytree(folder, design)
+
+            provider = MockProvider(responder=responder or review_scenario(), behavior=behavior or MockBehavior())
+            pool = ClientPool(transport=provider.transport())
+            cache = ResponseCache(path=work / "responses.sqlite3")
+            agent = SimplifiedSecurityDesignReviewAgent(
+                client_pool=pool,
+                response_cache=cache,
+                output_dir=work / "run",
+                config=Config(openai_api_key=MOCK_API_KEY, anthropic_api_key=MOCK_API_KEY),
+            )
+            agent.router = ModelRouter(telemetry=agent.telemetry)  # default routes, no history from real runs
+            agent.phase1_sharding = sharding
+            t0 = perf_counter()
+            status, error = "ok", None
+            try:
+                await agent.run_multistep_review(bypass_cache=True, folder=str(design), run_dir=str(work / "run"))
+            except Exception as e:
+                status, error = "failed", f"{e.__class__.__name__}: {e}"
+                print(f"❌ {folder.name} run {run}: {error}")
+            finally:
+                await agent.aclose()
+                await pool.aclose()
+                cache.close()
+            totals = agent.telemetry.summary()
+            results.append(BenchmarkResult(
+                folder=folder.name, run=run, status=status, wall_s=round(perf_counter() - t0, 3),
+                stages=totals["stages"], calls=totals["totals"]["calls"], failures=totals["totals"]["failures"],
+                retries=totals["totals"]["retries"], prompt_tokens=totals["totals"]["prompt_tokens"],
+                completion_tokens=totals["totals"]["completion_tokens"], error=error,
+            ))
+    return results
+
+
+def format_results(results: List[BenchmarkResult]) -> str:
+    """Plain-text table: wall time, per-stage time and token throughput per review."""
+    stages = list(dict.fromkeys(s for r in results for s in r.stages))
+    header = ["folder", "run", "status", "wall_s"] + [f"{s}_s" for s in stages] + ["calls", "retries", "tokens", "tok/s"]
+    rows = [[r.folder, str(r.run), r.status, f"{r.wall_s:.2f}"]
+            + [f"{r.stages[s]:.2f}" if s in r.stages else "-" for s in stages]
+            + [str(r.calls), str(r.retries), str(r.prompt_tokens + r.completion_tokens), f"{r.tokens_per_s:.0f}"]
+            for r in results]
+    widths = [max(len(x) for x in col) for col in zip(header, *rows)]
+    return "\n".join("  ".join(x.ljust(w) for x, w in zip(line, widths)) for line in [header] + rows)
+
+
+def write_results(results: List[BenchmarkResult], path: str | Path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps([{**asdict(r), "tokens_per_s": r.tokens_per_s} for r in results], indent=2),
+                    encoding="utf-8")
+    return path
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import lzma
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Deque, Iterator
+
+CASSETTE_NAME = "cassette.jsonl.xz"
+FORMAT = "sdra-cassette"
+VERSION = 1
+
+
+class CassetteMiss(KeyError):
+    """Replay found no recorded response for a request (usually: the prompt changed)."""
+
+
+class ReplayedError(RuntimeError):
+    """A call that failed while recording fails the same way on replay."""
+
+
+@dataclass
+class Interaction:
+    """One recorded model request and its outcome."""
+    key: str
+    kind: str                      # "chat" | "json" | "stream" | "prompt" | "convert"
+    model: str
+    provider: str
+    request: Any                   # messages, or a description of the diagram for "convert"
+    response: Optional[str] = None
+    error: Optional[str] = None
+    latency_s: float = 0.0
+    usage: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class Cassette:
+    """
+    Every model request/response of a run, with timing, in an xz-compressed JSONL file
+    (the repeated requirements text in each prompt compresses away).
+    mode="record" collects interactions and save() writes them; mode="replay" (see load)
+    answers each request from the tape instead of the provider, in recorded order for
+    identical requests, and raises CassetteMiss for a request that was never recorded.
+    """
+    path: Path
+    mode: str = "record"           # "record" | "replay"
+    meta: Dict[str, Any] = field(default_factory=dict)
+    interactions: List[Interaction] = field(default_factory=list)
+    played: int = 0
+    misses: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        if self.mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode '{self.mode}'")
+        self.path = Path(self.path)
+        self._lock = threading.Lock()  # diagram conversions record from a worker thread
+        self._queues: Dict[str, Deque[Interaction]] = defaultdict(deque)
+        for i in self.interactions:
+            self._queues[i.key].append(i)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    # --- record ---
+    def record(self, interaction: Interaction) -> None:
+        if self.replaying:
+            return
+        with self._lock:
+            self.interactions.append(interaction)
+
+    @contextmanager
+    def taping(self, key: str, kind: str, model: str, provider: str, request: Any,
+               rec: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Record the call made inside the block: set tape["response"] before leaving it.
+        A failure is recorded with its error; cancellation and abandoned streams are not.
+        usage and latency are read from rec (a CallRecord) afterwards.
+        """
+        tape: Dict[str, Any] = {"response": None}
+        started = time.perf_counter()
+        error = None
+        try:
+            yield tape
+        except Exception as e:
+            error = f"{e.__class__.__name__}: {e}"
+            raise
+        finally:
+            if error is not None or tape["response"] is not None:
+                self.record(Interaction(
+                    key=key, kind=kind, model=model, provider=provider, request=request,
+                    response=tape["response"], error=error,
+                    latency_s=round(time.perf_counter() - started, 3),
+                    usage={k: getattr(rec, k, 0) for k in ("prompt_tokens", "completion_tokens", "cached_tokens")},
+                ))
+
+    # --- replay ---
+    def play(self, key: str, label: str = "") -> Interaction:
+        """Next recorded interaction for key; the last one repeats once its queue is drained."""
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                self.misses.append(label or key[:12])
+                raise CassetteMiss(f"No recorded response for {label or key[:12]} in {self.path} (prompt changed?)")
+            hit = queue.popleft() if len(queue) > 1 else queue[0]
+            self.played += 1
+        return hit
+
+    # --- storage ---
+    def save(self) -> Path:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        header = {"format": FORMAT, "version": VERSION, "created": datetime.now().isoformat(timespec="seconds"),
+                  **self.meta}
+        with self._lock:
+            lines = [json.dumps(header, ensure_ascii=False)]
+            lines += [json.dumps(asdict(i), ensure_ascii=False) for i in self.interactions]
+        with lzma.open(self.path, "wt", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return self.path
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Cassette":
+        """A replaying cassette; path may be the file or the run directory holding it."""
+        p = Path(path)
+        if p.is_dir():
+            p = p / CASSETTE_NAME
+        with lzma.open(p, "rt", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if not lines or lines[0].get("format") != FORMAT:
+            raise ValueError(f"{p} is not an SDRA cassette")
+        meta = {k: v for k, v in lines[0].items() if k not in ("format", "version", "created")}
+        return cls(path=p, mode="replay", meta=meta, interactions=[Interaction(**d) for d in lines[1:]])
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "path": str(self.path), "interactions": len(self.interactions),
+                "played": self.played, "misses": len(self.misses)}
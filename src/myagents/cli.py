@@ -0,0 +1,259 @@
+# src/myagents/cli.py
+"""
+Headless entry point:
+
+    sdra review <folder> [<folder> ...] [--manifest folders.txt] [--output-root runs]
+    sdra bench [<folder> ...] [--runs 3] [--latency 2 --jitter 0.5 --tokens-per-s 80 --error-rate 0.05]
+
+Reviews run concurrently in one event loop. They share a connection pool and
+response cache; --concurrency caps how many reviews are in flight and the
+per-provider flags cap in-flight model requests across all of them
+(--rate-limit sets their requests/tokens per minute budgets).
+`bench` runs the same pipeline offline against a mock provider (see benchmark.py).
+"""
+import argparse
+import asyncio
+import json
+import sys
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Optional, List, Dict
+
+from .client_pool import ClientPool, PoolLimits
+from .response_cache import ResponseCache
+from .rate_limiter import RateLimiterRegistry, parse_limit
+from .completion import CompletionPolicy, LatencyTracker, COMPLETION_MODES
+from .model_router import DEFAULT_ROUTES, ModelRouter, load_history
+from .simplified_sdra import SimplifiedSecurityDesignReviewAgent, PIPELINE_STAGES
+from .mock_provider import MockBehavior
+from .benchmark import default_corpus, format_results, run_benchmark, write_results
+from .cassette import CASSETTE_NAME, Cassette
+
+DEFAULT_PROVIDER_LIMITS = {"openai": 4, "anthropic": 2, "google": 2, "deepseek": 2}
+
+
+@dataclass
+class ReviewResult:
+    folder: str
+    run_dir: str
+    status: str               # "ok" | "failed"
+    seconds: float
+    error: Optional[str] = None
+
+
+def read_manifest(path: str | Path) -> List[str]:
+    """
+    Folders to review, from either a JSON list (strings or {"folder": ...} objects)
+    or a text file with one folder per line ('#' starts a comment).
+    Relative paths are resolved against the manifest's directory.
+    """
+    p = Path(path)
+    text = p.read_text(encoding="utf-8")
+    if p.suffix.lower() == ".json":
+        entries = [e["folder"] if isinstance(e, dict) else e for e in json.loads(text)]
+    else:
+        entries = [line.split("#", 1)[0].strip() for line in text.splitlines()]
+    return [str((p.parent / e) if not Path(e).is_absolute() else Path(e)) for e in entries if e]
+
+
+def run_dir_for(folder: str, output_root: str | Path) -> Path:
+    return Path(output_root) / SimplifiedSecurityDesignReviewAgent.default_run_dir(folder).name
+
+
+async def run_batch(
+    folders: List[str],
+    output_root: str | Path = "runs",
+    concurrency: int = 2,
+    provider_limits: Optional[Dict[str, int]] = None,
+    resume_from: Optional[str] = None,
+    bypass_cache: bool = False,
+    trace: bool = False,
+    completion: Optional[CompletionPolicy] = None,
+    shard_phase1: Optional[str] = None,
+    routes_file: Optional[str] = None,
+    record: bool = False,
+    replay: Optional[str] = None,
+    rate_limits: Optional[List[str]] = None,
+) -> List[ReviewResult]:
+    """
+    Review every folder; one failed review does not stop the others. Results keep input order.
+    record saves a cassette of every model call into each run directory; replay (a cassette,
+    or the run directory holding one) re-runs every stage from it instead of the providers.
+    """
+    if replay and len(folders) > 1:
+        raise ValueError("replay re-runs a single recorded review; give one folder")
+    limits = {**DEFAULT_PROVIDER_LIMITS, **(provider_limits or {})}
+    provider_sems = {name: asyncio.Semaphore(max(1, n)) for name, n in limits.items()}
+    reviews = asyncio.Semaphore(max(1, concurrency))
+    pool = ClientPool(limits=PoolLimits())
+    cache = ResponseCache()
+    # one RPM/TPM budget per provider/model across every review; rate_limits: 'provider[/model]=RPM:TPM'
+    rate_limiters = RateLimiterRegistry.with_overrides(rate_limits or [])
+    latencies = LatencyTracker()           # shared, so hedging learns from every review's calls
+    routes = ModelRouter.from_file(routes_file).routes if routes_file else dict(DEFAULT_ROUTES)
+    history = load_history(output_root)    # model latency/errors/cost from earlier runs under output_root
+
+    async def _review(folder: str) -> ReviewResult:
+        run_dir = run_dir_for(folder, output_root)
+        async with reviews:
+            print(f"🚀 Reviewing {folder} -> {run_dir}")
+            start = perf_counter()
+            agent = SimplifiedSecurityDesignReviewAgent(
+                client_pool=pool,
+                response_cache=cache,
+                provider_limits=provider_sems,
+                output_dir=run_dir,
+                rate_limiters=rate_limiters,
+            )
+            agent.telemetry.export_spans = trace
+            agent.latencies = latencies
+            agent.router = ModelRouter(routes=routes, history=history, telemetry=agent.telemetry)
+            if completion is not None:
+                agent.completion_policy = completion
+            if shard_phase1 is not None:
+                agent.phase1_sharding = shard_phase1
+            if record:
+                agent.cassette = Cassette(run_dir / CASSETTE_NAME)
+            elif replay:
+                agent.cassette = Cassette.load(replay)
+            try:
+                await agent.run_multistep_review(
+                    bypass_cache=bypass_cache,
+                    folder=folder,
+                    run_dir=str(run_dir),
+                    resume_from=resume_from or ("parse" if replay else None),  # replay re-runs every stage
+                )
+                status, error = "ok", None
+            except Exception as e:
+                status, error = "failed", f"{e.__class__.__name__}: {e}"
+                print(f"❌ {folder}: {error}")
+            finally:
+                await agent.aclose()
+            return ReviewResult(folder=folder, run_dir=str(run_dir), status=status,
+                                seconds=round(perf_counter() - start, 2), error=error)
+
+    try:
+        results = await asyncio.gather(*(_review(f) for f in folders))
+    finally:
+        await pool.aclose()
+        cache.close()
+
+    summary_path = Path(output_root) / "batch_summary.json"
+    summary_path.parent.mkdir(parents=True, exist_ok=True)
+    summary = {
+        "finished": datetime.now().isoformat(timespec="seconds"),
+        "reviews": [asdict(r) for r in results],
+    }
+    summary_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    print(f"📊 {sum(r.status == 'ok' for r in results)}/{len(results)} reviews succeeded; summary: {summary_path}")
+    return results
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="sdra", description="Simplified Security Design Review Agent")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    review = sub.add_parser("review", help="review one or more design folders without any UI")
+    review.add_argument("folders", nargs="*", help="design folders to review")
+    review.add_argument("--manifest", help="file listing design folders (text, one per line, or a JSON list)")
+    review.add_argument("--output-root", default="runs", help="parent of the per-review run directories")
+    review.add_argument("--concurrency", type=int, default=2, help="reviews in flight at once")
+    review.add_argument("--openai-concurrency", type=int, default=DEFAULT_PROVIDER_LIMITS["openai"],
+                        help="in-flight OpenAI requests across all reviews")
+    review.add_argument("--anthropic-concurrency", type=int, default=DEFAULT_PROVIDER_LIMITS["anthropic"],
+                        help="in-flight Anthropic requests across all reviews")
+    review.add_argument("--rate-limit", action="append", default=[], metavar="PROVIDER[/MODEL]=RPM:TPM",
+                        help="requests/tokens per minute budget, e.g. anthropic=50:80000 "
+                             "(repeatable; an empty side is unlimited)")
+    review.add_argument("--resume-from", choices=PIPELINE_STAGES,
+                        help="re-run this stage and every stage after it")
+    review.add_argument("--no-cache", action="store_true", help="bypass cached LLM responses")
+    review.add_argument("--trace", action="store_true", help="also export OpenTelemetry-style spans.jsonl per run")
+    review.add_argument("--completion", choices=COMPLETION_MODES, default="all",
+                        help="when a round stops waiting for models: all, first_n valid, or quorum by deadline")
+    review.add_argument("--min-valid", type=int, default=1, help="valid outputs needed for first_n / quorum")
+    review.add_argument("--deadline", type=float, help="quorum: seconds to keep waiting for more models")
+    review.add_argument("--shard-phase1", choices=("auto", "on", "off"), default="auto",
+                        help="split Phase 1 into an inventory pass and per-boundary STRIDE shards (auto: large designs)")
+    review.add_argument("--routes", help="JSON file overriding per-stage model routes (fanout, merge, evaluate, report, vision)")
+    review.add_argument("--hedge", action="store_true",
+                        help="duplicate requests that run past the model's p90 latency")
+    tape = review.add_mutually_exclusive_group()
+    tape.add_argument("--record", action="store_true",
+                      help=f"save every model request/response to <run dir>/{CASSETTE_NAME}")
+    tape.add_argument("--replay", metavar="CASSETTE",
+                      help="re-run a recorded review offline from its cassette (file or run dir)")
+
+    bench = sub.add_parser("bench", help="time the full review offline against a mock provider")
+    bench.add_argument("folders", nargs="*", help="design folders (default: requirements/ and vulnerable_applications/*)")
+    bench.add_argument("--output-root", default="runs/bench", help="where run copies and benchmark.json are written")
+    bench.add_argument("--runs", type=int, default=1, help="reviews per folder")
+    bench.add_argument("--latency", type=float, default=0.0, help="mock time to first token, seconds")
+    bench.add_argument("--jitter", type=float, default=0.0, help="+/- uniform noise on --latency, seconds")
+    bench.add_argument("--tokens-per-s", type=float, help="mock generation speed (default: instant)")
+    bench.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with --error-status")
+    bench.add_argument("--error-status", type=int, default=503)
+    bench.add_argument("--seed", type=int, help="seed for jitter and injected errors")
+    bench.add_argument("--shard-phase1", choices=("auto", "on", "off"), default="auto")
+    return parser
+
+
+def bench_main(args: argparse.Namespace) -> int:
+    folders = args.folders or default_corpus()
+    behavior = MockBehavior(latency_s=args.latency, jitter_s=args.jitter, tokens_per_s=args.tokens_per_s,
+                            error_rate=args.error_rate, error_status=args.error_status, seed=args.seed)
+    results = asyncio.run(run_benchmark(folders, args.output_root, behavior, args.runs, sharding=args.shard_phase1))
+    print(format_results(results))
+    print(f"📊 Benchmark results: {write_results(results, Path(args.output_root) / 'benchmark.json')}")
+    return 0 if all(r.status == "ok" for r in results) else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.command == "bench":
+        return bench_main(args)
+
+    folders = list(args.folders)
+    if args.replay and not folders and not args.manifest:
+        recorded = Cassette.load(args.replay).meta.get("folder")
+        folders = [recorded] if recorded else []
+    if args.manifest:
+        folders += read_manifest(args.manifest)
+    folders = list(dict.fromkeys(folders))  # drop duplicates, keep order
+    if not folders:
+        parser.error("give at least one design folder or --manifest")
+    if args.replay and len(folders) > 1:
+        parser.error("--replay re-runs one recorded review; give a single folder")
+    for spec in args.rate_limit:
+        try:
+            parse_limit(spec)
+        except ValueError as e:
+            parser.error(str(e))
+    missing = [f for f in folders if not Path(f).is_dir()]
+    if missing:
+        parser.error(f"not a directory: {', '.join(missing)}")
+
+    results = asyncio.run(run_batch(
+        folders,
+        output_root=args.output_root,
+        concurrency=args.concurrency,
+        provider_limits={"openai": args.openai_concurrency, "anthropic": args.anthropic_concurrency},
+        resume_from=args.resume_from,
+        bypass_cache=args.no_cache,
+        trace=args.trace,
+        completion=CompletionPolicy(mode=args.completion, min_valid=args.min_valid,
+                                    deadline_s=args.deadline, hedge=args.hedge),
+        shard_phase1=args.shard_phase1,
+        routes_file=args.routes,
+        record=args.record,
+        replay=args.replay,
+        rate_limits=args.rate_limit,
+    ))
+    return 0 if all(r.status == "ok" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
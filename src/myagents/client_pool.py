@@ -0,0 +1,86 @@
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Tuple, Any
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient as OpenAIHttpxClient
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient as AnthropicHttpxClient
+
+ClientKey = Tuple[str, str, Optional[str]]  # (provider, api_key, base_url)
+
+
+@dataclass
+class PoolLimits:
+    max_connections: int = 20             # total sockets per client
+    max_keepalive_connections: int = 10   # idle sockets kept warm between calls
+    keepalive_expiry: float = 120.0       # seconds an idle socket is kept open
+    timeout: float = 600.0                # phase prompts can take minutes
+    max_retries: int = 0                  # SDK-level retries; LLMModel's RetryPolicy schedules them instead
+
+    def to_httpx(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+@dataclass
+class ClientPool:
+    """
+    Registry of long-lived async SDK clients keyed by (provider, api_key, base_url).
+    Each client owns an httpx connection pool with keep-alive, so repeated calls
+    to the same provider reuse warm TLS connections. Call aclose() once when done.
+    """
+    limits: PoolLimits = field(default_factory=PoolLimits)
+    transport: Optional[httpx.AsyncBaseTransport] = None  # e.g. MockProvider.transport(); None = real network
+    _clients: Dict[ClientKey, Any] = field(default_factory=dict, repr=False)
+
+    def openai(self, api_key: str, base_url: Optional[str] = None) -> AsyncOpenAI:
+        """Shared AsyncOpenAI client (also used for OpenAI-compatible endpoints)."""
+        key: ClientKey = ("openai", api_key, base_url)
+        client = self._clients.get(key)
+        if client is None:
+            http_client = OpenAIHttpxClient(
+                limits=self.limits.to_httpx(),
+                timeout=httpx.Timeout(self.limits.timeout),
+                **self._transport_kwargs(),
+            )
+            kwargs = {"api_key": api_key, "http_client": http_client, "max_retries": self.limits.max_retries}
+            if base_url:
+                kwargs["base_url"] = base_url
+            client = AsyncOpenAI(**kwargs)
+            self._clients[key] = client
+        return client
+
+    def anthropic(self, api_key: str, base_url: Optional[str] = None) -> AsyncAnthropic:
+        """Shared AsyncAnthropic client."""
+        key: ClientKey = ("anthropic", api_key, base_url)
+        client = self._clients.get(key)
+        if client is None:
+            http_client = AnthropicHttpxClient(
+                limits=self.limits.to_httpx(),
+                timeout=httpx.Timeout(self.limits.timeout),
+                **self._transport_kwargs(),
+            )
+            kwargs = {"api_key": api_key, "http_client": http_client, "max_retries": self.limits.max_retries}
+            if base_url:
+                kwargs["base_url"] = base_url
+            client = AsyncAnthropic(**kwargs)
+            self._clients[key] = client
+        return client
+
+    def _transport_kwargs(self) -> Dict[str, Any]:
+        # trust_env off: proxy settings from the environment would otherwise take precedence over the transport
+        return {"transport": self.transport, "trust_env": False} if self.transport is not None else {}
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    async def aclose(self) -> None:
+        """Close every pooled client and its connections. Safe to call twice."""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            try:
+                await client.close()
+            except Exception as e:
+                print(f"⚠️ Failed to close client: {e.__class__.__name__}: {e}")
@@ -0,0 +1,143 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Optional, List, Dict, Callable, Awaitable, Deque, Union
+
+COMPLETION_MODES = ("all", "first_n", "quorum")
+
+Outcome = Union[str, BaseException, None]  # None = cancelled before it finished
+
+
+@dataclass
+class LatencyTracker:
+    """Recent successful latencies per model, used to decide when a request is a straggler."""
+    window: int = 50
+    _samples: Dict[str, Deque[float]] = field(default_factory=dict, repr=False)
+
+    def add(self, model: str, seconds: float) -> None:
+        self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def count(self, model: str) -> int:
+        return len(self._samples.get(model, ()))
+
+    def percentile(self, model: str, p: float) -> Optional[float]:
+        samples = sorted(self._samples.get(model, ()))
+        if not samples:
+            return None
+        k = min(len(samples) - 1, max(0, round(p * (len(samples) - 1))))
+        return samples[k]
+
+
+@dataclass
+class CompletionPolicy:
+    """
+    When call_models may stop waiting:
+      all      every model finishes (or fails)
+      first_n  min_valid valid results are in
+      quorum   min_valid valid results are in and deadline_s has passed (or all finished)
+    Stragglers are cancelled once the policy is satisfied. With hedge=True, a request
+    still running after the model's hedge_percentile latency (or hedge_after_s, if set)
+    gets a duplicate; whichever copy finishes first is used.
+    """
+    mode: str = "all"
+    min_valid: int = 1
+    deadline_s: Optional[float] = None
+    hedge: bool = False
+    hedge_percentile: float = 0.9
+    hedge_min_samples: int = 5          # samples needed before percentile-based hedging starts
+    hedge_after_s: Optional[float] = None
+
+    def __post_init__(self):
+        if self.mode not in COMPLETION_MODES:
+            raise ValueError(f"Unknown completion mode '{self.mode}'. Choose one of: {', '.join(COMPLETION_MODES)}")
+
+    def hedge_delay(self, latencies: LatencyTracker, model: str) -> Optional[float]:
+        if not self.hedge:
+            return None
+        if self.hedge_after_s is not None:
+            return self.hedge_after_s
+        if latencies.count(model) < self.hedge_min_samples:
+            return None
+        return latencies.percentile(model, self.hedge_percentile)
+
+    def satisfied(self, valid: int, pending: int, elapsed: float) -> bool:
+        if pending == 0:
+            return True
+        if self.mode == "first_n":
+            return valid >= self.min_valid
+        if self.mode == "quorum":
+            return valid >= self.min_valid and (self.deadline_s is None or elapsed >= self.deadline_s)
+        return False
+
+
+async def run_with_policy(
+    names: List[str],
+    start: Callable[[int, bool], Awaitable[str]],
+    policy: CompletionPolicy,
+    is_valid: Callable[[str], bool],
+    latencies: LatencyTracker,
+) -> List[Outcome]:
+    """
+    Run start(i, is_hedge) for every model i under the policy. Returns one outcome per
+    model, in input order: its text, the exception it raised, or None if it was cancelled.
+    """
+    t0 = monotonic()
+
+    async def _attempt(i: int, hedge: bool) -> str:
+        began = monotonic()
+        result = await start(i, hedge)
+        latencies.add(names[i], monotonic() - began)
+        return result
+
+    async def _slot(i: int) -> str:
+        primary = asyncio.create_task(_attempt(i, False))
+        copies = {primary}
+        try:
+            delay = policy.hedge_delay(latencies, names[i])
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done:
+                    print(f"🪁 {names[i]}: no answer after {delay:.1f}s; sending a hedged duplicate")
+                    copies.add(asyncio.create_task(_attempt(i, True)))
+            pending = set(copies)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            raise primary.exception()
+        finally:
+            # the losing copy, or every copy if this slot itself was cancelled
+            losers = [t for t in copies if not t.done()]
+            for task in losers:
+                task.cancel()
+            if losers:
+                await asyncio.gather(*losers, return_exceptions=True)
+
+    tasks = [asyncio.create_task(_slot(i)) for i in range(len(names))]
+    outcomes: List[Outcome] = [None] * len(names)
+    index = {task: i for i, task in enumerate(tasks)}
+    pending = set(tasks)
+    valid = 0
+    try:
+        while pending:
+            timeout = None
+            if policy.mode == "quorum" and policy.deadline_s is not None and valid >= policy.min_valid:
+                timeout = max(0.0, policy.deadline_s - (monotonic() - t0))
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                i = index[task]
+                exc = task.exception()
+                outcomes[i] = exc if exc is not None else task.result()
+                if exc is None and is_valid(outcomes[i]):
+                    valid += 1
+            if policy.satisfied(valid, len(pending), monotonic() - t0):
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            print(f"✂️ Cancelled {len(pending)} straggler(s): {', '.join(names[index[t]] for t in pending)}")
+    return outcomes
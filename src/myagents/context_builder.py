@@ -0,0 +1,234 @@
+import json
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any, Tuple
+
+try:  # optional: exact counts for OpenAI models; falls back to ~4 chars/token
+    import tiktoken
+except ImportError:  # pragma: no cover - depends on the environment
+    tiktoken = None
+
+# Context windows (tokens) used to warn before a request is sent; prefix match on model name
+CONTEXT_WINDOWS = {
+    "gpt-5": 400_000,
+    "gpt-4.1": 1_000_000,
+    "gpt-4o": 128_000,
+    "claude": 200_000,
+    "gemini": 1_000_000,
+}
+
+# What each stage needs from the requirements when they do not fit the budget
+STAGE_QUERIES = {
+    "phase1": (
+        "architecture component service api interface client server database data store "
+        "external system user actor network boundary trust zone authentication authorization "
+        "login session token credential password encryption tls https data flow request response "
+        "integration third party admin role access control storage file upload input"
+    ),
+}
+
+HEADER_RE = re.compile(r"^# \[PDF:(?P<source>.+?)\] Page (?P<page>\d+)\s*$|^\[FILE\] (?P<file>.+?)\s*$", re.M)
+WORD_RE = re.compile(r"[a-z0-9][a-z0-9_\-]*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "which who what when where how can shall should must may each all any not no into out than then".split()
+)
+
+_encoders: Dict[str, Any] = {}
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Token count via tiktoken when installed (cl100k/o200k by model), else ~4 chars per token."""
+    if not text:
+        return 0
+    if tiktoken is not None:
+        name = "o200k_base" if (model or "").startswith(("gpt-4o", "gpt-4.1", "gpt-5", "o")) else "cl100k_base"
+        enc = _encoders.get(name)
+        if enc is None:
+            try:
+                enc = _encoders[name] = tiktoken.get_encoding(name)
+            except Exception:
+                enc = _encoders[name] = False
+        if enc:
+            return len(enc.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def count_message_tokens(messages: List[dict], model: Optional[str] = None) -> int:
+    total = 0
+    for m in messages:
+        content = m.get("content", "")
+        if isinstance(content, list):
+            content = "".join(b.get("text", "") if isinstance(b, dict) and "text" in b
+                              else json.dumps(b, ensure_ascii=False, default=str) for b in content)
+        elif not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False, default=str)
+        total += count_tokens(content, model) + 4  # role/format overhead per message
+    return total
+
+
+def context_window(model: str) -> Optional[int]:
+    for prefix, size in CONTEXT_WINDOWS.items():
+        if model.startswith(prefix):
+            return size
+    return None
+
+
+def tokenize(text: str) -> List[str]:
+    return [w for w in WORD_RE.findall(text.lower()) if w not in STOPWORDS and len(w) > 1]
+
+
+@dataclass
+class Chunk:
+    """One page (or part of a long page) of the parsed requirements, with its diagrams."""
+    index: int               # document order
+    source: str
+    page: Optional[int]
+    text: str
+    tokens: int
+
+    @property
+    def label(self) -> str:
+        return f"{self.source} p.{self.page}" if self.page else self.source
+
+
+def chunk_requirements(text: str, max_tokens: int = 1200, model: Optional[str] = None) -> List[Chunk]:
+    """
+    Split DocumentParser output on its '# [PDF:name] Page N' / '[FILE] name' headers.
+    Mermaid diagrams stay with the page they were found on; pages longer than
+    max_tokens are split on paragraph boundaries.
+    """
+    sections: List[Tuple[str, Optional[int], str]] = []
+    matches = list(HEADER_RE.finditer(text))
+    if not matches or text[:matches[0].start()].strip():
+        end = matches[0].start() if matches else len(text)
+        sections.append(("preamble", None, text[:end]))
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        source = m.group("source") or m.group("file")
+        page = int(m.group("page")) if m.group("page") else None
+        sections.append((source, page, text[m.start():end]))
+
+    chunks: List[Chunk] = []
+    for source, page, body in sections:
+        body = body.strip()
+        if not body:
+            continue
+        for piece in _split_long(body, max_tokens, model):
+            chunks.append(Chunk(index=len(chunks), source=source, page=page, text=piece,
+                                tokens=count_tokens(piece, model)))
+    return chunks
+
+
+def _split_long(body: str, max_tokens: int, model: Optional[str]) -> List[str]:
+    if count_tokens(body, model) <= max_tokens:
+        return [body]
+    pieces, current, size = [], [], 0
+    for para in re.split(r"\n\s*\n", body):
+        n = count_tokens(para, model)
+        if current and size + n > max_tokens:
+            pieces.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(para)
+        size += n
+    if current:
+        pieces.append("\n\n".join(current))
+    return pieces
+
+
+@dataclass
+class BM25Index:
+    """Okapi BM25 over chunks; small enough to rebuild whenever the requirements change."""
+    chunks: List[Chunk]
+    k1: float = 1.5
+    b: float = 0.75
+    _tf: List[Counter] = field(default_factory=list, repr=False)
+    _idf: Dict[str, float] = field(default_factory=dict, repr=False)
+    _avg_len: float = 0.0
+
+    def __post_init__(self):
+        self._tf = [Counter(tokenize(c.text)) for c in self.chunks]
+        n = len(self.chunks)
+        df: Counter = Counter()
+        for tf in self._tf:
+            df.update(tf.keys())
+        self._idf = {t: math.log(1 + (n - d + 0.5) / (d + 0.5)) for t, d in df.items()}
+        lengths = [sum(tf.values()) for tf in self._tf]
+        self._avg_len = (sum(lengths) / n) if n else 0.0
+
+    def scores(self, query: str) -> List[float]:
+        terms = set(tokenize(query))
+        out = []
+        for tf in self._tf:
+            length = sum(tf.values())
+            norm = self.k1 * (1 - self.b + self.b * length / self._avg_len) if self._avg_len else self.k1
+            out.append(sum(
+                self._idf[t] * tf[t] * (self.k1 + 1) / (tf[t] + norm)
+                for t in terms if t in tf
+            ))
+        return out
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[float, Chunk]]:
+        ranked = sorted(zip(self.scores(query), self.chunks), key=lambda p: (-p[0], p[1].index))
+        return [(s, c) for s, c in ranked[:top_k] if s > 0]
+
+
+@dataclass
+class ContextBuilder:
+    """
+    Fits the parsed requirements into a token budget. If everything fits it is
+    returned verbatim; otherwise the chunks most relevant to the query (BM25) are
+    kept, in document order, and the omission is stated in the text.
+    """
+    requirements: str
+    model: Optional[str] = None
+    chunk_tokens: int = 1200
+    chunks: List[Chunk] = field(default_factory=list)
+    index: Optional[BM25Index] = None
+    total_tokens: int = 0
+
+    def __post_init__(self):
+        self.chunks = chunk_requirements(self.requirements, self.chunk_tokens, self.model)
+        self.index = BM25Index(self.chunks)
+        self.total_tokens = sum(c.tokens for c in self.chunks)
+
+    def build(self, query: str, budget_tokens: Optional[int]) -> str:
+        if budget_tokens is None or self.total_tokens <= budget_tokens:
+            return self.requirements
+        scores = self.index.scores(query)
+        ranked = sorted(self.chunks, key=lambda c: (-scores[c.index], c.index))
+        chosen, used = [], 0
+        for c in ranked:
+            if used + c.tokens > budget_tokens:
+                continue
+            chosen.append(c)
+            used += c.tokens
+        chosen.sort(key=lambda c: c.index)
+        note = (f"[Context budget: {len(chosen)} of {len(self.chunks)} requirement sections included "
+                f"(~{used} of ~{self.total_tokens} tokens), selected by relevance.]")
+        return note + "\n\n" + "\n\n".join(c.text for c in chosen)
+
+
+def query_from_json(text: str, limit: int = 4000) -> str:
+    """Names, labels and descriptions from a phase output, used as a retrieval query."""
+    try:
+        doc = json.loads(text)
+    except Exception:
+        return text[:limit]
+    words: List[str] = []
+
+    def walk(v: Any, key: str = "") -> None:
+        if isinstance(v, dict):
+            for k, x in v.items():
+                walk(x, k)
+        elif isinstance(v, list):
+            for x in v:
+                walk(x, key)
+        elif isinstance(v, str) and key in ("name", "label", "title", "description", "threat",
+                                            "data", "component", "summary"):
+            words.append(v)
+
+    walk(doc)
+    return " ".join(words)[:limit]
@@ -1,14 +1,45 @@
+import asyncio
 import base64
-from dataclasses import dataclass
+import hashlib
+from contextlib import contextmanager, asynccontextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional
-from openai import OpenAI
+from time import monotonic
+from typing import Optional, List, Dict, Any, Sequence, Union, Iterator, AsyncIterator, ClassVar
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultAsyncHttpxClient
+from .cassette import Cassette, ReplayedError
+from .rate_limiter import RateLimiter, RetryPolicy, is_retryable, retry_after_seconds, status_code
+from .telemetry import Telemetry, CallRecord
+
+SYSTEM_PROMPT = (
+    "Convert architecture diagrams to VALID Mermaid only (no backticks/no prose). "
+    "Choose one type: flowchart TD | sequenceDiagram | classDiagram | erDiagram. "
+    "Preserve labels; concise IDs; include all edges."
+)
+
+# An image file, or the encoded image itself (PDF diagrams are kept in memory)
+ImageSource = Union[str, Path, bytes]
+
 
 @dataclass
 class DiagramToMermaidConverter:
     model_name: str = "gpt-4o-mini"
     api_key: Optional[str] = None
     client: Optional[OpenAI] = None
+    async_client: Optional[AsyncOpenAI] = None  # optional; a batch-scoped client is opened if None
+    max_concurrency: int = 4                     # simultaneous vision calls in convert_many
+    requests_per_minute: Optional[int] = None    # request start budget; None = unlimited
+    telemetry: Optional[Telemetry] = field(default=None, repr=False)  # records each conversion as a "parse" call
+    transport: Optional[httpx.AsyncBaseTransport] = field(default=None, repr=False)  # for batch clients; None = network
+    cassette: Optional[Cassette] = field(default=None, repr=False)  # record conversions, or replay them
+    concurrency: Optional[asyncio.Semaphore] = field(default=None, repr=False)  # shared per-provider cap (see LLMModel)
+    rate_limiter: Optional[RateLimiter] = field(default=None, repr=False)  # shared RPM budget (see LLMModel)
+    retry_policy: Optional[RetryPolicy] = field(default=None, repr=False)  # retry transient failures; None = fail
+    _next_slot: float = field(default=0.0, repr=False)
+    _slot_lock: Optional[asyncio.Lock] = field(default=None, repr=False)
+
+    in_memory_images: ClassVar[bool] = True  # image_path may be PNG bytes (see DocumentParser)
 
     def __post_init__(self):
         if not self.client:
@@ -16,26 +47,182 @@ class DiagramToMermaidConverter:
                 raise ValueError("OpenAI API key must be provided")
             self.client = OpenAI(api_key=self.api_key)
 
-    def convert(self, image_path: str | Path, output_path: str | Path | None = None,
+    def convert(self, image_path: ImageSource, output_path: str | Path | None = None,
                 extra_instructions: str = "") -> str:
-        p = Path(image_path)
-        if not p.exists():
-            raise FileNotFoundError(p)
-        b64 = base64.b64encode(p.read_bytes()).decode("utf-8")
+        messages = self._build_messages(image_path, extra_instructions)
+        with self._observe() as rec:
+            replayed = self._replay(image_path, extra_instructions, rec)
+            if replayed is not None:
+                return self._finish(replayed, output_path)
+            with self._taping(image_path, extra_instructions, rec) as tape:
+                resp = self.client.chat.completions.create(model=self.model_name, messages=messages, temperature=1)
+                rec.add_usage(getattr(resp, "usage", None))
+                tape["response"] = resp.choices[0].message.content or ""
+        return self._finish(tape["response"], output_path)
+
+    async def aconvert(self, image_path: ImageSource, output_path: str | Path | None = None,
+                       extra_instructions: str = "") -> str:
+        """Async variant of convert(); does not block the event loop while the model runs."""
+        if self.async_client is not None:
+            return await self._aconvert_with(self.async_client, image_path, output_path, extra_instructions)
+        async with self._new_async_client() as client:
+            return await self._aconvert_with(client, image_path, output_path, extra_instructions)
+
+    async def convert_many(self, image_paths: Sequence[ImageSource],
+                           output_paths: Optional[Sequence[str | Path | None]] = None,
+                           extra_instructions: str = "") -> List[Union[str, Exception]]:
+        """
+        Convert a batch of diagrams concurrently (bounded by max_concurrency and
+        requests_per_minute). Results are returned in input order; a failed
+        conversion yields its exception instead of aborting the batch.
+        """
+        if output_paths is None:
+            output_paths = [None] * len(image_paths)
+        if len(output_paths) != len(image_paths):
+            raise ValueError("output_paths must match image_paths in length")
+        if not image_paths:
+            return []
+
+        sem = asyncio.Semaphore(max(1, self.max_concurrency))
+        self._slot_lock = asyncio.Lock()
+
+        async def _one(client: AsyncOpenAI, image_path, output_path):
+            async with sem:
+                await self._wait_for_slot()
+                return await self._aconvert_with(client, image_path, output_path, extra_instructions)
+
+        async def _run(client: AsyncOpenAI):
+            tasks = [_one(client, p, o) for p, o in zip(image_paths, output_paths)]
+            return await asyncio.gather(*tasks, return_exceptions=True)
+
+        if self.async_client is not None:
+            return await _run(self.async_client)
+        async with self._new_async_client() as client:
+            return await _run(client)
+
+    # --- internals ---
+    def _new_async_client(self) -> AsyncOpenAI:
+        if not self.api_key:
+            raise ValueError("OpenAI API key must be provided for async conversion")
+        # with a retry_policy the SDK must not retry as well (see ClientPool)
+        kwargs = {"max_retries": 0} if self.retry_policy is not None else {}
+        if self.transport is not None:
+            return AsyncOpenAI(api_key=self.api_key, http_client=DefaultAsyncHttpxClient(transport=self.transport, trust_env=False),
+                               **kwargs)
+        return AsyncOpenAI(api_key=self.api_key, **kwargs)
+
+    async def _aconvert_with(self, client: AsyncOpenAI, image_path, output_path, extra_instructions: str) -> str:
+        messages = self._build_messages(image_path, extra_instructions)
+        with self._observe() as rec:
+            replayed = self._replay(image_path, extra_instructions, rec)
+            if replayed is not None:
+                return self._finish(replayed, output_path)
+            with self._taping(image_path, extra_instructions, rec) as tape:
+                attempt = 0
+                while True:
+                    attempt += 1
+                    if self.rate_limiter is not None:
+                        await self.rate_limiter.acquire()
+                    try:
+                        async with self._slot():
+                            resp = await client.chat.completions.create(model=self.model_name, messages=messages,
+                                                                        temperature=1)
+                    except Exception as e:
+                        if status_code(e) == 429 and self.rate_limiter is not None:
+                            self.rate_limiter.on_rate_limited(retry_after_seconds(e))
+                        if not self._should_retry(e, attempt):
+                            raise
+                        rec.retries = attempt
+                        await self._backoff(e, attempt)
+                        continue
+                    break
+                if self.rate_limiter is not None:
+                    self.rate_limiter.on_success()
+                rec.add_usage(getattr(resp, "usage", None))
+                tape["response"] = resp.choices[0].message.content or ""
+        return self._finish(tape["response"], output_path)
+
+    def _should_retry(self, exc: Exception, attempt: int) -> bool:
+        return self.retry_policy is not None and attempt < self.retry_policy.max_attempts and is_retryable(exc)
+
+    async def _backoff(self, exc: Exception, attempt: int) -> None:
+        delay = self.retry_policy.delay(attempt, retry_after_seconds(exc))
+        print(f"⏳ {self.model_name}: {exc.__class__.__name__}; retry {attempt}/{self.retry_policy.max_attempts - 1} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def _slot(self) -> AsyncIterator[None]:
+        if self.concurrency is None:
+            yield
+            return
+        async with self.concurrency:
+            yield
+
+    @contextmanager
+    def _observe(self) -> Iterator[CallRecord]:
+        if self.telemetry is None:
+            yield CallRecord(model=self.model_name, provider="openai", operation="convert")
+            return
+        with self.telemetry.observe_call(self.model_name, "openai", "convert", phase="parse") as rec:
+            yield rec
+
+    def _tape_request(self, image_path: ImageSource, extra_instructions: str) -> Dict[str, str]:
+        """What identifies a conversion on a cassette: the image content, not its path or base64."""
+        data = _read_image(image_path)
+        sha = hashlib.sha256(data).hexdigest()
+        name = f"<{len(data)} bytes>" if isinstance(image_path, (bytes, bytearray)) else Path(image_path).name
+        return {"image_sha256": sha, "image": name, "instructions": extra_instructions}
+
+    def _tape_key(self, request: Dict[str, str]) -> str:
+        return Cassette.key("convert", self.model_name, SYSTEM_PROMPT, request["image_sha256"], request["instructions"])
+
+    def _replay(self, image_path: ImageSource, extra_instructions: str, rec: CallRecord) -> Optional[str]:
+        if self.cassette is None or not self.cassette.replaying:
+            return None
+        request = self._tape_request(image_path, extra_instructions)
+        hit = self.cassette.play(self._tape_key(request), f"{self.model_name} convert {request['image']}")
+        rec.replayed = True
+        for k, v in hit.usage.items():
+            setattr(rec, k, v)
+        if hit.error is not None:
+            raise ReplayedError(hit.error)
+        return hit.response
+
+    @contextmanager
+    def _taping(self, image_path: ImageSource, extra_instructions: str, rec: CallRecord) -> Iterator[Dict[str, Any]]:
+        if self.cassette is None or self.cassette.replaying:
+            yield {"response": None}
+            return
+        request = self._tape_request(image_path, extra_instructions)
+        with self.cassette.taping(self._tape_key(request), "convert", self.model_name, "openai", request, rec) as tape:
+            yield tape
+
+    async def _wait_for_slot(self) -> None:
+        """Space request starts evenly so a batch stays inside requests_per_minute."""
+        if not self.requests_per_minute:
+            return
+        interval = 60.0 / self.requests_per_minute
+        async with self._slot_lock:
+            now = monotonic()
+            start = max(now, self._next_slot)
+            self._next_slot = start + interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def _build_messages(self, image_path: ImageSource, extra_instructions: str) -> list:
+        b64 = base64.b64encode(_read_image(image_path)).decode("utf-8")
         data_url = f"data:image/png;base64,{b64}"
 
-        messages = [
-            {"role": "system", "content":
-             "Convert architecture diagrams to VALID Mermaid only (no backticks/no prose). "
-             "Choose one type: flowchart TD | sequenceDiagram | classDiagram | erDiagram. "
-             "Preserve labels; concise IDs; include all edges."},
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": [
                 {"type": "text", "text": "Convert this diagram to Mermaid. " + extra_instructions},
                 {"type": "image_url", "image_url": {"url": data_url}},
             ]},
         ]
-        resp = self.client.chat.completions.create(model=self.model_name, messages=messages, temperature=1)
-        mermaid = self._extract_mermaid(resp.choices[0].message.content or "")
+
+    def _finish(self, content: str, output_path: str | Path | None) -> str:
+        mermaid = self._extract_mermaid(content)
         if output_path and mermaid:
             Path(output_path).write_text(mermaid, encoding="utf-8")
         return mermaid
@@ -49,3 +236,12 @@ class DiagramToMermaidConverter:
             if "```" in t:
                 t = t.rsplit("```", 1)[0].strip()
         return t
+
+
+def _read_image(image: ImageSource) -> bytes:
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    p = Path(image)
+    if not p.exists():
+        raise FileNotFoundError(p)
+    return p.read_bytes()
@@ -1,16 +1,102 @@
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, Union, List
+from typing import Optional, Union, List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import fitz  # PyMuPDF
 from .diagram_to_mermaid_converter import DiagramToMermaidConverter
+from .image_dedup import DiagramImage, ImageDeduplicator, describe_png
+from .pdf_extract import extract_pages
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
 import shutil
+import threading
 
 PathLike = Union[str, Path]
 
+IMAGE_SUFFIXES = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp']
+PARSE_CACHE_DIR = Path(".sdra_cache") / "parse"
+PARSE_CACHE_NAME = ".sdra_parse_cache.json"  # in-folder cache of older versions; never parsed
+CONVERSION_ERROR_MARKER = "%% Conversion error"
+
+
+def fingerprint(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@dataclass
+class ParseCache:
+    """
+    Fingerprint manifest for incremental parsing, stored as JSON under PARSE_CACHE_DIR
+    (one file per design folder) so the folder itself is never written to.
+    files:  file name -> {"sha256", "parts"}  (extracted text/diagrams, reused when unchanged)
+    images: image sha256 -> mermaid           (per-diagram result, reused across pages/files)
+    """
+    path: Path
+    files: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    images: Dict[str, str] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @classmethod
+    def load(cls, path: Path) -> "ParseCache":
+        cache = cls(path=path)
+        if path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                cache.files = data.get("files", {})
+                cache.images = data.get("images", {})
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable parse cache {path}: {e}")
+        return cache
+
+    @classmethod
+    def for_folder(cls, root: Path, cache_dir: Path = PARSE_CACHE_DIR) -> "ParseCache":
+        return cls.load(Path(cache_dir) / f"{fingerprint(str(root).encode('utf-8'))[:16]}.json")
+
+    def save(self) -> None:
+        with self._lock:
+            data = {"files": self.files, "images": self.images}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+
+    def file_parts(self, name: str, sha: str) -> Optional[List[Union[str, DiagramImage]]]:
+        entry = self.files.get(name)
+        if not entry or entry.get("sha256") != sha or "parts" not in entry:
+            return None
+        parts = [DiagramImage.from_dict(p["diagram"]) if "diagram" in p else p["text"] for p in entry["parts"]]
+        # Diagrams without a cached conversion must still be on disk to be converted
+        if any(isinstance(p, DiagramImage) and p.sha256 not in self.images and not p.path.exists() for p in parts):
+            return None
+        return parts
+
+    def put_file(self, name: str, sha: str, parts: List[Union[str, DiagramImage]]) -> None:
+        encoded = [{"diagram": p.to_dict()} if isinstance(p, DiagramImage) else {"text": p} for p in parts]
+        with self._lock:
+            self.files[name] = {"sha256": sha, "parts": encoded}
+
+    def image_mermaid(self, sha: str) -> Optional[str]:
+        return self.images.get(sha)
+
+    def put_image(self, sha: str, mermaid: str) -> None:
+        with self._lock:
+            self.images[sha] = mermaid
+
+
 @dataclass
 class DocumentParser:
     design_as_text: str = field(default_factory=str)
     converter: Optional[DiagramToMermaidConverter] = None  # optional; stub if None
+    incremental: bool = False   # reuse fingerprinted text/.mmd results from the previous run
+    max_workers: int = 4        # files and diagrams processed concurrently
+    cache: Optional[ParseCache] = field(default=None, repr=False)
+    cache_dir: Path = PARSE_CACHE_DIR  # where incremental parse caches are kept
+    dedup: Optional[ImageDeduplicator] = field(default_factory=ImageDeduplicator)  # None = convert every image
+    pdf_processes: int = 0      # worker processes for PDFs longer than pages_per_task; 0 = one per CPU, 1 = none
+    pages_per_task: int = 16    # PDF pages extracted per worker task
+    _pool: Optional[ProcessPoolExecutor] = field(default=None, repr=False)
+    _pool_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
 
     # --- public API ---
     def get_design_as_text(self) -> str:
@@ -20,75 +106,235 @@ class DocumentParser:
         self.design_as_text = text
 
     def parse_folder(self, folder: PathLike) -> None:
+        _run_sync(self.aparse_folder(folder))
+
+    async def aparse_folder(self, folder: PathLike) -> None:
+        """
+        parse_folder for callers on an event loop: extraction runs on worker threads
+        (and processes), diagrams are converted on the running loop.
+        """
         root = Path(folder).expanduser().resolve()
         if not root.exists() or not root.is_dir():
             raise ValueError(f"Invalid folder: {root}")
-        for file in root.iterdir():
-            if file.is_file():
-                self.parse_file(file)
+        if self.incremental and self.cache is None:
+            self.cache = ParseCache.for_folder(root, self.cache_dir)
+
+        # Sorted so the assembled text (and downstream prompt/cache keys) is stable run to run
+        files = sorted(f for f in root.iterdir()
+                       if f.is_file() and f.name != PARSE_CACHE_NAME and not is_conversion_output(f))
+        self.design_as_text += await self._aparse_files(files)
+
+        if self.cache is not None:
+            self.cache.save()
 
     def parse_file(self, file: Path) -> None:
+        self.design_as_text += _run_sync(self._aparse_files([file]))
+
+    # --- internals ---
+    async def _aparse_files(self, files: List[Path]) -> str:
+        """
+        Extract every file concurrently, convert each DISTINCT diagram once in a
+        single concurrent batch, then assemble the text in file/page order.
+        """
+        extracted = await asyncio.to_thread(self._extract_files, files)
+
+        diagrams = [p for fp in extracted for p in fp.parts if isinstance(p, DiagramImage)]
+        if self.dedup is not None:
+            ids = self.dedup.assign_ids(diagrams)
+        else:
+            ids = [f"DIAG-{i:03d}" for i in range(1, len(diagrams) + 1)]
+
+        canonical: Dict[str, DiagramImage] = {}
+        for d, diagram_id in zip(diagrams, ids):
+            if diagram_id is not None and diagram_id not in canonical:
+                canonical[diagram_id] = d
+        skipped = len(diagrams) - len(canonical)
+        if skipped:
+            print(f"🧹 Skipping {skipped} repeated/icon images; converting {len(canonical)} distinct diagrams")
+        by_sha = await self._images_to_mermaid(list(canonical.values()))
+        mermaids = {diagram_id: by_sha[d.sha256] for diagram_id, d in canonical.items()}
+
+        out: List[str] = []
+        emitted = set()
+        diagram_ids = iter(ids)
+        for fp in extracted:
+            for p in fp.parts:
+                if not isinstance(p, DiagramImage):
+                    out.append(p)
+                    continue
+                diagram_id = next(diagram_ids)
+                if diagram_id is None:
+                    continue
+                if diagram_id in emitted:
+                    out.append(f"\n[MERMAID DIAGRAM {diagram_id}] (repeat; see above)\n")
+                    continue
+                emitted.add(diagram_id)
+                print(mermaids[diagram_id])
+                out.append(f"\n[MERMAID DIAGRAM {diagram_id}]\n{mermaids[diagram_id]}\n")
+        return "".join(out)
+
+    def _extract_files(self, files: List[Path]) -> List["_ExtractedFile"]:
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as pool:
+                return list(pool.map(self._extract_file, files))
+        finally:
+            self._close_pool()
+
+    def _extract_file(self, file: Path) -> "_ExtractedFile":
+        sha = None
+        if self.cache is not None:
+            sha = fingerprint(file.read_bytes())
+            cached = self.cache.file_parts(file.name, sha)
+            if cached is not None:
+                print(f"♻️ Unchanged, reusing parsed text: {file.name}")
+                return _ExtractedFile(file=file, sha=sha, parts=cached)
+
         suffix = file.suffix.lower()
         if suffix == ".pdf":
-            self._parse_pdf(file)
+            fp = self._parse_pdf(file)
+        # Check if it's an image file and convert to Mermaid
+        elif suffix in IMAGE_SUFFIXES:
+            fp = _ExtractedFile(file=file, sha=sha, parts=[describe_png(file, file.read_bytes())])
         else:
-            # Check if it's an image file and convert to Mermaid
-            if suffix in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp']:
-                mermaid = self._image_to_mermaid(file)
-                print(mermaid)
-                if mermaid:
-                    self.design_as_text += f"\n[MERMAID DIAGRAM]\n{mermaid}\n"
-            else:
-                # placeholder for other types (txt/docx) — add later
-                self.design_as_text += f"\n[FILE] {file.name}"
+            # placeholder for other types (txt/docx) — add later
+            fp = _ExtractedFile(file=file, sha=sha, parts=[f"\n[FILE] {file.name}"])
 
-    # --- internals ---
-    def _parse_pdf(self, file: Path) -> None:
-        assets_dir = file.parent / f"{file.stem}_assets"
+        fp.sha = sha
+        if self.cache is not None and fp.ok:
+            self.cache.put_file(file.name, sha, fp.parts)
+        return fp
 
-        # If it exists already, remove it and everything inside
-        if assets_dir.exists():
+    def _parse_pdf(self, file: Path) -> "_ExtractedFile":
+        """
+        Extract page text and diagram PNGs in page order; diagrams are converted later.
+        PDFs longer than pages_per_task are split into page ranges extracted on a
+        process pool, then reassembled in order.
+        """
+        assets_dir = file.parent / f"{file.stem}_assets"
+        if not self.incremental and assets_dir.exists():
+            # PNGs/.mmd of an earlier run; diagrams are now kept in memory
             shutil.rmtree(assets_dir)
 
-        # Now create a fresh empty one
-        assets_dir.mkdir()
-
-
+        parts: List[Union[str, DiagramImage]] = []
+        by_xref: Dict[int, DiagramImage] = {}  # the same embedded image reused on many pages
         try:
             with fitz.open(file) as doc:
-                for page_idx, page in enumerate(doc, start=1):
-                    txt = (page.get_text("text") or "").strip()
-                    if txt:
-                        self.design_as_text += (f"\n\n# [PDF:{file.name}] Page {page_idx}\n{txt}")
-
-                    for img_idx, img in enumerate(page.get_images(full=True), start=1):
-                        xref = img[0]
-                        pix = fitz.Pixmap(doc, xref)
-                        try:
-                            if pix.alpha or pix.n > 3:
-                                pix = fitz.Pixmap(fitz.csRGB, pix)
-                            out_png = assets_dir / f"{file.stem}_p{page_idx}_i{img_idx}.png"
-                            pix.save(out_png.as_posix())
-                        finally:
-                            pix = None
-
-                        mermaid = self._image_to_mermaid(out_png)
-                        print(mermaid)
-                        self.design_as_text += f"\n[MERMAID DIAGRAM]\n{mermaid}\n"
+                pages = doc.page_count
+            step = max(1, self.pages_per_task)
+            ranges = [(start, min(start + step, pages)) for start in range(0, pages, step)]
+            if len(ranges) > 1 and self.pdf_processes != 1:
+                chunks = self._process_pool().map(
+                    extract_pages, *zip(*[(file, start, stop, self.dedup) for start, stop in ranges]))
+            else:
+                chunks = [extract_pages(file, 0, pages, self.dedup)]
+            for chunk in chunks:
+                for p in chunk:
+                    if isinstance(p, tuple):
+                        xref, image = p
+                        p = by_xref.setdefault(xref, image)
+                    parts.append(p)
         except Exception as e:
-            self.design_as_text += f"\n[PDF ERROR] {file.name}: {e.__class__.__name__}: {e}"
-            return
+            parts.append(f"\n[PDF ERROR] {file.name}: {e.__class__.__name__}: {e}")
+            return _ExtractedFile(file=file, sha=None, parts=parts, ok=False)
+        return _ExtractedFile(file=file, sha=None, parts=parts)
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        """Shared by every PDF of one _parse_files call; spawned, since extraction runs on threads."""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.pdf_processes or None,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
 
+    def _close_pool(self) -> None:
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
 
-    def _image_to_mermaid(self, image_path: Path) -> str:
+    async def _images_to_mermaid(self, images: List[DiagramImage]) -> Dict[str, str]:
+        """Convert diagrams in one batch; returns mermaid keyed by image sha256."""
         if not self.converter:
-            return (
-                f"%% TODO: Convert diagram at {image_path} to Mermaid\n"
-                f"flowchart TD\nA[Image: {image_path.name}] --> B[Conversion pending]"
-            )
-        out_mmd = image_path.with_suffix(".mmd")
-        try:
-            mermaid = self.converter.convert(image_path=image_path, output_path=out_mmd)
-            return (mermaid or "flowchart TD\nA --> B").strip()
-        except Exception as e:
-            return f"%% Conversion error {e.__class__.__name__}: {e}\nflowchart TD\nA --> B"
+            return {
+                d.sha256: (
+                    f"%% TODO: Convert diagram at {d.path} to Mermaid\n"
+                    f"flowchart TD\nA[Image: {d.path.name}] --> B[Conversion pending]"
+                )
+                for d in images
+            }
+
+        results: Dict[str, str] = {}
+        todo: List[DiagramImage] = []
+        for d in images:
+            cached = self.cache.image_mermaid(d.sha256) if self.cache is not None else None
+            if cached is not None:
+                out_mmd = _mmd_output(d.path)
+                if out_mmd is not None and not out_mmd.exists():
+                    out_mmd.write_text(cached, encoding="utf-8")
+                results[d.sha256] = cached
+                continue
+            todo.append(d)
+
+        if todo:
+            if getattr(self.converter, "in_memory_images", False):
+                paths = [d.png if d.png is not None else d.path for d in todo]
+                outputs = [None if d.png is not None else _mmd_output(d.path) for d in todo]
+            else:
+                # Converters that read image files get the in-memory PNGs written out first
+                for d in todo:
+                    if d.png is not None:
+                        d.path.parent.mkdir(exist_ok=True)
+                        d.path.write_bytes(d.png)
+                paths = [d.path for d in todo]
+                outputs = [_mmd_output(p) for p in paths]
+            if hasattr(self.converter, "convert_many"):
+                converted = await self.converter.convert_many(paths, outputs)
+            else:
+                # Synchronous converters still run concurrently on the worker pool
+                def _convert(args):
+                    try:
+                        return self.converter.convert(image_path=args[0], output_path=args[1])
+                    except Exception as e:
+                        return e
+
+                def _convert_all():
+                    with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as pool:
+                        return list(pool.map(_convert, zip(paths, outputs)))
+                converted = await asyncio.to_thread(_convert_all)
+
+            for d, mermaid in zip(todo, converted):
+                if isinstance(mermaid, Exception):
+                    results[d.sha256] = f"{CONVERSION_ERROR_MARKER} {mermaid.__class__.__name__}: {mermaid}\nflowchart TD\nA --> B"
+                    continue
+                results[d.sha256] = (mermaid or "flowchart TD\nA --> B").strip()
+                if self.cache is not None and mermaid:
+                    self.cache.put_image(d.sha256, results[d.sha256])
+        return results
+
+
+@dataclass
+class _ExtractedFile:
+    file: Path
+    sha: Optional[str]
+    parts: List[Union[str, DiagramImage]]  # text, or a diagram awaiting conversion
+    ok: bool = True                        # False if extraction failed part-way
+
+
+def is_conversion_output(file: Path) -> bool:
+    """A .mmd written next to a diagram by an earlier run; parsing it would change the design text."""
+    return file.suffix.lower() == ".mmd" and any(file.with_suffix(s).exists() for s in IMAGE_SUFFIXES)
+
+
+def _mmd_output(image: Path) -> Optional[Path]:
+    """Where a diagram's .mmd is written: next to the image, unless that folder is missing or read-only."""
+    return image.with_suffix(".mmd") if os.access(image.parent, os.W_OK) else None
+
+
+def _run_sync(coro):
+    """Run a coroutine to completion from sync code, even if an event loop is already running."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
@@ -0,0 +1,103 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+import hashlib
+import fitz  # PyMuPDF
+
+
+@dataclass
+class DiagramImage:
+    """An extracted image plus the fingerprints used to spot repeats."""
+    path: Path
+    sha256: str               # exact match
+    dhash: Optional[int]      # 64-bit difference hash; None if the image could not be decoded
+    width: int = 0
+    height: int = 0
+    png: Optional[bytes] = field(default=None, repr=False, compare=False)  # encoded in memory; path not written
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"path": self.path.as_posix(), "sha256": self.sha256, "dhash": self.dhash,
+                "width": self.width, "height": self.height}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "DiagramImage":
+        return cls(path=Path(d["path"]), sha256=d["sha256"], dhash=d.get("dhash"),
+                   width=d.get("width", 0), height=d.get("height", 0))
+
+
+def dhash(pix: "fitz.Pixmap") -> int:
+    """
+    Difference hash: shrink to 9x8 grayscale and record whether each pixel is
+    brighter than its right-hand neighbour. Robust to re-encoding and rescaling.
+    """
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)  # drop alpha
+    if pix.n != 1:
+        pix = fitz.Pixmap(fitz.csGRAY, pix)
+    small = fitz.Pixmap(pix, 9, 8, None)
+    samples, stride = small.samples, small.stride
+    bits = 0
+    for row in range(8):
+        base = row * stride
+        for col in range(8):
+            bits = (bits << 1) | (samples[base + col] > samples[base + col + 1])
+    return bits
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def describe_png(path: Path, png: bytes) -> DiagramImage:
+    """Fingerprint PNG/JPEG/etc. bytes; falls back to an exact hash if decoding fails."""
+    sha = hashlib.sha256(png).hexdigest()
+    try:
+        pix = fitz.Pixmap(png)
+        return DiagramImage(path=path, sha256=sha, dhash=dhash(pix), width=pix.width, height=pix.height)
+    except Exception:
+        return DiagramImage(path=path, sha256=sha, dhash=None)
+
+
+@dataclass
+class ImageDeduplicator:
+    """
+    Groups repeated diagrams (logos, legends, the same context diagram on every page)
+    so each distinct image is converted once and referenced by ID afterwards.
+    Only exact copies (same xref or sha256) are merged by default: diagrams sharing a
+    layout but not their labels are near-identical to dHash, so the perceptual match
+    is opt-in and only applies to images of equal dimensions.
+    """
+    phash_threshold: Optional[int] = None  # opt-in: max Hamming distance (of 64 bits), e.g. 2; None = exact only
+    min_size_px: int = 48      # images narrower or shorter than this are icons and are dropped
+    id_prefix: str = "DIAG"
+
+    def is_icon(self, width: int, height: int) -> bool:
+        return 0 < min(width, height) < self.min_size_px
+
+    def assign_ids(self, diagrams: List[DiagramImage]) -> List[Optional[str]]:
+        """
+        Return one ID per diagram, in order. Repeats (exact, or perceptual if enabled)
+        share the ID of their first occurrence; icons get None.
+        """
+        ids: List[Optional[str]] = []
+        by_sha: Dict[str, str] = {}
+        seen: List[tuple] = []  # (dhash, width, height, id) of canonical diagrams
+        count = 0
+        for d in diagrams:
+            if self.is_icon(d.width, d.height):
+                ids.append(None)
+                continue
+            diagram_id = by_sha.get(d.sha256)
+            if diagram_id is None and d.dhash is not None and self.phash_threshold is not None:
+                for h, width, height, existing in seen:
+                    if (width, height) == (d.width, d.height) and hamming(h, d.dhash) <= self.phash_threshold:
+                        diagram_id = existing
+                        break
+            if diagram_id is None:
+                count += 1
+                diagram_id = f"{self.id_prefix}-{count:03d}"
+                if d.dhash is not None:
+                    seen.append((d.dhash, d.width, d.height, diagram_id))
+            by_sha[d.sha256] = diagram_id
+            ids.append(diagram_id)
+        return ids
@@ -0,0 +1,131 @@
+import json
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any, Tuple, Union
+
+PathKey = Union[str, int]
+
+# Friendly names for the record collections of the phase schemas
+RECORD_LABELS = {
+    ("trust_boundaries", "boundaries"): "boundaries",
+    ("dfds", "dfds"): "DFDs",
+    ("dfds", "dfds", "*", "nodes"): "DFD elements",
+    ("dfds", "dfds", "*", "edges"): "DFD flows",
+    ("stride_matrix", "rows"): "STRIDE rows",
+    ("dread", "ratings"): "DREAD ratings",
+    ("mitigations", "items"): "mitigations",
+    ("annotated_dfds",): "annotated DFDs",
+}
+
+
+@dataclass
+class JSONRecord:
+    """An object that just finished parsing as an element of an array."""
+    path: Tuple[PathKey, ...]   # path of the enclosing array, e.g. ("stride_matrix", "rows")
+    index: int                  # position within that array
+    value: Dict[str, Any]
+
+    @property
+    def pattern(self) -> Tuple[str, ...]:
+        """Path with list indices replaced by "*" (matches RECORD_LABELS keys)."""
+        return tuple("*" if isinstance(p, int) else p for p in self.path)
+
+
+@dataclass
+class _Frame:
+    kind: str                    # "{" or "["
+    start: int                   # buffer offset of the opening bracket
+    key: Optional[str] = None    # current key (objects)
+    expect_key: bool = False     # next string in this object is a key
+    index: int = -1              # current element index (arrays)
+
+
+@dataclass
+class IncrementalJSONParser:
+    """
+    Push parser for a streamed JSON document. feed() accepts arbitrary chunks and
+    returns every object that completed inside an array since the last call, so
+    boundaries, DFD elements and STRIDE rows can be used while the model is still
+    writing. Text before the first bracket (e.g. a ```json fence) is ignored.
+    """
+    buffer: str = ""
+    counts: Dict[Tuple[str, ...], int] = field(default_factory=dict)
+    _pos: int = 0
+    _stack: List[_Frame] = field(default_factory=list)
+    _in_string: bool = False
+    _escape: bool = False
+    _string_start: int = 0
+    _done: bool = False
+
+    def feed(self, chunk: str) -> List[JSONRecord]:
+        self.buffer += chunk
+        records: List[JSONRecord] = []
+        buf, stack = self.buffer, self._stack
+        i = self._pos
+        n = len(buf)
+        while i < n and not self._done:
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    top = stack[-1] if stack else None
+                    if top is not None and top.kind == "{" and top.expect_key:
+                        top.key = json.loads(buf[self._string_start:i + 1])
+                        top.expect_key = False
+            elif c == '"':
+                if stack:
+                    self._in_string = True
+                    self._string_start = i
+            elif c in "{[":
+                if stack and stack[-1].kind == "[":
+                    stack[-1].index += 1
+                stack.append(_Frame(kind=c, start=i, expect_key=(c == "{")))
+            elif c in "}]":
+                if stack:
+                    frame = stack.pop()
+                    if frame.kind == "{" and stack and stack[-1].kind == "[":
+                        path = self._path()
+                        try:
+                            value = json.loads(buf[frame.start:i + 1])
+                        except ValueError:
+                            value = None
+                        if isinstance(value, dict):
+                            rec = JSONRecord(path=path, index=stack[-1].index, value=value)
+                            records.append(rec)
+                            self.counts[rec.pattern] = self.counts.get(rec.pattern, 0) + 1
+                    if not stack:
+                        self._done = True
+            elif c == "," and stack:
+                top = stack[-1]
+                if top.kind == "{":
+                    top.expect_key = True
+            i += 1
+        self._pos = i
+        return records
+
+    @property
+    def complete(self) -> bool:
+        return self._done
+
+    def _path(self) -> Tuple[PathKey, ...]:
+        """Path of the innermost open container (the array receiving the record)."""
+        path: List[PathKey] = []
+        for frame in self._stack:
+            if frame.kind == "{":
+                if frame.key is not None:
+                    path.append(frame.key)
+            else:
+                path.append(frame.index)
+        # the last entry is the receiving array's own element index; drop it
+        return tuple(path[:-1])
+
+    def summary(self) -> str:
+        parts = []
+        for pattern, count in self.counts.items():
+            label = RECORD_LABELS.get(pattern)
+            if label:
+                parts.append(f"{count} {label}")
+        return ", ".join(parts) if parts else "no records yet"
@@ -0,0 +1,381 @@
+import json
+import re
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple, Iterator
+
+SCHEMA_DIR = Path(__file__).resolve().parents[2] / "schemas"
+
+# Top-level keys of phase outputs -> schema describing that section
+SECTION_SCHEMAS = {
+    "trust_boundaries": "trust_boundaries.schema.json",
+    "dfds": "dfd.schema.json",
+    "stride_matrix": "stride_matrix.schema.json",
+    "dread": "dread.schema.json",
+    "mitigations": "mitigations.schema.json",
+    "annotated_dfds": "annotated_dfd.schema.json",  # an ARRAY of these
+}
+
+# Identity of array items where "the item's own ID" is not the right answer:
+# a STRIDE cell is (element, category) and a DREAD rating scores exactly one cell.
+IDENTITY_OVERRIDES = {
+    "rows": ("element_id", "stride"),
+    "ratings": ("element_id", "stride"),
+    "edges": ("from", "to"),
+    "evidence": ("source_type", "source_id"),
+    "annotated_dfds": ("dfd_id",),
+    "artifact_manifest": ("path",),
+}
+
+ID_RE = re.compile(r"^([A-Z]+)-(\d+)$")
+
+# DREAD score (sum of five 0-10 factors) -> severity; the Phase 2 prompt states the same bins
+DREAD_SEVERITY_BINS = [(40, "Critical"), (30, "High"), (20, "Medium"), (10, "Low"), (0, "Info")]
+
+
+def severity_for_score(score: int) -> str:
+    for floor, severity in DREAD_SEVERITY_BINS:
+        if score >= floor:
+            return severity
+    return "Info"
+
+
+def extract_json(text: str) -> Optional[Any]:
+    """Parse a model reply as JSON, tolerating code fences and prose around the object."""
+    if not isinstance(text, str):
+        return text
+    t = text.strip()
+    if t.startswith("```"):
+        t = t.split("\n", 1)[1] if "\n" in t else ""
+        t = t.rsplit("```", 1)[0]
+    try:
+        return json.loads(t)
+    except Exception:
+        pass
+    start, end = t.find("{"), t.rfind("}")
+    if start != -1 and end > start:
+        try:
+            return json.loads(t[start:end + 1])
+        except Exception:
+            return None
+    return None
+
+
+def normalize_text(s: Any) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", str(s or "").lower()))
+
+
+def similarity(a: Any, b: Any) -> float:
+    a, b = normalize_text(a), normalize_text(b)
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def load_schemas(schema_dir: Path = SCHEMA_DIR) -> Dict[str, Dict[str, Any]]:
+    schemas = {}
+    for p in sorted(schema_dir.glob("*.schema.json")):
+        schemas[p.name] = json.loads(p.read_text(encoding="utf-8"))
+    return schemas
+
+
+@dataclass
+class EntitySpec:
+    """Where an ID-bearing record lives and how to recognise the same record from another model."""
+    kind: str
+    path: Tuple[str, ...]            # "*" walks every item of a list
+    id_field: str
+    match_fields: Tuple[str, ...] = ()   # must be equal
+    text_fields: Tuple[str, ...] = ()    # compared by normalized-text similarity
+
+
+ENTITY_SPECS = [
+    EntitySpec("element", ("dfds", "dfds", "*", "nodes"), "id", ("type",), ("label",)),
+    EntitySpec("boundary", ("trust_boundaries", "boundaries"), "id", (), ("name",)),
+    EntitySpec("dfd", ("dfds", "dfds"), "id", (), ("title",)),
+    EntitySpec("threat", ("dread", "ratings"), "threat_id", ("element_id", "stride"), ()),
+    EntitySpec("mitigation", ("mitigations", "items"), "id", (), ("title",)),
+    EntitySpec("annotation", ("annotated_dfds", "*", "annotations"), "annotation_id", ("target_id",), ("note",)),
+]
+
+
+def iter_records(doc: Any, path: Tuple[str, ...]) -> Iterator[Dict[str, Any]]:
+    if not path:
+        if isinstance(doc, list):
+            yield from (r for r in doc if isinstance(r, dict))
+        return
+    head, rest = path[0], path[1:]
+    if head == "*":
+        if isinstance(doc, list):
+            for item in doc:
+                yield from iter_records(item, rest)
+        return
+    if isinstance(doc, dict) and head in doc:
+        yield from iter_records(doc[head], rest)
+
+
+def remap_ids(doc: Any, mapping: Dict[str, str]) -> Any:
+    """Rewrite every string value equal to a remapped ID (applied simultaneously, no chaining)."""
+    if not mapping:
+        return doc
+    if isinstance(doc, dict):
+        return {k: remap_ids(v, mapping) for k, v in doc.items()}
+    if isinstance(doc, list):
+        return [remap_ids(v, mapping) for v in doc]
+    if isinstance(doc, str):
+        return mapping.get(doc, doc)
+    return doc
+
+
+@dataclass
+class MergeResult:
+    merged: Optional[Dict[str, Any]]                            # None if no input parsed
+    residual_outputs: List[str] = field(default_factory=list)   # inputs that could not be parsed
+    remapped_ids: Dict[int, Dict[str, str]] = field(default_factory=dict)  # input index -> {old: new}
+    conflicts: List[str] = field(default_factory=list)          # scalar disagreements resolved by policy
+
+
+@dataclass
+class JSONMerger:
+    """
+    Deterministic, schema-aware union of phase outputs from several models.
+
+    Records are matched by stable ID (TB-###, P|DS|EXT-###, DFD-###, TH-####, MIT-####).
+    When two models use the same ID for different things, the later record is
+    renumbered (and every reference to it in that model's output rewritten); when
+    they use different IDs for the same thing (by normalized-text similarity),
+    the later ID is folded into the earlier one. Scalar conflicts follow the
+    schema type: booleans OR, numbers max, enums keep the first, strings keep
+    the richer value within maxLength.
+    """
+    schema_dir: Path = SCHEMA_DIR
+    similarity_threshold: float = 0.85
+    schemas: Dict[str, Dict[str, Any]] = field(default_factory=dict, repr=False)
+    identity_keys: Dict[str, Tuple[str, ...]] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        if not self.schemas:
+            self.schemas = load_schemas(self.schema_dir)
+        if not self.identity_keys:
+            self.identity_keys = self._derive_identity_keys()
+
+    # --- public API ---
+    def merge(self, outputs: List[Any]) -> MergeResult:
+        parsed: List[Tuple[int, Dict[str, Any]]] = []
+        residual: List[str] = []
+        for i, out in enumerate(outputs):
+            doc = extract_json(out)
+            if isinstance(doc, dict):
+                parsed.append((i, doc))
+            else:
+                residual.append(out if isinstance(out, str) else json.dumps(out, ensure_ascii=False))
+
+        result = MergeResult(merged=None, residual_outputs=residual)
+        for i, doc in parsed:
+            if result.merged is None:
+                result.merged = json.loads(json.dumps(doc))  # deep copy
+                continue
+            mapping = self._reconcile_ids(result.merged, doc)
+            if mapping:
+                result.remapped_ids[i] = mapping
+                doc = remap_ids(doc, mapping)
+            result.merged = self._merge_value(result.merged, doc, self._root_schema(), "", result.conflicts)
+
+        if result.merged is not None:
+            self._recompute_derived(result.merged)
+        return result
+
+    # --- schema handling ---
+    def _root_schema(self) -> Dict[str, Any]:
+        props = {}
+        for key, name in SECTION_SCHEMAS.items():
+            schema = self.schemas.get(name, {})
+            props[key] = {"type": "array", "items": schema} if key == "annotated_dfds" else schema
+        return {"type": "object", "properties": props}
+
+    def _resolve(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        ref = schema.get("$ref") if isinstance(schema, dict) else None
+        if ref:
+            return self.schemas.get(ref, {})
+        return schema or {}
+
+    def _derive_identity_keys(self) -> Dict[str, Tuple[str, ...]]:
+        """Array property name -> identity fields: required string props carrying an ID pattern."""
+        keys: Dict[str, Tuple[str, ...]] = {}
+
+        def walk(schema: Dict[str, Any]) -> None:
+            for name, prop in (schema.get("properties") or {}).items():
+                prop = self._resolve(prop)
+                if prop.get("type") == "array":
+                    items = self._resolve(prop.get("items") or {})
+                    if items.get("type") == "object" or "properties" in items:
+                        id_fields = tuple(
+                            f for f in items.get("required", [])
+                            if (items["properties"].get(f) or {}).get("type") == "string"
+                            and "-[0-9]" in (items["properties"][f].get("pattern") or "")
+                        )
+                        if id_fields[:1]:
+                            keys.setdefault(name, id_fields[:1])
+                        walk(items)
+                elif prop.get("type") == "object" or "properties" in prop:
+                    walk(prop)
+
+        for schema in self.schemas.values():
+            walk(schema)
+        keys.update(IDENTITY_OVERRIDES)
+        return keys
+
+    # --- ID reconciliation ---
+    def _reconcile_ids(self, merged: Dict[str, Any], doc: Dict[str, Any]) -> Dict[str, str]:
+        mapping: Dict[str, str] = {}
+        used = self._all_ids(merged)
+        for spec in ENTITY_SPECS:
+            existing = {}
+            for r in iter_records(merged, spec.path):
+                existing.setdefault(r.get(spec.id_field), r)
+            decided = set()
+            # records in this doc were possibly re-pointed by earlier specs (e.g. threats -> elements)
+            for r in iter_records(remap_ids(doc, mapping), spec.path):
+                rid = r.get(spec.id_field)
+                if not isinstance(rid, str) or rid in mapping or rid in decided:
+                    continue
+                decided.add(rid)
+                same = self._find_same(spec, r, existing)
+                if same is not None:
+                    if same != rid:
+                        mapping[rid] = same
+                    continue
+                if rid in existing or rid in used:
+                    new_id = self._next_id(rid, used)
+                    mapping[rid] = new_id
+                    used.add(new_id)
+                else:
+                    used.add(rid)
+        return mapping
+
+    def _find_same(self, spec: EntitySpec, record: Dict[str, Any], existing: Dict[str, Dict[str, Any]]) -> Optional[str]:
+        rid = record.get(spec.id_field)
+        candidates = [existing[rid]] if rid in existing else []
+        candidates += [r for k, r in existing.items() if k != rid]
+        for other in candidates:
+            if any(record.get(f) != other.get(f) for f in spec.match_fields):
+                continue
+            if spec.text_fields:
+                score = similarity(
+                    " ".join(str(record.get(f, "")) for f in spec.text_fields),
+                    " ".join(str(other.get(f, "")) for f in spec.text_fields),
+                )
+                if score < self.similarity_threshold:
+                    continue
+            elif not spec.match_fields:
+                continue
+            return other.get(spec.id_field)
+        return None
+
+    @staticmethod
+    def _all_ids(doc: Any) -> set:
+        ids = set()
+
+        def walk(v):
+            if isinstance(v, dict):
+                for x in v.values():
+                    walk(x)
+            elif isinstance(v, list):
+                for x in v:
+                    walk(x)
+            elif isinstance(v, str) and ID_RE.match(v):
+                ids.add(v)
+
+        walk(doc)
+        return ids
+
+    @staticmethod
+    def _next_id(rid: str, used: set) -> str:
+        m = ID_RE.match(rid)
+        if not m:
+            return rid
+        prefix, width = m.group(1), len(m.group(2))
+        highest = max((int(ID_RE.match(u).group(2)) for u in used
+                       if ID_RE.match(u) and ID_RE.match(u).group(1) == prefix), default=0)
+        return f"{prefix}-{highest + 1:0{width}d}"
+
+    # --- structural merge ---
+    def _merge_value(self, a: Any, b: Any, schema: Dict[str, Any], where: str, conflicts: List[str]) -> Any:
+        schema = self._resolve(schema)
+        if a is None:
+            return b
+        if b is None:
+            return a
+        if isinstance(a, dict) and isinstance(b, dict):
+            props = schema.get("properties") or {}
+            out = dict(a)
+            for k, v in b.items():
+                out[k] = self._merge_value(a.get(k), v, props.get(k, {}), f"{where}.{k}", conflicts) if k in a else v
+            return out
+        if isinstance(a, list) and isinstance(b, list):
+            return self._merge_list(a, b, self._resolve(schema.get("items") or {}), where, conflicts)
+        return self._merge_scalar(a, b, schema, where, conflicts)
+
+    def _merge_list(self, a: list, b: list, item_schema: Dict[str, Any], where: str, conflicts: List[str]) -> list:
+        name = where.rsplit(".", 1)[-1]
+        key_fields = self.identity_keys.get(name)
+        out = list(a)
+        if key_fields and all(isinstance(x, dict) for x in a + b):
+            index = {tuple(x.get(f) for f in key_fields): n for n, x in enumerate(out)}
+            for item in b:
+                key = tuple(item.get(f) for f in key_fields)
+                if key in index:
+                    out[index[key]] = self._merge_value(out[index[key]], item, item_schema, where, conflicts)
+                else:
+                    index[key] = len(out)
+                    out.append(item)
+            return out
+        seen = {json.dumps(x, sort_keys=True, ensure_ascii=False) for x in out}
+        for item in b:
+            sig = json.dumps(item, sort_keys=True, ensure_ascii=False)
+            if sig not in seen:
+                seen.add(sig)
+                out.append(item)
+        return out
+
+    @staticmethod
+    def _merge_scalar(a: Any, b: Any, schema: Dict[str, Any], where: str, conflicts: List[str]) -> Any:
+        if a == b:
+            return a
+        kind = schema.get("type")
+        if kind == "boolean" or (isinstance(a, bool) and isinstance(b, bool)):
+            return bool(a) or bool(b)  # any model saying a threat applies wins
+        if "const" in schema or "enum" in schema:
+            conflicts.append(f"{where}: kept {a!r} over {b!r}")
+            return a
+        if kind in ("integer", "number") or (isinstance(a, (int, float)) and isinstance(b, (int, float))):
+            conflicts.append(f"{where}: took max of {a!r} and {b!r}")
+            return max(a, b)
+        if isinstance(a, str) and isinstance(b, str):
+            limit = schema.get("maxLength")
+            if len(b) > len(a) and (limit is None or len(b) <= limit):
+                return b
+            return a
+        return a
+
+    # --- derived fields ---
+    @staticmethod
+    def _recompute_derived(merged: Dict[str, Any]) -> None:
+        """Keep fields that are functions of the merged data consistent with it."""
+        stride = merged.get("stride_matrix")
+        if isinstance(stride, dict) and isinstance(stride.get("rows"), list):
+            elements = {n.get("id") for n in iter_records(merged, ("dfds", "dfds", "*", "nodes"))}
+            elements |= {r.get("element_id") for r in stride["rows"] if isinstance(r, dict)}
+            elements.discard(None)
+            cells = {(r.get("element_id"), r.get("stride")) for r in stride["rows"] if isinstance(r, dict)}
+            if elements:
+                stride["coverage_pct"] = round(100.0 * len(cells) / (len(elements) * 6), 1)
+
+        for rating in iter_records(merged, ("dread", "ratings")):
+            factors = rating.get("dread")
+            if isinstance(factors, dict) and all(isinstance(v, int) for v in factors.values()):
+                rating["score"] = sum(factors.values())
+                rating["severity"] = severity_for_score(rating["score"])
@@ -0,0 +1,309 @@
+import copy
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any, Tuple, Iterable
+
+from .json_merger import IDENTITY_OVERRIDES
+from .threat_model import compact, dumps
+
+# Array items are addressed by identity instead of position, e.g.
+#   /stride_matrix/rows/[element_id=P-001,stride=S]/threat
+#   /dfds/dfds/[id=DFD-001]/nodes/-            ("-" appends, as in RFC 6902)
+SELECTOR_RE = re.compile(r"^\[(.+)\]$")
+MENTIONED_ID_RE = re.compile(r"\b[A-Z]{1,4}-\d{3,4}\b")
+RECORD_ID_FIELDS = ("id", "threat_id", "annotation_id")
+
+# Evaluator suggestion category -> top-level section it concerns
+CATEGORY_SECTIONS = {
+    "trust_boundary": "trust_boundaries",
+    "dfd": "dfds",
+    "stride": "stride_matrix",
+    "dread": "dread",
+    "mitigation": "mitigations",
+    "annotation": "annotated_dfds",
+}
+
+PATCH_INSTRUCTIONS = """
+---
+PATCH MODE. A merged document has already been produced; it is NOT repeated here. You are given
+only the records the suggestions point at, the sections of suggestions that name no record
+(compact: bookkeeping fields and empty values omitted), and the IDs in use. Do NOT regenerate it.
+Apply ONLY the suggestions below by returning edits in this exact shape (STRICT JSON, nothing else):
+{"patches": [{"op": "add" | "replace" | "remove", "path": "<pointer>", "value": <json, omitted for remove>}]}
+
+Pointers are JSON Pointers, except that array items are addressed by identity in brackets:
+  /trust_boundaries/boundaries/[id=TB-002]/description
+  /stride_matrix/rows/[element_id=P-001,stride=S]
+  /dfds/dfds/[id=DFD-001]/nodes/-        ("-" appends a new item)
+Rules: keep every schema and ID pattern; new records get the next free ID of their kind;
+touch only what a suggestion requires; return {"patches": []} if nothing needs to change.
+"""
+
+
+class PatchError(ValueError):
+    pass
+
+
+@dataclass
+class PatchResult:
+    doc: Any
+    applied: List[Dict[str, Any]] = field(default_factory=list)
+    rejected: List[Tuple[Dict[str, Any], str]] = field(default_factory=list)  # (op, reason)
+    touched: set = field(default_factory=set)  # normalized paths replaced/removed
+
+
+def escape(segment: str) -> str:
+    return segment.replace("~", "~0").replace("/", "~1")
+
+
+def parse_pointer(path: str) -> List[str]:
+    if path == "":
+        return []
+    if not isinstance(path, str) or not path.startswith("/"):
+        raise PatchError(f"invalid pointer {path!r}")
+    tokens, buf, depth = [], "", 0
+    for ch in path[1:]:  # '/' inside [..] selectors (e.g. in values) does not split
+        if ch == "[":
+            depth += 1
+        elif ch == "]" and depth:
+            depth -= 1
+        if ch == "/" and depth == 0:
+            tokens.append(buf)
+            buf = ""
+        else:
+            buf += ch
+    tokens.append(buf)
+    return [t.replace("~1", "/").replace("~0", "~") for t in tokens]
+
+
+def parse_selector(token: str) -> Optional[Dict[str, str]]:
+    m = SELECTOR_RE.match(token.strip())
+    if not m:
+        return None
+    pairs = {}
+    for part in m.group(1).split(","):
+        if "=" not in part:
+            raise PatchError(f"invalid selector {token!r}")
+        k, v = part.split("=", 1)
+        pairs[k.strip()] = v.strip().strip("'\"")
+    return pairs
+
+
+def _matches(item: Any, selector: Dict[str, str]) -> bool:
+    return isinstance(item, dict) and all(str(item.get(k)) == v for k, v in selector.items())
+
+
+def _index(container: List[Any], token: str, allow_end: bool = False) -> int:
+    selector = parse_selector(token)
+    if selector is not None:
+        hits = [i for i, item in enumerate(container) if _matches(item, selector)]
+        if len(hits) != 1:
+            raise PatchError(f"selector {token} matched {len(hits)} items")
+        return hits[0]
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit():
+        raise PatchError(f"bad array index {token!r}")
+    i = int(token)
+    if i > len(container) or (i == len(container) and not allow_end):
+        raise PatchError(f"index {i} out of range")
+    return i
+
+
+def _get(doc: Any, tokens: List[str]) -> Any:
+    cur = doc
+    for t in tokens:
+        if isinstance(cur, dict):
+            if t not in cur:
+                raise PatchError(f"missing key {t!r}")
+            cur = cur[t]
+        elif isinstance(cur, list):
+            cur = cur[_index(cur, t)]
+        else:
+            raise PatchError(f"cannot descend into {type(cur).__name__} at {t!r}")
+    return cur
+
+
+def selector_for(list_key: str, record: Dict[str, Any]) -> Optional[str]:
+    """Identity selector for an array item, e.g. '[element_id=P-001,stride=S]'."""
+    fields = IDENTITY_OVERRIDES.get(list_key) or next(((f,) for f in RECORD_ID_FIELDS if f in record), ())
+    if not fields or any(record.get(f) is None for f in fields):
+        return None
+    return "[" + ",".join(f"{f}={record[f]}" for f in fields) + "]"
+
+
+def _identity(list_key: str, record: Any) -> Optional[Tuple]:
+    if not isinstance(record, dict):
+        return None
+    fields = IDENTITY_OVERRIDES.get(list_key) or next(((f,) for f in RECORD_ID_FIELDS if f in record), ())
+    values = tuple(record.get(f) for f in fields)
+    return values if fields and all(v is not None for v in values) else None
+
+
+def apply_op(doc: Any, op: Dict[str, Any]) -> str:
+    """Apply one op in place. Returns the op's normalized path; raises PatchError if it cannot apply."""
+    kind = op.get("op")
+    if kind not in ("add", "replace", "remove"):
+        raise PatchError(f"unsupported op {kind!r}")
+    if kind != "remove" and "value" not in op:
+        raise PatchError(f"{kind} without a value")
+    tokens = parse_pointer(op.get("path"))
+    if not tokens:
+        raise PatchError("refusing to replace the whole document")
+    parent, last = _get(doc, tokens[:-1]), tokens[-1]
+    parent_key = tokens[-2] if len(tokens) > 1 else ""
+    value = copy.deepcopy(op.get("value"))
+
+    if isinstance(parent, dict):
+        if kind == "add":
+            parent[last] = value
+        elif last not in parent:
+            raise PatchError(f"missing key {last!r}")
+        elif kind == "replace":
+            parent[last] = value
+        else:
+            del parent[last]
+    elif isinstance(parent, list):
+        if kind == "add":
+            ident = _identity(parent_key, value)
+            if ident is not None and any(_identity(parent_key, item) == ident for item in parent):
+                raise PatchError(f"{parent_key} item {ident} already exists")
+            parent.insert(_index(parent, last, allow_end=True), value)
+        else:
+            i = _index(parent, last)
+            if kind == "replace":
+                parent[i] = value
+            else:
+                parent.pop(i)
+    else:
+        raise PatchError(f"cannot {kind} inside {type(parent).__name__}")
+    return "/".join(escape(t) for t in tokens)
+
+
+def apply_patch(doc: Any, ops: Iterable[Dict[str, Any]], touched: Optional[set] = None) -> PatchResult:
+    """
+    Apply ops to a copy of doc, each independently: an op that does not apply is
+    rejected with a reason instead of aborting the patch. Paths in `touched`
+    (replaced/removed by an earlier patch) are not edited again.
+    """
+    result = PatchResult(doc=copy.deepcopy(doc), touched=set(touched or ()))
+    for op in ops:
+        if not isinstance(op, dict):
+            result.rejected.append(({"op": op}, "not an object"))
+            continue
+        try:
+            norm = "/".join(escape(t) for t in parse_pointer(op.get("path")))
+            if op.get("op") in ("replace", "remove") and any(
+                    norm == t or norm.startswith(t + "/") for t in result.touched):
+                raise PatchError("path already edited by an earlier patch")
+            path = apply_op(result.doc, op)
+        except PatchError as e:
+            result.rejected.append((op, str(e)))
+            continue
+        result.applied.append(op)
+        if op.get("op") != "add":
+            result.touched.add(path)
+    return result
+
+
+def extract_patches(parsed: Any) -> Optional[List[Dict[str, Any]]]:
+    """Accept {"patches": [...]} or a bare list of ops."""
+    if isinstance(parsed, dict) and isinstance(parsed.get("patches"), list):
+        return parsed["patches"]
+    if isinstance(parsed, list) and all(isinstance(o, dict) and "op" in o for o in parsed):
+        return parsed
+    return None
+
+
+def locate(doc: Any, ids: Iterable[str]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Pointers (with identity selectors) to every array record that carries one of `ids`."""
+    wanted = set(ids)
+    found: List[Tuple[str, Dict[str, Any]]] = []
+
+    def walk(node: Any, pointer: str, key: str) -> None:
+        if isinstance(node, dict):
+            for k, v in node.items():
+                walk(v, f"{pointer}/{escape(k)}", k)
+        elif isinstance(node, list):
+            for i, item in enumerate(node):
+                if not isinstance(item, dict):
+                    continue
+                sel = selector_for(key, item) or str(i)
+                item_ptr = f"{pointer}/{sel}"
+                fields = IDENTITY_OVERRIDES.get(key, ()) + RECORD_ID_FIELDS
+                if any(item.get(f) in wanted for f in fields):
+                    found.append((item_ptr, item))
+                else:
+                    walk(item, item_ptr, key)
+
+    walk(doc, "", "")
+    return found
+
+
+def id_index(doc: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Compact map of section -> record IDs, so a patch can add records with fresh IDs."""
+    index: Dict[str, List[str]] = {}
+
+    def walk(node: Any, section: str) -> None:
+        if isinstance(node, dict):
+            for f in RECORD_ID_FIELDS:
+                if isinstance(node.get(f), str):
+                    index.setdefault(section, []).append(node[f])
+            for v in node.values():
+                walk(v, section)
+        elif isinstance(node, list):
+            for v in node:
+                walk(v, section)
+
+    for section, value in doc.items():
+        walk(value, section)
+    return {k: sorted(set(v)) for k, v in index.items()}
+
+
+def _mentioned_ids(suggestion: Dict[str, Any]) -> set:
+    return set(MENTIONED_ID_RE.findall(f"{suggestion.get('id_or_location', '')} {suggestion.get('issue', '')}"))
+
+
+def patch_targets(doc: Dict[str, Any], suggestions: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Current value of every record the suggestions point at (by ID in id_or_location/issue)."""
+    ids = set()
+    for s in suggestions:
+        if isinstance(s, dict):
+            ids.update(_mentioned_ids(s))
+    return dict(locate(doc, ids))
+
+
+def untargeted_sections(doc: Dict[str, Any], suggestions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Compact current content of the section of each suggestion that names no existing
+    record (e.g. "add a boundary for the admin API"), so such edits are not made blind.
+    """
+    sections: Dict[str, Any] = {}
+    for s in suggestions:
+        if not isinstance(s, dict) or locate(doc, _mentioned_ids(s)):
+            continue
+        section = CATEGORY_SECTIONS.get(s.get("category"))
+        if section in doc and section not in sections:
+            sections[section] = compact(doc[section])
+    return sections
+
+
+def build_patch_request(doc: Dict[str, Any], suggestions: List[Dict[str, Any]]) -> str:
+    """
+    The round-2+ user turn: instructions, suggestions, targeted records, the sections of
+    suggestions without a target, and the ID index. The document itself is not sent.
+    """
+    targets = patch_targets(doc, suggestions)
+    sections = sorted({CATEGORY_SECTIONS.get(s.get("category"), "") for s in suggestions if isinstance(s, dict)} - {""})
+    untargeted = untargeted_sections(doc, suggestions)
+    return (
+        PATCH_INSTRUCTIONS
+        + "\nSUGGESTIONS:\n" + json.dumps(suggestions, ensure_ascii=False, indent=1)
+        + "\n\nCURRENT VALUE OF THE AFFECTED RECORDS (pointer -> record):\n"
+        + json.dumps(targets, ensure_ascii=False, indent=1)
+        + ("\n\nCURRENT CONTENT OF THE SECTIONS OF SUGGESTIONS THAT NAME NO RECORD (compact):\n"
+           + dumps(untargeted, indent=False) if untargeted else "")
+        + "\n\nSECTIONS CONCERNED: " + (", ".join(sections) or "see suggestions")
+        + "\nEXISTING IDS:\n" + json.dumps(id_index(doc), ensure_ascii=False)
+    )
@@ -1,7 +1,50 @@
-from dataclasses import dataclass
-from typing import Optional, List, Dict, Any
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import hashlib
+import json
+from typing import Optional, List, Dict, Any, AsyncIterator, Iterator, Tuple, Callable, Awaitable
 from openai import AsyncOpenAI
 from anthropic import AsyncAnthropic
+from .cassette import Cassette, ReplayedError
+from .client_pool import ClientPool
+from .response_cache import ResponseCache
+from .rate_limiter import RateLimiter, RetryPolicy, estimate_tokens, is_retryable, retry_after_seconds, status_code
+from .schema_validation import repair_json
+from .telemetry import Telemetry, CallRecord
+
+CLAUDE_MAX_TOKENS = 20000
+
+# Record of the request in flight, so the provider-specific _call_* methods can report usage
+_usage_sink: ContextVar[Optional[CallRecord]] = ContextVar("llm_usage_sink", default=None)
+
+
+def _note_usage(usage: Any) -> None:
+    rec = _usage_sink.get()
+    if rec is not None:
+        rec.add_usage(usage)
+
+
+def cacheable(text: str) -> Dict[str, Any]:
+    """
+    Text block that ends a stable prompt prefix (static instructions, schemas,
+    requirements). Anthropic caches up to this block; for OpenAI-style providers the
+    hint is dropped and the text is sent first, where automatic prefix caching applies.
+    """
+    return {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+
+
+def text_block(text: str) -> Dict[str, Any]:
+    return {"type": "text", "text": text}
+
+
+def flatten_content(content: Any) -> Any:
+    """A list of plain text blocks as one string (cache hints dropped); anything else unchanged."""
+    if isinstance(content, list) and all(isinstance(b, dict) and b.get("type") == "text" for b in content):
+        return "".join(b.get("text", "") for b in content)
+    return content
+
 
 @dataclass
 class LLMModel:
@@ -9,6 +52,15 @@ class LLMModel:
     api_key: str
     base_url: Optional[str] = None  # base_url is optional
     model_type: str = "openai"  # One of: "openai", "deepseek", "google", "anthropic"
+    client_pool: Optional[ClientPool] = field(default=None, repr=False, compare=False)  # shared, long-lived clients
+    response_cache: Optional[ResponseCache] = field(default=None, repr=False, compare=False)  # skip identical calls
+    concurrency: Optional[asyncio.Semaphore] = field(default=None, repr=False, compare=False)  # shared per-provider cap
+    rate_limiter: Optional[RateLimiter] = field(default=None, repr=False, compare=False)  # shared RPM/TPM budget
+    retry_policy: Optional[RetryPolicy] = field(default=None, repr=False, compare=False)  # None = fail on first error
+    telemetry: Optional[Telemetry] = field(default=None, repr=False, compare=False)  # per-call tokens/latency records
+    prompt_caching: bool = True  # mark cacheable prefixes (Anthropic cache_control / OpenAI prompt_cache_key)
+    cassette: Optional[Cassette] = field(default=None, repr=False, compare=False)  # record, or replay instead of calling
+    structured_outputs: bool = True  # callers may request provider-native JSON (see call_json)
 
     def __post_init__(self):
         # Basic validation: ensure API key looks reasonable
@@ -21,7 +73,310 @@ class LLMModel:
         """Returns the first few chars of the API key for debugging."""
         return self.api_key[:6] + "..."
 
+    @asynccontextmanager
+    async def _slot(self) -> AsyncIterator[None]:
+        """Hold one of the provider's concurrency slots (if capped) for the duration of a request."""
+        if self.concurrency is None:
+            yield
+            return
+        async with self.concurrency:
+            yield
+
+    @asynccontextmanager
+    async def _openai_client(self) -> AsyncIterator[AsyncOpenAI]:
+        """Pooled client if a ClientPool is attached, otherwise a one-shot client closed on exit."""
+        if self.client_pool is not None:
+            yield self.client_pool.openai(self.api_key, self.base_url)
+            return
+        client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url) \
+            if self.base_url else AsyncOpenAI(api_key=self.api_key)
+        async with client as session:
+            yield session
+
+    @asynccontextmanager
+    async def _anthropic_client(self) -> AsyncIterator[AsyncAnthropic]:
+        if self.client_pool is not None:
+            yield self.client_pool.anthropic(self.api_key, self.base_url)
+            return
+        client = AsyncAnthropic(api_key=self.api_key, base_url=self.base_url) \
+            if self.base_url else AsyncAnthropic(api_key=self.api_key)
+        async with client as session:
+            yield session
+
+    def generation_params(self, response_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Request parameters that change the output; part of the cache key."""
+        params: Dict[str, Any] = {"max_tokens": CLAUDE_MAX_TOKENS} if self.model_type == "anthropic" else {}
+        if response_format:
+            params["response_format"] = response_format
+        return params
+
+    def _cache_key(self, messages: List[dict], response_format: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        if self.response_cache is None:
+            return None
+        return ResponseCache.make_key(self.model_name, self.model_type, messages,
+                                      self.generation_params(response_format))
+
+    def _tape_key(self, operation: str, messages: List[dict], response_format: Optional[Dict[str, Any]] = None) -> str:
+        return Cassette.key(operation, ResponseCache.make_key(self.model_name, self.model_type, messages,
+                                                              self.generation_params(response_format)))
+
+    def _replay(self, operation: str, messages: List[dict], rec: CallRecord,
+                response_format: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """The recorded response when replaying a cassette; None when not replaying."""
+        if self.cassette is None or not self.cassette.replaying:
+            return None
+        hit = self.cassette.play(self._tape_key(operation, messages, response_format), f"{self.model_name} {operation}")
+        rec.replayed = True
+        for k, v in hit.usage.items():
+            setattr(rec, k, v)
+        if hit.error is not None:
+            raise ReplayedError(hit.error)
+        return hit.response
+
+    @contextmanager
+    def _taping(self, operation: str, messages: List[dict], rec: CallRecord,
+                response_format: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Record the request made inside the block on self.cassette (a no-op without one)."""
+        if self.cassette is None or self.cassette.replaying:
+            yield {"response": None}
+            return
+        with self.cassette.taping(self._tape_key(operation, messages, response_format), operation, self.model_name,
+                                  self.model_type, messages, rec) as tape:
+            yield tape
+
+    @contextmanager
+    def _observe(self, operation: str) -> Iterator[CallRecord]:
+        """Telemetry record for one request; a detached record when no Telemetry is attached."""
+        if self.telemetry is None:
+            yield CallRecord(model=self.model_name, provider=self.model_type, operation=operation)
+            return
+        with self.telemetry.observe_call(self.model_name, self.model_type, operation) as rec:
+            yield rec
+
     async def callwithmessages(self, messages: List[dict]) -> str:
+        with self._observe("chat") as rec:
+            replayed = self._replay("chat", messages, rec)
+            if replayed is not None:
+                return replayed
+            with self._taping("chat", messages, rec) as tape:
+                key = self._cache_key(messages)
+                if key:
+                    cached = self.response_cache.get(key)
+                    if cached is not None:
+                        rec.cache_hit = True
+                        tape["response"] = cached
+                        return cached
+                result = await self._with_retries(lambda: self._dispatch_messages(messages), messages, rec)
+                self._report_cached(rec)
+                tape["response"] = result
+        if key:
+            self.response_cache.put(key, result)
+        return result
+
+    async def call_json(self, messages: List[dict], response_format: Dict[str, Any]) -> Any:
+        """
+        Call with provider-native structured output and return the parsed object.
+        response_format is {"name", "schema"} (see schema_validation.response_format):
+        OpenAI gets it as a json_schema response_format, Anthropic as a forced tool call,
+        DeepSeek/Gemini as JSON mode. Cached and taped as JSON text.
+        """
+        with self._observe("json") as rec:
+            replayed = self._replay("json", messages, rec, response_format)
+            if replayed is not None:
+                return json.loads(replayed)
+            with self._taping("json", messages, rec, response_format) as tape:
+                key = self._cache_key(messages, response_format)
+                if key:
+                    cached = self.response_cache.get(key)
+                    if cached is not None:
+                        rec.cache_hit = True
+                        tape["response"] = cached
+                        return json.loads(cached)
+                doc = await self._with_retries(lambda: self._dispatch_json(messages, response_format), messages, rec)
+                self._report_cached(rec)
+                result = json.dumps(doc, ensure_ascii=False)
+                tape["response"] = result
+        if key:
+            self.response_cache.put(key, result)
+        return doc
+
+    async def call(self, prompt: str) -> str:
+        messages = [{"role": "user", "content": prompt}]
+        with self._observe("prompt") as rec:
+            replayed = self._replay("prompt", messages, rec)
+            if replayed is not None:
+                return replayed
+            with self._taping("prompt", messages, rec) as tape:
+                key = self._cache_key(messages)
+                if key:
+                    cached = self.response_cache.get(key)
+                    if cached is not None:
+                        rec.cache_hit = True
+                        tape["response"] = cached
+                        return cached
+                result = await self._with_retries(lambda: self._dispatch_prompt(prompt), messages, rec)
+                tape["response"] = result
+        if key:
+            self.response_cache.put(key, result)
+        return result
+
+    async def stream_with_messages(self, messages: List[dict],
+                                   response_format: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        Yield the response text as the model generates it. A cache hit is yielded
+        as a single chunk; a completed stream is written back to the cache.
+        With response_format (see call_json) the text is the structured JSON as it is
+        generated (for Anthropic, the forced tool call's input).
+        """
+        if self.model_type not in ("openai", "deepseek", "google", "anthropic"):
+            raise ValueError(f"Unsupported model type: {self.model_type}")
+        key = self._cache_key(messages, response_format)
+        parts = []
+        with self._observe("stream") as rec:
+            replayed = self._replay("stream", messages, rec, response_format)
+            if replayed is not None:
+                yield replayed
+                return
+            with self._taping("stream", messages, rec, response_format) as tape:
+                if key:
+                    cached = self.response_cache.get(key)
+                    if cached is not None:
+                        rec.cache_hit = True
+                        tape["response"] = cached
+                        yield cached
+                        return
+                attempt = 0
+                while True:
+                    attempt += 1
+                    await self._acquire(messages)
+                    stream = self._stream_claude(messages, rec, response_format) if self.model_type == "anthropic" \
+                        else self._stream_openai_style(messages, rec, response_format)
+                    try:
+                        async with self._slot():
+                            async for delta in stream:
+                                parts.append(delta)
+                                yield delta
+                    except Exception as e:
+                        # Only a stream that has produced nothing can be retried transparently
+                        if parts or not self._should_retry(e, attempt):
+                            raise
+                        rec.retries = attempt
+                        await self._backoff(e, attempt)
+                        continue
+                    if self.rate_limiter:
+                        self.rate_limiter.on_success()
+                    break
+                self._report_cached(rec)
+                tape["response"] = "".join(parts)
+        if key:
+            self.response_cache.put(key, "".join(parts))
+
+    def _report_cached(self, rec: CallRecord) -> None:
+        if rec.cached_tokens:
+            print(f"💾 {self.model_name}: {rec.cached_tokens}/{rec.prompt_tokens} prompt tokens read from the provider cache")
+
+    async def _acquire(self, messages: List[dict]) -> None:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(self._budget_tokens(messages))
+
+    def _budget_tokens(self, messages: List[dict]) -> int:
+        """
+        Input tokens charged to the TPM budget: the message text only. Anthropic does not
+        count cache reads against its input-token limit, so there a cacheable() prefix is
+        charged only the first time it is sent under this budget.
+        """
+        charged: List[str] = []
+        prefix: List[str] = []
+        for m in messages:
+            content = m.get("content", "")
+            if isinstance(content, str):
+                charged.append(content)
+                continue
+            if not isinstance(content, list):
+                continue
+            marked = [i for i, b in enumerate(content) if isinstance(b, dict) and b.get("cache_control")]
+            last = marked[-1] if marked else -1
+            for i, b in enumerate(content):
+                if isinstance(b, dict) and isinstance(b.get("text"), str):
+                    (prefix if i <= last else charged).append(b["text"])
+        if prefix:
+            key = hashlib.sha256("\x1e".join(prefix).encode("utf-8")).hexdigest()
+            if self.model_type != "anthropic" or not self.prompt_caching or self.rate_limiter.first_use(key):
+                charged.extend(prefix)
+        return estimate_tokens("".join(charged))
+
+    async def _with_retries(self, send: Callable[[], Awaitable[str]], messages: List[dict],
+                            rec: CallRecord) -> str:
+        """Run one request under the rate limiter and concurrency cap, retrying transient failures."""
+        attempt = 0
+        while True:
+            attempt += 1
+            await self._acquire(messages)
+            token = _usage_sink.set(rec)
+            try:
+                async with self._slot():
+                    result = await send()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                rec.retries = attempt
+                await self._backoff(e, attempt)
+                continue
+            finally:
+                _usage_sink.reset(token)
+            if self.rate_limiter:
+                self.rate_limiter.on_success()
+            return result
+
+    def _should_retry(self, exc: Exception, attempt: int) -> bool:
+        return self.retry_policy is not None and attempt < self.retry_policy.max_attempts and is_retryable(exc)
+
+    async def _backoff(self, exc: Exception, attempt: int) -> None:
+        retry_after = retry_after_seconds(exc)
+        if status_code(exc) == 429 and self.rate_limiter:
+            self.rate_limiter.on_rate_limited(retry_after)
+        delay = self.retry_policy.delay(attempt, retry_after)
+        print(f"⏳ {self.model_name}: {exc.__class__.__name__}; retry {attempt}/{self.retry_policy.max_attempts - 1} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    async def _stream_openai_style(self, messages: List[dict], rec: CallRecord,
+                                   response_format: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        # Only OpenAI itself is known to accept stream_options; usage arrives in a final chunk
+        extra = {"stream_options": {"include_usage": True}} if self.model_type == "openai" else {}
+        async with self._openai_client() as session:
+            stream = await session.chat.completions.create(
+                model=self.model_name,
+                messages=self._openai_messages(messages),
+                stream=True,
+                **extra,
+                **self._openai_cache_params(messages),
+                **self._openai_format_params(response_format),
+            )
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    rec.add_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    async def _stream_claude(self, messages: List[dict], rec: CallRecord,
+                             response_format: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        kwargs = {**self._claude_payload(messages), **self._claude_tool_params(response_format)}
+        async with self._anthropic_client() as client:
+            async with client.messages.stream(
+                model=self.model_name,
+                max_tokens=CLAUDE_MAX_TOKENS,
+                **kwargs,
+            ) as stream:
+                if response_format:
+                    async for event in stream:
+                        if event.type == "content_block_delta" and event.delta.type == "input_json_delta":
+                            yield event.delta.partial_json
+                else:
+                    async for text in stream.text_stream:
+                        yield text
+                rec.add_usage((await stream.get_final_message()).usage)
+
+    async def _dispatch_messages(self, messages: List[dict]) -> str:
         if self.model_type == "openai" or self.model_type == "deepseek":
             return await self._call_openai_stylewithmessages(messages)
         elif self.model_type == "google":
@@ -31,7 +386,15 @@ class LLMModel:
         else:
             raise ValueError(f"Unsupported model type: {self.model_type}")
 
-    async def call(self, prompt: str) -> str:
+    async def _dispatch_json(self, messages: List[dict], response_format: Dict[str, Any]) -> Any:
+        if self.model_type in ("openai", "deepseek", "google"):
+            return await self._call_openai_style_json(messages, response_format)
+        elif self.model_type == "anthropic":
+            return await self._call_claude_json(messages, response_format)
+        else:
+            raise ValueError(f"Unsupported model type: {self.model_type}")
+
+    async def _dispatch_prompt(self, prompt: str) -> str:
         if self.model_type == "openai" or self.model_type == "deepseek":
             return await self._call_openai_style(prompt)
         elif self.model_type == "google":
@@ -42,54 +405,146 @@ class LLMModel:
             raise ValueError(f"Unsupported model type: {self.model_type}")
      
     async def _call_openai_stylewithmessages(self, messages: List[dict]) -> str:
-        # choose the right client first
-        client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url) \
-            if self.base_url else AsyncOpenAI(api_key=self.api_key)
-
-        async with client as session:
+        async with self._openai_client() as session:
             response = await session.chat.completions.create(
                 model=self.model_name,
-                messages=messages,
+                messages=self._openai_messages(messages),
+                **self._openai_cache_params(messages),
             )
+        _note_usage(getattr(response, "usage", None))
         return response.choices[0].message.content or ""
 
-    async def _call_openai_style(self, prompt: str) -> str:
-        # pick client first (conditional expression is fine here)
-        client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url) \
-            if self.base_url else AsyncOpenAI(api_key=self.api_key)
+    async def _call_openai_style_json(self, messages: List[dict], response_format: Dict[str, Any]) -> Any:
+        async with self._openai_client() as session:
+            response = await session.chat.completions.create(
+                model=self.model_name,
+                messages=self._openai_messages(messages),
+                **self._openai_cache_params(messages),
+                **self._openai_format_params(response_format),
+            )
+        _note_usage(getattr(response, "usage", None))
+        text = response.choices[0].message.content or ""
+        doc, _ = repair_json(text)  # JSON mode (DeepSeek/Gemini) may still wrap the object in a fence
+        if doc is None:
+            raise ValueError(f"{self.model_name}: structured output is not JSON ({text[:80]!r})")
+        return doc
 
-        async with client as session:
+    async def _call_openai_style(self, prompt: str) -> str:
+        async with self._openai_client() as session:
             response = await session.chat.completions.create(
                 model=self.model_name,
                 messages=[{"role": "user", "content": prompt}],
             )
+        _note_usage(getattr(response, "usage", None))
         return response.choices[0].message.content or ""
 
     async def _call_geminiwithmessages(self, messages: List[dict]) -> str:
-        # Choose the client first
-        client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url) \
-            if self.base_url else AsyncOpenAI(api_key=self.api_key)
-
-        async with client as session:
+        async with self._openai_client() as session:
             response = await session.chat.completions.create(
                 model=self.model_name,
-                messages=messages,
+                messages=self._openai_messages(messages),
             )
+        _note_usage(getattr(response, "usage", None))
         return response.choices[0].message.content or ""
 
     async def _call_gemini(self, prompt: str) -> str:
-        # choose the client first
-        client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url) \
-            if self.base_url else AsyncOpenAI(api_key=self.api_key)
-
-        async with client as session:
+        async with self._openai_client() as session:
             response = await session.chat.completions.create(
                 model=self.model_name,
                 messages=[{"role": "user", "content": prompt}],
             )
+        _note_usage(getattr(response, "usage", None))
         return response.choices[0].message.content or ""
 
     async def _call_claudewithmessages(self, messages: List[Dict[str, Any]]) -> str:
+        kwargs = self._claude_payload(messages)  # top-level system + user/assistant messages
+
+        async with self._anthropic_client() as client:
+            response = await client.messages.create(
+                model=self.model_name,
+                max_tokens=CLAUDE_MAX_TOKENS,
+                **kwargs,
+            )
+
+        _note_usage(getattr(response, "usage", None))
+        return response.content[0].text
+
+    async def _call_claude_json(self, messages: List[dict], response_format: Dict[str, Any]) -> Any:
+        kwargs = {**self._claude_payload(messages), **self._claude_tool_params(response_format)}
+        async with self._anthropic_client() as client:
+            response = await client.messages.create(
+                model=self.model_name,
+                max_tokens=CLAUDE_MAX_TOKENS,
+                **kwargs,
+            )
+        _note_usage(getattr(response, "usage", None))
+        block = next((b for b in response.content if b.type == "tool_use"), None)
+        if block is None:
+            raise ValueError(f"{self.model_name}: no {response_format['name']} tool call in the response")
+        return block.input
+
+    def _openai_format_params(self, response_format: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        OpenAI: JSON Schema structured output, non-strict (strict mode needs every property
+        required and additionalProperties: false, which schemas/ does not use). DeepSeek/Gemini:
+        plain JSON mode.
+        """
+        if not response_format:
+            return {}
+        if self.model_type != "openai":
+            return {"response_format": {"type": "json_object"}}
+        return {"response_format": {"type": "json_schema", "json_schema": {
+            "name": response_format["name"], "schema": response_format["schema"], "strict": False}}}
+
+    @staticmethod
+    def _claude_tool_params(response_format: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Anthropic: a single tool whose input is the schema, forced with tool_choice."""
+        if not response_format:
+            return {}
+        name = response_format["name"]
+        return {"tools": [{"name": name, "description": f"Return the {name} result.",
+                           "input_schema": response_format["schema"]}],
+                "tool_choice": {"type": "tool", "name": name}}
+
+    @staticmethod
+    def _openai_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Chat Completions payload: cache hints removed, text-only block lists sent as one string."""
+        return [{**m, "content": flatten_content(m.get("content", ""))} for m in messages]
+
+    def _openai_cache_params(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        OpenAI caches prompt prefixes automatically; prompt_cache_key routes requests that
+        share a prefix to the same cache. The key hashes the system prompt and every block
+        up to the last cacheable() marker.
+        """
+        if not self.prompt_caching or self.model_type != "openai":
+            return {}
+        prefix: List[str] = []
+        for m in messages:
+            content = m.get("content", "")
+            if m.get("role") == "system":
+                prefix.append(flatten_content(content) if not isinstance(content, str) else content)
+            elif isinstance(content, list):
+                marked = [i for i, b in enumerate(content) if isinstance(b, dict) and b.get("cache_control")]
+                if marked:
+                    prefix.extend(b.get("text", "") for b in content[:marked[-1] + 1] if isinstance(b, dict))
+        if not prefix:
+            return {}
+        key = hashlib.sha256("\x1e".join(str(p) for p in prefix).encode("utf-8")).hexdigest()[:32]
+        return {"extra_body": {"prompt_cache_key": f"sdra-{key}"}}
+
+    def _claude_payload(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """system + messages kwargs for Anthropic, with the system prompt marked cacheable."""
+        system_text, new_messages = self._split_system(messages)
+        if not self.prompt_caching:
+            new_messages = [{**m, "content": flatten_content(m.get("content", ""))} for m in new_messages]
+        kwargs: Dict[str, Any] = {"messages": new_messages}
+        if system_text:
+            kwargs["system"] = [cacheable(system_text)] if self.prompt_caching else system_text
+        return kwargs
+
+    @staticmethod
+    def _split_system(messages: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
         # Extract system messages (Anthropic requires top-level system param)
         system_parts = []
         new_messages = []
@@ -110,23 +565,14 @@ class LLMModel:
                 new_messages.append(m)
 
         system_text = "\n".join(p for p in system_parts if p)
+        return system_text, new_messages
 
-        async with AsyncAnthropic(api_key=self.api_key) as client:
+    async def _call_claude(self, prompt: str) -> str:
+        async with self._anthropic_client() as client:
             response = await client.messages.create(
                 model=self.model_name,
-                max_tokens=20000,
-                system=system_text or None,  # Top-level system field
-                messages=new_messages,       # Only user/assistant
+                max_tokens=CLAUDE_MAX_TOKENS,
+                messages=[{"role": "user", "content": prompt}],
             )
-
+        _note_usage(getattr(response, "usage", None))
         return response.content[0].text
-
-    async def _call_claude(self, prompt: str) -> str:
-        client = AsyncAnthropic(api_key=self.api_key)
-
-        response = await client.messages.create(
-            model=self.model_name,
-            max_tokens=20000,
-            messages=[{"role": "user", "content": prompt}],
-        )
-        return response.content[0].text
\ No newline at end of file
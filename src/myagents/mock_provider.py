@@ -0,0 +1,235 @@
+import asyncio
+import itertools
+import json
+import random
+import threading
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any, Callable, AsyncIterator, Iterable
+
+import httpx
+
+from .rate_limiter import estimate_tokens
+
+# Keys that satisfy LLMModel's sanity check; the mock never looks at them
+MOCK_API_KEY = "mock-key-0000000000"
+
+
+@dataclass
+class MockBehavior:
+    """How the stand-in provider behaves: timing, failures and streaming granularity."""
+    latency_s: float = 0.0            # time to first token
+    jitter_s: float = 0.0             # +/- uniform noise on latency_s
+    tokens_per_s: Optional[float] = None  # generation speed; None = the whole answer at once
+    error_rate: float = 0.0           # fraction of requests answered with error_status
+    error_status: int = 503
+    retry_after_s: Optional[float] = None  # sent as retry-after on errors
+    chunk_chars: int = 64             # characters per streamed delta
+    seed: Optional[int] = None
+
+
+@dataclass
+class MockRequest:
+    """A provider request reduced to what a responder needs."""
+    provider: str                     # "openai" | "anthropic"
+    model: str
+    system: str
+    messages: List[Dict[str, Any]]    # non-system turns, content flattened to text
+    stream: bool
+    body: Dict[str, Any]
+
+    @property
+    def user(self) -> str:
+        """Text of the last user turn."""
+        return next((m["content"] for m in reversed(self.messages) if m.get("role") == "user"), "")
+
+    def prompt_text(self) -> str:
+        return "\n".join([self.system] + [m["content"] for m in self.messages])
+
+    @property
+    def response_schema(self) -> Optional[Dict[str, Any]]:
+        """Schema of a structured-output request (OpenAI json_schema or Anthropic forced tool), else None."""
+        fmt = self.body.get("response_format") or {}
+        if fmt.get("type") == "json_schema":
+            return fmt["json_schema"].get("schema")
+        return (_forced_tool(self.body) or {}).get("input_schema")
+
+
+Responder = Callable[[MockRequest], str]
+
+
+def replay(outputs: Iterable[str]) -> Responder:
+    """Answer requests with the recorded outputs in turn, cycling when they run out."""
+    cycle = itertools.cycle(list(outputs) or [""])
+    lock = threading.Lock()
+
+    def respond(request: MockRequest) -> str:
+        with lock:
+            return next(cycle)
+    return respond
+
+
+def _forced_tool(body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The tool an Anthropic request forces with tool_choice, if any."""
+    choice = body.get("tool_choice") or {}
+    if choice.get("type") != "tool":
+        return None
+    return next((t for t in body.get("tools") or [] if t.get("name") == choice.get("name")), None)
+
+
+def _tool_input(text: str) -> Dict[str, Any]:
+    """A forced tool call always carries a JSON object; anything else becomes {}."""
+    try:
+        doc = json.loads(text)
+    except ValueError:
+        return {}
+    return doc if isinstance(doc, dict) else {}
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(b.get("text", "") for b in content if isinstance(b, dict) and b.get("type") == "text")
+    return ""
+
+
+@dataclass
+class MockProvider:
+    """
+    In-process stand-in for the OpenAI Chat Completions and Anthropic Messages APIs.
+    transport() plugs into the SDK clients (see ClientPool.transport), so the real
+    request/response/streaming code paths run without network access or API keys.
+    A request forcing an Anthropic tool gets the responder's text back as the tool input.
+    Every request is kept in self.requests for assertions.
+    """
+    responder: Responder = field(default_factory=lambda: replay(["{}"]))
+    behavior: MockBehavior = field(default_factory=MockBehavior)
+    requests: List[MockRequest] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._rng = random.Random(self.behavior.seed)
+        self._lock = threading.Lock()
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.endswith("/chat/completions"):
+            provider = "openai"
+        elif path.endswith("/messages"):
+            provider = "anthropic"
+        else:
+            return httpx.Response(404, json={"error": {"message": f"mock: no route for {path}"}})
+        body = json.loads(request.content or b"{}")
+        req = self._parse(provider, body)
+        with self._lock:
+            self.requests.append(req)
+            failed = self._rng.random() < self.behavior.error_rate
+            delay = max(0.0, self.behavior.latency_s + self._rng.uniform(-1, 1) * self.behavior.jitter_s)
+
+        await asyncio.sleep(delay)
+        if failed:
+            return self._error(provider)
+        text = self.responder(req)
+        prompt_tokens = estimate_tokens(req.prompt_text())
+        completion_tokens = estimate_tokens(text)
+        if req.stream:
+            events = self._openai_events(req, text, prompt_tokens, completion_tokens) if provider == "openai" \
+                else self._anthropic_events(req, text, prompt_tokens, completion_tokens)
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events)
+        if self.behavior.tokens_per_s:
+            await asyncio.sleep(completion_tokens / self.behavior.tokens_per_s)
+        payload = self._openai_body(req, text, prompt_tokens, completion_tokens) if provider == "openai" \
+            else self._anthropic_body(req, text, prompt_tokens, completion_tokens)
+        return httpx.Response(200, json=payload)
+
+    # --- wire formats ---
+    @staticmethod
+    def _parse(provider: str, body: Dict[str, Any]) -> MockRequest:
+        turns = [{"role": m.get("role"), "content": _text(m.get("content"))} for m in body.get("messages") or []]
+        if provider == "anthropic":
+            system = _text(body.get("system") or "")
+        else:
+            system = "\n".join(t["content"] for t in turns if t["role"] in ("system", "developer"))
+            turns = [t for t in turns if t["role"] not in ("system", "developer")]
+        return MockRequest(provider=provider, model=str(body.get("model") or ""), system=system,
+                           messages=turns, stream=bool(body.get("stream")), body=body)
+
+    def _error(self, provider: str) -> httpx.Response:
+        status = self.behavior.error_status
+        headers = {}
+        if self.behavior.retry_after_s is not None:
+            headers["retry-after-ms"] = str(int(self.behavior.retry_after_s * 1000))
+        message = f"mock: injected {status}"
+        if provider == "anthropic":
+            kind = "rate_limit_error" if status == 429 else "overloaded_error"
+            return httpx.Response(status, headers=headers, json={"type": "error", "error": {"type": kind, "message": message}})
+        return httpx.Response(status, headers=headers, json={"error": {"message": message, "type": "server_error", "code": None}})
+
+    def _chunks(self, text: str) -> List[str]:
+        n = max(1, self.behavior.chunk_chars)
+        return [text[i:i + n] for i in range(0, len(text), n)] or [""]
+
+    async def _paced(self, chunks: List[str]) -> AsyncIterator[str]:
+        for chunk in chunks:
+            if self.behavior.tokens_per_s:
+                await asyncio.sleep(estimate_tokens(chunk) / self.behavior.tokens_per_s)
+            yield chunk
+
+    @staticmethod
+    def _openai_body(req: MockRequest, text: str, prompt_tokens: int, completion_tokens: int) -> Dict[str, Any]:
+        return {
+            "id": "chatcmpl-mock", "object": "chat.completion", "created": 0, "model": req.model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    async def _openai_events(self, req: MockRequest, text: str, prompt_tokens: int,
+                             completion_tokens: int) -> AsyncIterator[bytes]:
+        def event(choices: List[Dict[str, Any]], **extra: Any) -> bytes:
+            chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": 0,
+                     "model": req.model, "choices": choices, **extra}
+            return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+        async for piece in self._paced(self._chunks(text)):
+            yield event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+        yield event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (req.body.get("stream_options") or {}).get("include_usage"):
+            yield event([], usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                   "total_tokens": prompt_tokens + completion_tokens})
+        yield b"data: [DONE]\n\n"
+
+    @staticmethod
+    def _anthropic_body(req: MockRequest, text: str, prompt_tokens: int, completion_tokens: int) -> Dict[str, Any]:
+        tool = _forced_tool(req.body)
+        content = [{"type": "tool_use", "id": "toolu_mock", "name": tool["name"], "input": _tool_input(text)}] \
+            if tool else [{"type": "text", "text": text}]
+        return {
+            "id": "msg_mock", "type": "message", "role": "assistant", "model": req.model,
+            "content": content, "stop_reason": "tool_use" if tool else "end_turn", "stop_sequence": None,
+            "usage": {"input_tokens": prompt_tokens, "output_tokens": completion_tokens},
+        }
+
+    async def _anthropic_events(self, req: MockRequest, text: str, prompt_tokens: int,
+                                completion_tokens: int) -> AsyncIterator[bytes]:
+        def event(kind: str, data: Dict[str, Any]) -> bytes:
+            return f"event: {kind}\ndata: {json.dumps({'type': kind, **data})}\n\n".encode("utf-8")
+
+        tool = _forced_tool(req.body)
+        message = {**self._anthropic_body(req, "", prompt_tokens, 0), "content": [], "stop_reason": None}
+        yield event("message_start", {"message": message})
+        if tool:
+            text = json.dumps(_tool_input(text))
+            block = {"type": "tool_use", "id": "toolu_mock", "name": tool["name"], "input": {}}
+        else:
+            block = {"type": "text", "text": ""}
+        yield event("content_block_start", {"index": 0, "content_block": block})
+        async for piece in self._paced(self._chunks(text)):
+            delta = {"type": "input_json_delta", "partial_json": piece} if tool else {"type": "text_delta", "text": piece}
+            yield event("content_block_delta", {"index": 0, "delta": delta})
+        yield event("content_block_stop", {"index": 0})
+        yield event("message_delta", {"delta": {"stop_reason": "tool_use" if tool else "end_turn", "stop_sequence": None},
+                                      "usage": {"output_tokens": completion_tokens}})
+        yield event("message_stop", {})
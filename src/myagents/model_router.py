@@ -0,0 +1,224 @@
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from statistics import median
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+from .telemetry import CallRecord, Telemetry
+
+# Approximate list prices, USD per 1M (input, output) tokens; prefix match on model name.
+# Only used to rank candidates against each other.
+PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-5-nano": (0.05, 0.40),
+    "gpt-5-mini": (0.25, 2.00),
+    "gpt-5": (1.25, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-haiku": (1.00, 5.00),
+    "claude-sonnet": (3.00, 15.00),
+    "claude-opus": (15.00, 75.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+    "deepseek": (0.27, 1.10),
+}
+
+# provider -> Config attribute holding its key
+API_KEY_FIELDS = {
+    "openai": "openai_api_key",
+    "anthropic": "anthropic_api_key",
+    "google": "google_api_key",
+    "deepseek": "deepseek_api_key",
+}
+
+POLICIES = ("fixed", "fastest", "cheapest", "balanced")
+
+
+def price_for(model: str) -> Optional[Tuple[float, float]]:
+    for prefix in sorted(PRICES, key=len, reverse=True):
+        if model.startswith(prefix):
+            return PRICES[prefix]
+    return None
+
+
+@dataclass
+class Candidate:
+    provider: str
+    model: str
+
+    @classmethod
+    def parse(cls, spec: str) -> "Candidate":
+        """'provider:model', e.g. 'openai:gpt-5-mini'."""
+        provider, sep, model = spec.partition(":")
+        if not sep or not model:
+            raise ValueError(f"Model spec must look like 'provider:model', got '{spec}'")
+        return cls(provider.strip(), model.strip())
+
+    def __str__(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+
+@dataclass
+class StageRoute:
+    """
+    Models a stage may use, in configured order. `count` models are used at once
+    (the Phase 1/2 fan-out uses several); the rest are fallbacks, tried in order
+    when a call fails.
+    """
+    candidates: List[str]
+    policy: str = "fixed"
+    count: int = 1
+
+    def __post_init__(self):
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown routing policy '{self.policy}'. Choose one of: {', '.join(POLICIES)}")
+
+
+# Previous hard-coded choices stay the defaults for quality-sensitive stages;
+# merge and diagram conversion prefer the cheaper, faster model.
+DEFAULT_ROUTES: Dict[str, StageRoute] = {
+    "fanout": StageRoute(["openai:gpt-5", "anthropic:claude-sonnet-4-20250514"], "fixed", count=2),
+    "merge": StageRoute(["openai:gpt-5-mini", "openai:gpt-5"], "balanced"),
+    "evaluate": StageRoute(["openai:gpt-5", "anthropic:claude-sonnet-4-20250514"], "fixed"),
+    "report": StageRoute(["openai:gpt-5", "anthropic:claude-sonnet-4-20250514"], "fixed"),
+    "vision": StageRoute(["openai:gpt-5-mini", "openai:gpt-5"], "balanced"),  # converter is OpenAI-only
+}
+
+
+@dataclass
+class ModelStats:
+    """Observed behaviour of one model over recent calls (cache hits and replays excluded)."""
+    calls: int = 0
+    failures: int = 0
+    latencies: List[float] = field(default_factory=list)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def error_rate(self) -> float:
+        return self.failures / self.calls if self.calls else 0.0
+
+    @property
+    def latency(self) -> Optional[float]:
+        return median(self.latencies) if self.latencies else None
+
+    def cost_per_call(self, model: str) -> Optional[float]:
+        price = price_for(model)
+        ok = self.calls - self.failures
+        if price is None or not ok:
+            return None
+        return (self.prompt_tokens * price[0] + self.completion_tokens * price[1]) / 1e6 / ok
+
+
+def collect_stats(calls: Iterable[Any]) -> Dict[str, ModelStats]:
+    """Aggregate CallRecords (or their manifest dicts) per model."""
+    stats: Dict[str, ModelStats] = {}
+    for c in calls:
+        c = c if isinstance(c, dict) else c.__dict__
+        if c.get("cache_hit") or c.get("replayed") or not c.get("model"):
+            continue
+        s = stats.setdefault(c["model"], ModelStats())
+        s.calls += 1
+        if not c.get("ok", True):
+            s.failures += 1
+            continue
+        s.latencies.append(float(c.get("latency_s") or 0.0))
+        s.prompt_tokens += int(c.get("prompt_tokens") or 0)
+        s.completion_tokens += int(c.get("completion_tokens") or 0)
+    return stats
+
+
+def load_history(root: str | Path, limit: int = 20) -> List[Dict[str, Any]]:
+    """Call records from the most recent analytics manifests under root (see Telemetry.write)."""
+    paths = sorted(Path(root).glob("*/analytics_manifest.json"), key=lambda p: p.stat().st_mtime)[-limit:]
+    calls: List[Dict[str, Any]] = []
+    for p in paths:
+        try:
+            calls.extend(json.loads(p.read_text(encoding="utf-8")).get("calls") or [])
+        except Exception:
+            continue
+    return calls
+
+
+@dataclass
+class ModelRouter:
+    """
+    Picks the models for each pipeline stage. Candidates without an API key are skipped;
+    "fixed" keeps the configured order, the other policies rank by observed median latency,
+    cost per call, or both ("balanced", each normalized to the best candidate). Models
+    failing more than max_error_rate of recent calls go to the back. Observations come
+    from recent runs' manifests plus the current run's telemetry.
+    """
+    routes: Dict[str, StageRoute] = field(default_factory=lambda: dict(DEFAULT_ROUTES))
+    history: List[Dict[str, Any]] = field(default_factory=list)
+    telemetry: Optional[Telemetry] = None
+    max_error_rate: float = 0.5
+    min_samples: int = 3              # observations needed before stats override the configured order
+
+    @classmethod
+    def from_file(cls, path: str | Path, **kwargs: Any) -> "ModelRouter":
+        """Routes JSON: {"merge": {"candidates": ["openai:gpt-5-mini"], "policy": "balanced"}, ...}."""
+        raw = json.loads(Path(path).read_text(encoding="utf-8"))
+        routes = dict(DEFAULT_ROUTES)
+        for stage, spec in raw.items():
+            routes[stage] = StageRoute(**spec) if isinstance(spec, dict) else StageRoute(list(spec))
+        return cls(routes=routes, **kwargs)
+
+    def stats(self) -> Dict[str, ModelStats]:
+        live: List[CallRecord] = list(self.telemetry.calls) if self.telemetry else []
+        return collect_stats(list(self.history) + live)
+
+    def rank(self, stage: str, available: Optional[Iterable[str]] = None) -> List[Candidate]:
+        """Every usable candidate for the stage, best first."""
+        route = self.routes.get(stage)
+        if route is None:
+            raise KeyError(f"No route for stage '{stage}'")
+        candidates = [Candidate.parse(s) for s in route.candidates]
+        if available is not None:
+            allowed = set(available)
+            candidates = [c for c in candidates if c.provider in allowed]
+        if route.policy == "fixed" or len(candidates) < 2:
+            return self._demote_failing(candidates)
+
+        stats = self.stats()
+        latency = {c.model: stats[c.model].latency for c in candidates
+                   if c.model in stats and len(stats[c.model].latencies) >= self.min_samples}
+        cost = {c.model: stats[c.model].cost_per_call(c.model) for c in candidates
+                if c.model in stats and len(stats[c.model].latencies) >= self.min_samples}
+        cost = {m: v for m, v in cost.items() if v is not None}
+
+        def norm(values: Dict[str, Optional[float]], model: str) -> Optional[float]:
+            known = [v for v in values.values() if v]
+            if model not in values or not known or values[model] is None:
+                return None
+            return values[model] / min(known)
+
+        scores: Dict[str, Optional[float]] = {}
+        for c in candidates:
+            parts = []
+            if route.policy in ("fastest", "balanced"):
+                parts.append(norm(latency, c.model))
+            if route.policy in ("cheapest", "balanced"):
+                parts.append(norm(cost, c.model))
+            parts = [p for p in parts if p is not None]
+            scores[c.model] = sum(parts) / len(parts) if parts else None
+        # unobserved models are neither favoured nor buried: they score as the median observed model
+        known = [v for v in scores.values() if v is not None]
+        fill = median(known) if known else 0.0
+        order = sorted(range(len(candidates)),
+                       key=lambda i: (fill if scores[candidates[i].model] is None else scores[candidates[i].model], i))
+        return self._demote_failing([candidates[i] for i in order])
+
+    def _demote_failing(self, candidates: List[Candidate]) -> List[Candidate]:
+        stats = self.stats()
+
+        def failing(c: Candidate) -> bool:
+            s = stats.get(c.model)
+            return bool(s and s.calls >= self.min_samples and s.error_rate > self.max_error_rate)
+        return [c for c in candidates if not failing(c)] + [c for c in candidates if failing(c)]
+
+    def select(self, stage: str, available: Optional[Iterable[str]] = None) -> List[Candidate]:
+        """The `count` models to use now for the stage."""
+        return self.rank(stage, available)[:max(1, self.routes[stage].count)]
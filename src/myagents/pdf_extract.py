@@ -0,0 +1,42 @@
+from pathlib import Path
+from typing import Optional, Union, List, Dict, Tuple
+import fitz  # PyMuPDF
+from .image_dedup import DiagramImage, ImageDeduplicator, describe_png
+
+# Imported by each extraction worker process: keep this module's imports light (no API clients)
+
+
+def extract_pages(file: Path, start: int, stop: int,
+                  dedup: Optional[ImageDeduplicator]) -> List[Union[str, Tuple[int, DiagramImage]]]:
+    """
+    Text and diagrams of pages [start, stop) of a PDF, in page order. Runs in a worker
+    process for long PDFs (see DocumentParser), so it opens the document itself and
+    returns picklable parts: page text, or (xref, diagram) with the PNG encoded in memory under its would-be
+    <stem>_assets path. The caller merges repeats of an xref across page ranges.
+    """
+    assets_dir = file.parent / f"{file.stem}_assets"
+    parts: List[Union[str, Tuple[int, DiagramImage]]] = []
+    by_xref: Dict[int, DiagramImage] = {}
+    with fitz.open(file) as doc:
+        for page_idx in range(start, stop):
+            page = doc[page_idx]
+            txt = (page.get_text("text") or "").strip()
+            if txt:
+                parts.append(f"\n\n# [PDF:{file.name}] Page {page_idx + 1}\n{txt}")
+
+            for img_idx, img in enumerate(page.get_images(full=True), start=1):
+                xref, width, height = img[0], img[2], img[3]
+                if xref not in by_xref:
+                    if dedup is not None and dedup.is_icon(width, height):
+                        continue  # logos/icons: never rendered or sent to the vision model
+                    pix = fitz.Pixmap(doc, xref)
+                    try:
+                        if pix.alpha or pix.n > 3:
+                            pix = fitz.Pixmap(fitz.csRGB, pix)
+                        png = pix.tobytes("png")
+                    finally:
+                        pix = None
+                    by_xref[xref] = describe_png(assets_dir / f"{file.stem}_p{page_idx + 1}_i{img_idx}.png", png)
+                    by_xref[xref].png = png
+                parts.append((xref, by_xref[xref]))
+    return parts
@@ -0,0 +1,137 @@
+import json
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any
+
+from .json_merger import extract_json, iter_records
+from .threat_model import as_model
+
+STRIDE_ORDER = "STRIDE"
+EVIDENCE_SOURCES = ("requirement", "diagram", "assumption")
+UNBOUNDED = "(no boundary)"
+
+
+@dataclass
+class Shard:
+    """DFD elements of one trust boundary (or a piece of a large one), STRIDE-analysed together."""
+    index: int
+    boundary: str                      # TB-### or UNBOUNDED
+    elements: List[Dict[str, Any]]
+    flows: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def label(self) -> str:
+        return f"{self.boundary}[{len(self.elements)}]"
+
+
+class ShardError(ValueError):
+    pass
+
+
+def element_inventory(inventory: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """element_id -> first DFD node declaring it, in document order."""
+    nodes: Dict[str, Dict[str, Any]] = {}
+    for n in iter_records(inventory.get("dfds"), ("dfds", "*", "nodes")):
+        if isinstance(n.get("id"), str):
+            nodes.setdefault(n["id"], n)
+    return nodes
+
+
+def plan_shards(inventory: Dict[str, Any], max_elements: int = 12) -> List[Shard]:
+    """
+    One shard per trust boundary, split into pieces of at most max_elements. An element in
+    several boundaries is analysed once, with the first; elements outside every boundary
+    share an UNBOUNDED shard.
+    """
+    model = as_model(inventory)
+    nodes = model.elements
+    groups: Dict[str, List[str]] = {}
+    assigned = set()
+    for b in iter_records(inventory.get("trust_boundaries"), ("boundaries",)):
+        members = [e for e in b.get("elements") or [] if isinstance(e, str) and e in nodes and e not in assigned]
+        assigned.update(members)
+        if members:
+            groups.setdefault(str(b.get("id")), []).extend(members)
+    rest = [e for e in nodes if e not in assigned]
+    if rest:
+        groups[UNBOUNDED] = rest
+
+    size = max(1, max_elements)
+    shards: List[Shard] = []
+    for boundary, ids in groups.items():
+        for start in range(0, len(ids), size):
+            chunk = ids[start:start + size]
+            shards.append(Shard(
+                index=len(shards),
+                boundary=boundary,
+                elements=[nodes[i].to_dict() for i in chunk],
+                flows=[f.to_dict() for f in model.flows_for(chunk)],
+            ))
+    return shards
+
+
+def shard_request(s: Shard) -> str:
+    """The per-shard user turn (appended after the shared, cacheable requirements block)."""
+    payload = {"trust_boundary": s.boundary, "elements": s.elements, "data_flows": s.flows}
+    return (
+        "SHARD (produce all six STRIDE rows for EACH of these elements, and nothing else):\n"
+        + json.dumps(payload, ensure_ascii=False, indent=1)
+        + "\nReturn STRICT JSON only."
+    )
+
+
+def _evidence(items: Any) -> List[Dict[str, str]]:
+    out = []
+    for ev in items if isinstance(items, list) else []:
+        if isinstance(ev, dict) and ev.get("source_type") in EVIDENCE_SOURCES and ev.get("source_id"):
+            item = {"source_type": ev["source_type"], "source_id": str(ev["source_id"])}
+            if ev.get("quote"):
+                item["quote"] = str(ev["quote"])[:220]
+            out.append(item)
+    return out
+
+
+def parse_shard(text: str, s: Shard) -> List[Dict[str, Any]]:
+    """
+    Normalize one shard answer into stride_matrix rows (element_type taken from the
+    inventory). Raises ShardError unless every element has all six categories.
+    """
+    doc = extract_json(text)
+    raw = doc.get("rows") if isinstance(doc, dict) else doc
+    if not isinstance(raw, list):
+        raise ShardError("answer has no rows")
+    types = {e["id"]: e.get("type") for e in s.elements}
+    rows: Dict[tuple, Dict[str, Any]] = {}
+    for r in raw:
+        if not isinstance(r, dict) or r.get("element_id") not in types or r.get("stride") not in tuple(STRIDE_ORDER):
+            continue
+        key = (r["element_id"], r["stride"])
+        if key in rows:
+            continue
+        row = {
+            "element_id": key[0],
+            "element_type": types[key[0]],
+            "stride": key[1],
+            "applies": bool(r.get("applies")),
+            "example": str(r.get("example") or "")[:220],
+        }
+        evidence = _evidence(r.get("evidence"))
+        if evidence:
+            row["evidence"] = evidence
+        rows[key] = row
+    missing = [f"{e}/{c}" for e in types for c in STRIDE_ORDER if (e, c) not in rows]
+    if missing:
+        raise ShardError(f"missing {len(missing)} row(s): {', '.join(missing[:6])}")
+    return [rows[(e, c)] for e in types for c in STRIDE_ORDER]
+
+
+def stitch(inventory: Dict[str, Any], shards: List[Shard], results: Dict[int, List[Dict[str, Any]]],
+           run_id: Optional[str] = None) -> Dict[str, Any]:
+    """Phase 1 document: the inventory plus one stride_matrix built from every shard, in element order."""
+    order = {e: i for i, e in enumerate(element_inventory(inventory))}
+    rows = [r for i in sorted(results) for r in results[i]]
+    rows.sort(key=lambda r: (order.get(r["element_id"], len(order)), STRIDE_ORDER.find(r["stride"])))
+    run_id = run_id or next((inventory[k].get("run_id") for k in ("dfds", "trust_boundaries")
+                             if isinstance(inventory.get(k), dict) and inventory[k].get("run_id")), "run")
+    doc = {k: v for k, v in inventory.items() if k != "stride_matrix"}
+    doc["stride_matrix"] = {"schema_version": "1.0", "run_id": run_id, "rows": rows, "coverage_pct": 0.0}
+    return doc
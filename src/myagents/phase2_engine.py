@@ -0,0 +1,251 @@
+import asyncio
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any, Callable, Awaitable, Tuple
+
+from .json_merger import DREAD_SEVERITY_BINS, extract_json, iter_records, severity_for_score, similarity
+from .threat_model import ThreatModel, as_model
+
+STRIDE_ORDER = "STRIDE"
+DREAD_FACTORS = ("damage", "reproducibility", "exploitability", "affected_users", "discoverability")
+NIST_CSF_RE = re.compile(r"^(ID|PR|DE|RS|RC)\.[A-Z]{2}-[0-9]+$")
+
+
+@dataclass
+class Threat:
+    """An applicable STRIDE row, with the TH-#### ID it is rated under."""
+    threat_id: str
+    element_id: str
+    stride: str
+    example: str = ""
+
+
+@dataclass
+class Slice:
+    """One unit of Phase 2 work: a few DFD elements and their applicable threats."""
+    index: int
+    elements: List[Dict[str, Any]]
+    threats: List[Threat]
+    flows: List[Dict[str, Any]] = field(default_factory=list)
+    boundaries: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def label(self) -> str:
+        return ",".join(e.get("id", "?") for e in self.elements)
+
+
+@dataclass
+class SliceResult:
+    ratings: List[Dict[str, Any]]
+    mitigations: List[Dict[str, Any]]
+    annotations: Dict[str, str]          # element_id -> note
+
+
+class SliceError(ValueError):
+    pass
+
+
+def assign_threats(phase1: Dict[str, Any] | ThreatModel) -> List[Threat]:
+    """Applicable STRIDE rows in element/STRIDE order, numbered TH-0001.. (stable across re-runs)."""
+    rows = [r for r in as_model(phase1).stride if r.applies]
+    seen = set()
+    threats: List[Threat] = []
+    for r in sorted(rows, key=lambda r: (r.element_id, STRIDE_ORDER.find(r.stride))):
+        key = (r.element_id, r.stride)
+        if key in seen:
+            continue
+        seen.add(key)
+        threats.append(Threat(f"TH-{len(threats) + 1:04d}", r.element_id, r.stride, r.example))
+    return threats
+
+
+def plan_slices(phase1: Dict[str, Any] | ThreatModel, threats: List[Threat], elements_per_slice: int = 1) -> List[Slice]:
+    """Group threats by element; each slice carries the element's flows and boundaries as context."""
+    model = as_model(phase1)
+    by_element: Dict[str, List[Threat]] = {}
+    for t in threats:
+        by_element.setdefault(t.element_id, []).append(t)
+    element_ids = list(by_element)
+    slices: List[Slice] = []
+    for start in range(0, len(element_ids), max(1, elements_per_slice)):
+        ids = element_ids[start:start + max(1, elements_per_slice)]
+        boundaries = {b.id: b for i in ids for b in model.boundaries_of(i)}
+        slices.append(Slice(
+            index=len(slices),
+            elements=[model.elements[i].to_dict() if i in model.elements else {"id": i} for i in ids],
+            threats=[t for i in ids for t in by_element[i]],
+            flows=[f.to_dict() for f in model.flows_for(ids)],
+            boundaries=[{"id": b.id, "name": b.name} for b in boundaries.values()],
+        ))
+    return slices
+
+
+def slice_query(s: Slice) -> str:
+    """Retrieval query for one slice: its elements, flows, boundaries and threat examples."""
+    terms = [str(e.get(k, "")) for e in s.elements for k in ("id", "type", "label")]
+    terms += [f.get("label", "") for f in s.flows]
+    terms += [b.get("name", "") for b in s.boundaries]
+    terms += [t.example for t in s.threats]
+    return " ".join(t for t in terms if t)
+
+
+def slice_request(s: Slice) -> str:
+    """The per-slice user turn (appended after the slice's requirements block)."""
+    payload = {
+        "elements": s.elements,
+        "data_flows": s.flows,
+        "trust_boundaries": s.boundaries,
+        "threats": [{"threat_id": t.threat_id, "element_id": t.element_id, "stride": t.stride, "example": t.example}
+                    for t in s.threats],
+    }
+    bins = ", ".join(f"{floor}+ {sev}" for floor, sev in DREAD_SEVERITY_BINS)
+    return (
+        "SLICE (rate ONLY these threats; keep their threat_id values):\n"
+        + json.dumps(payload, ensure_ascii=False, indent=1)
+        + f"\n\nSeverity follows the DREAD score (sum of the five factors): {bins}."
+        + "\nReturn STRICT JSON only."
+    )
+
+
+def parse_slice(text: str, s: Slice) -> SliceResult:
+    """Validate one slice answer; raises SliceError if any threat is missing or malformed."""
+    doc = extract_json(text)
+    if not isinstance(doc, dict):
+        raise SliceError("answer is not a JSON object")
+    wanted = {t.threat_id: t for t in s.threats}
+    ratings: Dict[str, Dict[str, Any]] = {}
+    for r in doc.get("ratings") or []:
+        if not isinstance(r, dict) or r.get("threat_id") not in wanted:
+            continue
+        factors = r.get("dread") or {}
+        try:
+            values = {f: int(factors[f]) for f in DREAD_FACTORS}
+        except (KeyError, TypeError, ValueError):
+            continue
+        if not all(0 <= v <= 10 for v in values.values()):
+            continue
+        t = wanted[r["threat_id"]]
+        score = sum(values.values())
+        ratings[t.threat_id] = {
+            "threat_id": t.threat_id, "element_id": t.element_id, "stride": t.stride, "dread": values,
+            "score": score, "severity": severity_for_score(score),
+            "rationale": str(r.get("rationale") or "")[:300],
+        }
+    missing = [tid for tid in wanted if tid not in ratings]
+    if missing:
+        raise SliceError(f"no valid rating for {', '.join(missing)}")
+
+    mitigations = []
+    for m in doc.get("mitigations") or []:
+        if not isinstance(m, dict) or not m.get("title"):
+            continue
+        threat_ids = [t for t in m.get("threat_ids") or [] if t in wanted]
+        if not threat_ids:
+            continue
+        mitigations.append({
+            "title": str(m["title"]),
+            "description": str(m.get("description") or "")[:300],
+            "threat_ids": threat_ids,
+            "nist_csf": [c for c in m.get("nist_csf") or [] if isinstance(c, str) and NIST_CSF_RE.match(c)],
+            "effort": m.get("effort") if m.get("effort") in ("S", "M", "L") else "M",
+        })
+    element_ids = {e.get("id") for e in s.elements}
+    annotations = {a["element_id"]: str(a.get("note") or "")[:200] for a in doc.get("annotations") or []
+                   if isinstance(a, dict) and a.get("element_id") in element_ids}
+    return SliceResult([ratings[tid] for tid in wanted], mitigations, annotations)
+
+
+async def run_slices(
+    slices: List[Any],
+    ask: Callable[[Any, int], Awaitable[str]],
+    concurrency: int = 8,
+    attempts: int = 3,
+    parse: Callable[[str, Any], Any] = parse_slice,
+    label: str = "Phase 2",
+) -> Tuple[Dict[int, Any], Dict[int, str]]:
+    """
+    Run every slice (anything with an .index) through ask(slice, attempt) with at most
+    `concurrency` in flight. Slices whose answer fails parse(text, slice) are retried
+    (only those) up to `attempts` times.
+    Returns (results by slice index, last error by slice index for slices that never succeeded).
+    """
+    gate = asyncio.Semaphore(max(1, concurrency))
+    results: Dict[int, Any] = {}
+    failures: Dict[int, str] = {}
+
+    async def one(s: Slice, attempt: int) -> None:
+        async with gate:
+            try:
+                results[s.index] = parse(await ask(s, attempt), s)
+                failures.pop(s.index, None)
+            except Exception as e:
+                failures[s.index] = f"{e.__class__.__name__}: {e}"
+
+    pending = list(slices)
+    for attempt in range(1, attempts + 1):
+        if not pending:
+            break
+        if attempt > 1:
+            print(f"🔁 {label}: retrying {len(pending)} failed slice(s) (attempt {attempt}/{attempts})")
+        await asyncio.gather(*(one(s, attempt) for s in pending))
+        pending = [s for s in pending if s.index not in results]
+    return results, failures
+
+
+def _merge_mitigations(found: List[Dict[str, Any]], threshold: float = 0.85) -> List[Dict[str, Any]]:
+    merged: List[Dict[str, Any]] = []
+    for m in found:
+        twin = next((x for x in merged if similarity(x["title"], m["title"]) >= threshold), None)
+        if twin is None:
+            merged.append({**m, "threat_ids": list(m["threat_ids"]), "nist_csf": list(m["nist_csf"])})
+            continue
+        twin["threat_ids"] += [t for t in m["threat_ids"] if t not in twin["threat_ids"]]
+        twin["nist_csf"] += [c for c in m["nist_csf"] if c not in twin["nist_csf"]]
+        if len(m["description"]) > len(twin["description"]):
+            twin["description"] = m["description"]
+    return merged
+
+
+def assemble(phase1: Dict[str, Any] | ThreatModel, slices: List[Slice], results: Dict[int, SliceResult],
+             run_id: Optional[str] = None) -> Dict[str, Any]:
+    """Build the dread / annotated_dfds / mitigations document from the slice results."""
+    model = as_model(phase1)
+    run_id = run_id or model.run_id
+    ratings = sorted((r for res in results.values() for r in res.ratings), key=lambda r: r["threat_id"])
+    score = {r["threat_id"]: r["score"] for r in ratings}
+
+    mitigations = _merge_mitigations([m for i in sorted(results) for m in results[i].mitigations])
+    # Priority: highest-risk threat first, then breadth
+    mitigations.sort(key=lambda m: (-max(score.get(t, 0) for t in m["threat_ids"]), -len(m["threat_ids"]), m["title"]))
+    items = [{"id": f"MIT-{i:04d}", "title": m["title"], "description": m["description"],
+              "threat_ids": sorted(m["threat_ids"]), "priority": i, "nist_csf": m["nist_csf"],
+              "effort": m["effort"], "dependencies": []}
+             for i, m in enumerate(mitigations, start=1)]
+
+    notes = {el: note for res in results.values() for el, note in res.annotations.items()}
+    threats_by_element: Dict[str, List[str]] = {}
+    for r in ratings:
+        threats_by_element.setdefault(r["element_id"], []).append(r["threat_id"])
+    annotated, n = [], 0
+    for dfd in iter_records(model.doc.get("dfds"), ("dfds",)):
+        annotations = []
+        for node in dfd.get("nodes") or []:
+            el = node.get("id") if isinstance(node, dict) else None
+            if el not in threats_by_element:
+                continue
+            n += 1
+            tids = threats_by_element[el]
+            note = notes.get(el) or f"{len(tids)} threat(s): " + ", ".join(
+                f"{r['threat_id']} {r['stride']} ({r['severity']})" for r in ratings if r["element_id"] == el)
+            annotations.append({"annotation_id": f"ANN-{n:04d}", "target_id": el, "threat_ids": tids,
+                                "note": note[:200]})
+        if annotations:
+            annotated.append({"schema_version": "1.0", "run_id": run_id, "dfd_id": dfd.get("id"),
+                              "annotations": annotations})
+
+    return {
+        "dread": {"schema_version": "1.0", "run_id": run_id, "ratings": ratings},
+        "annotated_dfds": annotated,
+        "mitigations": {"schema_version": "1.0", "run_id": run_id, "items": items},
+    }
@@ -0,0 +1,134 @@
+import hashlib
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+from typing import Optional, List, Dict, Any, Callable, Awaitable, Tuple
+from .telemetry import Telemetry
+
+
+def content_hash(value: Any) -> str:
+    blob = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def folder_fingerprint(folder: str | Path, ignore: Optional[Callable[[Path], bool]] = None) -> str:
+    """
+    Cheap change detector for a design folder: names, sizes and mtimes of its files.
+    Files for which ignore(path) is true (e.g. outputs the parse writes back) are left out.
+    """
+    root = Path(folder).expanduser().resolve()
+    entries = sorted(
+        (f.name, f.stat().st_size, f.stat().st_mtime_ns)
+        for f in root.iterdir()
+        if f.is_file() and not f.name.startswith(".") and not (ignore and ignore(f))
+    )
+    return content_hash(entries)
+
+
+@dataclass
+class Stage:
+    name: str
+    run: Callable[..., Awaitable[str]]        # called with deps' outputs + params as keyword args
+    deps: Tuple[str, ...] = ()                # upstream stages whose outputs this stage consumes
+    params: Dict[str, Any] = field(default_factory=dict)  # other inputs (prompts, folder, ...)
+
+
+@dataclass
+class PipelineRunner:
+    """
+    Runs stages in order, checkpointing each to <run_dir>/<NN>_<stage>/:
+      inputs.json  - the exact inputs (dep outputs + params)
+      output.txt   - the stage output
+      meta.json    - input/output hashes and timing
+    A stage is skipped and its checkpoint reused when its input hash is unchanged.
+    resume_from=<stage> forces that stage and everything after it to re-run.
+    """
+    run_dir: Path
+    stages: List[Stage]
+    resume_from: Optional[str] = None
+    force: bool = False               # ignore every checkpoint
+    telemetry: Optional[Telemetry] = None  # records a "stage.<name>" span per executed stage
+
+    def __post_init__(self):
+        self.run_dir = Path(self.run_dir)
+        names = [s.name for s in self.stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate stage names: {names}")
+        if self.resume_from is not None and self.resume_from not in names:
+            raise ValueError(f"Unknown stage '{self.resume_from}'. Choose one of: {', '.join(names)}")
+
+    def stage_dir(self, name: str) -> Path:
+        idx = [s.name for s in self.stages].index(name)
+        return self.run_dir / f"{idx + 1:02d}_{name}"
+
+    async def run(self) -> Dict[str, str]:
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+        outputs: Dict[str, str] = {}
+        rerun_all = False
+        for stage in self.stages:
+            if stage.name == self.resume_from:
+                rerun_all = True
+            missing = [d for d in stage.deps if d not in outputs]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on {missing}, which must run before it")
+
+            inputs = {**{d: outputs[d] for d in stage.deps}, **stage.params}
+            input_hash = content_hash(inputs)
+            cached = None if (rerun_all or self.force) else self._load(stage.name, input_hash)
+            if cached is not None:
+                print(f"⏭️  Stage '{stage.name}': inputs unchanged, reusing checkpoint")
+                outputs[stage.name] = cached
+                continue
+
+            print(f"▶️  Stage '{stage.name}'")
+            started = datetime.now().isoformat(timespec="seconds")
+            t0 = perf_counter()
+            if self.telemetry is not None:
+                with self.telemetry.span(f"stage.{stage.name}", phase=stage.name):
+                    output = await stage.run(**inputs)
+            else:
+                output = await stage.run(**inputs)
+            self._save(stage.name, inputs, input_hash, output, started, perf_counter() - t0)
+            outputs[stage.name] = output
+        return outputs
+
+    # --- checkpoints ---
+    def _load(self, name: str, input_hash: str) -> Optional[str]:
+        d = self.stage_dir(name)
+        meta_path, out_path = d / "meta.json", d / "output.txt"
+        if not meta_path.exists() or not out_path.exists():
+            return None
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except Exception:
+            return None
+        if meta.get("input_hash") != input_hash:
+            return None
+        output = out_path.read_text(encoding="utf-8")
+        if content_hash(output) != meta.get("output_hash"):
+            return None  # truncated/edited checkpoint
+        return output
+
+    def _save(self, name: str, inputs: Dict[str, Any], input_hash: str, output: str,
+              started: str, seconds: float) -> None:
+        d = self.stage_dir(name)
+        d.mkdir(parents=True, exist_ok=True)
+        (d / "inputs.json").write_text(json.dumps(inputs, ensure_ascii=False, indent=1, default=str), encoding="utf-8")
+        (d / "output.txt").write_text(output, encoding="utf-8")
+        meta = {
+            "stage": name,
+            "input_hash": input_hash,
+            "output_hash": content_hash(output),
+            "started": started,
+            "seconds": round(seconds, 3),
+        }
+        (d / "meta.json").write_text(json.dumps(meta, indent=1), encoding="utf-8")
+
+    def recorded_param(self, stage_name: str, key: str) -> Optional[Any]:
+        """Read back an input recorded by a previous run (e.g. the design folder)."""
+        p = self.stage_dir(stage_name) / "inputs.json"
+        if not p.exists():
+            return None
+        return json.loads(p.read_text(encoding="utf-8")).get(key)
@@ -0,0 +1,189 @@
+from collections import Counter, defaultdict
+from typing import Optional, List, Dict, Any, Iterable
+
+from .json_merger import iter_records, normalize_text, severity_for_score
+
+STRIDE = "STRIDE"
+DREAD_FACTORS = ("damage", "reproducibility", "exploitability", "affected_users", "discoverability")
+COVERAGE_TOLERANCE = 0.5  # percentage points
+
+
+def suggestion(category: str, where: str, issue: str, rationale: str, change: str) -> Dict[str, str]:
+    """One entry in the evaluator's suggestion schema."""
+    return {"category": category, "id_or_location": where, "issue": issue,
+            "rationale": rationale, "suggested_change": change}
+
+
+def _ids(records: Iterable[Dict[str, Any]], key: str = "id") -> List[str]:
+    return [r[key] for r in records if isinstance(r.get(key), str)]
+
+
+def _dupes(values: Iterable[Any]) -> List[Any]:
+    return sorted((v for v, n in Counter(values).items() if n > 1), key=str)
+
+
+def check_structure(doc: Dict[str, Any], reference: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+    """
+    Mechanical consistency checks over a merged phase output: STRIDE coverage and
+    coverage_pct, dangling element/boundary/threat/mitigation IDs, duplicate threats,
+    and DREAD score/severity arithmetic. Only sections present in doc are checked;
+    IDs they refer to that live elsewhere (the DFDs, for a phase 2 document) are
+    looked up in reference.
+    """
+    ref = reference or {}
+
+    def section(key: str) -> Any:
+        return doc[key] if key in doc else ref.get(key)
+
+    out: List[Dict[str, str]] = []
+    dfds = section("dfds")
+    nodes = list(iter_records(dfds, ("dfds", "*", "nodes"))) if isinstance(dfds, dict) else []
+    node_types = {n["id"]: n.get("type") for n in nodes if isinstance(n.get("id"), str)}
+    boundaries = list(iter_records(section("trust_boundaries"), ("boundaries",)))
+    boundary_ids = set(_ids(boundaries))
+
+    # --- DFDs ---
+    for dfd in iter_records(doc.get("dfds"), ("dfds",)):
+        for e in dfd.get("edges") or []:
+            if not isinstance(e, dict):
+                continue
+            missing = [x for x in (e.get("from"), e.get("to")) if x not in node_types]
+            if missing:
+                out.append(suggestion(
+                    "dfd", f"{dfd.get('id')} edge {e.get('from')}->{e.get('to')}",
+                    f"Edge references undefined element(s) {', '.join(map(str, missing))}.",
+                    "Every data flow must connect nodes declared in the DFD.",
+                    "Add the missing nodes or correct the edge endpoints."))
+        unknown = [b for b in dfd.get("boundaries") or [] if boundary_ids and b not in boundary_ids]
+        if unknown:
+            out.append(suggestion(
+                "dfd", str(dfd.get("id")), f"DFD references unknown trust boundaries {', '.join(unknown)}.",
+                "Boundary IDs must match trust_boundaries.", "Use existing TB IDs or define the boundaries."))
+
+    # --- trust boundaries ---
+    if node_types and "trust_boundaries" in doc:
+        for b in boundaries:
+            unknown = [x for x in b.get("elements") or [] if x not in node_types]
+            if unknown:
+                out.append(suggestion(
+                    "trust_boundary", str(b.get("id")),
+                    f"Boundary lists elements not present in any DFD: {', '.join(map(str, unknown))}.",
+                    "Boundary membership must refer to DFD nodes.",
+                    "Add these elements to the DFDs or remove them from the boundary."))
+
+    # --- STRIDE matrix ---
+    stride = section("stride_matrix")
+    rows = list(iter_records(stride, ("rows",)))
+    if "stride_matrix" in doc:
+        cells = defaultdict(list)
+        for r in rows:
+            cells[r.get("element_id")].append(r.get("stride"))
+        for element, letters in cells.items():
+            if node_types and element not in node_types:
+                out.append(suggestion(
+                    "stride", str(element), f"STRIDE rows reference {element}, which is not a DFD element.",
+                    "Dangling rows cannot be traced to the design.",
+                    "Point the rows at an existing element or add it to the DFDs."))
+            dup = _dupes(letters)
+            if dup:
+                out.append(suggestion(
+                    "stride", str(element), f"Duplicate STRIDE rows for categories {', '.join(dup)}.",
+                    "Each (element, category) cell should appear once.", "Merge the duplicate rows."))
+        for element, etype in node_types.items():
+            missing = [c for c in STRIDE if c not in cells.get(element, ())]
+            if missing:
+                out.append(suggestion(
+                    "stride", element, f"Missing STRIDE rows for {', '.join(missing)}.",
+                    "Every DFD element needs all six STRIDE categories evaluated (applies true or false).",
+                    f"Add rows for {element} ({etype}) covering {', '.join(missing)}."))
+        for r in rows:
+            expected = node_types.get(r.get("element_id"))
+            if expected and r.get("element_type") not in (None, expected):
+                out.append(suggestion(
+                    "stride", f"{r.get('element_id')}/{r.get('stride')}",
+                    f"element_type is {r.get('element_type')!r} but the DFD says {expected!r}.",
+                    "The row type must match the element it describes.", f"Set element_type to {expected!r}."))
+        elements = set(node_types) | {e for e in cells if e is not None}
+        if isinstance(stride, dict) and elements and isinstance(stride.get("coverage_pct"), (int, float)):
+            actual = round(100.0 * len({(r.get("element_id"), r.get("stride")) for r in rows}) / (len(elements) * 6), 1)
+            if abs(actual - stride["coverage_pct"]) > COVERAGE_TOLERANCE:
+                out.append(suggestion(
+                    "stride", "stride_matrix.coverage_pct",
+                    f"coverage_pct is {stride['coverage_pct']} but the rows cover {actual}%.",
+                    "coverage_pct must equal covered cells / (elements x 6).", f"Set coverage_pct to {actual}."))
+
+    # --- DREAD ---
+    ratings = list(iter_records(section("dread"), ("ratings",)))
+    threat_ids = set(_ids(ratings, "threat_id"))
+    if "dread" not in doc:
+        ratings = []
+    for tid in _dupes(_ids(ratings, "threat_id")):
+        out.append(suggestion("dread", tid, f"Threat ID {tid} is used by more than one rating.",
+                              "Threat IDs must be unique.", "Renumber or merge the duplicates."))
+    for key in _dupes((r.get("element_id"), r.get("stride")) for r in ratings):
+        out.append(suggestion("dread", f"{key[0]}/{key[1]}", f"More than one DREAD rating for {key[0]} / {key[1]}.",
+                              "Each STRIDE cell is rated once.", "Merge the duplicate ratings."))
+    applicable = {(r.get("element_id"), r.get("stride")) for r in rows if r.get("applies")}
+    for r in ratings:
+        tid = str(r.get("threat_id"))
+        if node_types and r.get("element_id") not in node_types:
+            out.append(suggestion("dread", tid, f"Rating targets unknown element {r.get('element_id')}.",
+                                  "Ratings must trace to DFD elements.", "Correct element_id."))
+        elif applicable and (r.get("element_id"), r.get("stride")) not in applicable:
+            out.append(suggestion("dread", tid, f"{r.get('element_id')}/{r.get('stride')} is rated but has no "
+                                  "applicable STRIDE row.", "Only applicable threats are rated.",
+                                  "Remove the rating or mark the STRIDE row as applicable."))
+        factors = r.get("dread")
+        if isinstance(factors, dict) and all(isinstance(factors.get(f), int) for f in DREAD_FACTORS):
+            score = sum(factors[f] for f in DREAD_FACTORS)
+            if r.get("score") != score or r.get("severity") != severity_for_score(score):
+                out.append(suggestion(
+                    "dread", tid, f"score/severity ({r.get('score')}, {r.get('severity')}) do not match "
+                    f"the factors (sum {score}, {severity_for_score(score)}).",
+                    "score is the sum of the five factors; severity follows from the score.",
+                    f"Set score to {score} and severity to {severity_for_score(score)}."))
+
+    # --- mitigations ---
+    mitigations = list(iter_records(doc.get("mitigations"), ("items",)))
+    mitigation_ids = set(_ids(mitigations))
+    for m in mitigations:
+        unknown = [t for t in m.get("threat_ids") or [] if threat_ids and t not in threat_ids]
+        unknown_deps = [d for d in m.get("dependencies") or [] if d not in mitigation_ids]
+        if unknown or unknown_deps:
+            out.append(suggestion(
+                "mitigation", str(m.get("id")),
+                f"References unknown IDs: {', '.join(map(str, unknown + unknown_deps))}.",
+                "threat_ids must be rated threats and dependencies existing mitigations.",
+                "Correct or remove the dangling references."))
+    if threat_ids and mitigations:
+        covered = {t for m in mitigations for t in m.get("threat_ids") or []}
+        unmitigated = sorted(threat_ids - covered)
+        if unmitigated:
+            out.append(suggestion(
+                "mitigation", ", ".join(unmitigated[:10]), f"{len(unmitigated)} rated threat(s) have no mitigation.",
+                "Every rated threat should map to at least one mitigation.", "Add or extend mitigations."))
+
+    # --- annotated DFDs ---
+    for ann in iter_records(doc.get("annotated_dfds"), ("*", "annotations")):
+        bad = [x for x in [ann.get("target_id")] if node_types and x not in node_types]
+        bad += [t for t in ann.get("threat_ids") or [] if threat_ids and t not in threat_ids]
+        if bad:
+            out.append(suggestion(
+                "annotation", str(ann.get("annotation_id")), f"Annotation references unknown IDs: {', '.join(map(str, bad))}.",
+                "Annotations must point at DFD elements and rated threats.", "Correct the references."))
+
+    # --- near-identical threats on one element ---
+    seen: Dict[tuple, str] = {}
+    for r in rows if "stride_matrix" in doc else []:
+        text = normalize_text(r.get("example"))
+        if not r.get("applies") or not text:
+            continue
+        key = (r.get("element_id"), text)
+        if key in seen and seen[key] != r.get("stride"):
+            out.append(suggestion(
+                "stride", f"{r.get('element_id')}/{r.get('stride')}",
+                f"Same threat text as {r.get('element_id')}/{seen[key]}.",
+                "Copy-pasted examples usually mean one category was not really analysed.",
+                "Describe the threat specific to this STRIDE category."))
+        seen.setdefault(key, r.get("stride"))
+    return out
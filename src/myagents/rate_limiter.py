@@ -0,0 +1,218 @@
+import asyncio
+import random
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from time import monotonic
+from typing import Optional, Dict, Any, Tuple, Iterable
+
+# Conservative starting budgets per provider; override per "provider" or "provider/model"
+# (see parse_limit and `sdra review --rate-limit`).
+DEFAULT_LIMITS: Dict[str, Tuple[Optional[float], Optional[float]]] = {
+    "openai": (500, 450_000),      # (requests/min, tokens/min)
+    "anthropic": (50, 40_000),
+    "google": (150, 1_000_000),
+    "deepseek": (60, None),
+}
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "TimeoutException", "ConnectError",
+                    "ReadTimeout", "RemoteProtocolError", "TimeoutError"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 chars per token); good enough for budgeting."""
+    return max(1, len(text) // 4)
+
+
+def parse_limit(spec: str) -> Tuple[str, Tuple[Optional[float], Optional[float]]]:
+    """
+    'provider[/model]=RPM:TPM', e.g. 'anthropic=50:80000' or 'openai/gpt-5=500:'
+    (an empty side is unlimited) -> (key, (requests/min, tokens/min)).
+    """
+    key, sep, value = spec.partition("=")
+    rpm, colon, tpm = value.partition(":")
+    if not sep or not colon or not key.strip():
+        raise ValueError(f"Rate limit must look like 'provider[/model]=RPM:TPM', got '{spec}'")
+    try:
+        return key.strip(), (float(rpm) if rpm.strip() else None, float(tpm) if tpm.strip() else None)
+    except ValueError:
+        raise ValueError(f"Rate limit must look like 'provider[/model]=RPM:TPM', got '{spec}'") from None
+
+
+def status_code(exc: BaseException) -> Optional[int]:
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Rate limits, overloads, 5xx and connection/timeouts are transient; 4xx request errors are not."""
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    return type(exc).__name__ in RETRYABLE_ERRORS or isinstance(exc, (asyncio.TimeoutError, ConnectionError))
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Server-requested wait from retry-after-ms / retry-after (seconds or HTTP date) headers."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms is not None:
+            return max(0.0, float(ms) / 1000.0)
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            when = parsedate_to_datetime(value)
+            return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+    except Exception:
+        return None
+
+
+@dataclass
+class TokenBucket:
+    """Classic token bucket: holds up to `capacity`, refills at `rate` per second."""
+    capacity: float
+    rate: float
+    tokens: float = -1.0
+    updated: float = field(default_factory=monotonic)
+
+    def __post_init__(self):
+        if self.tokens < 0:
+            self.tokens = self.capacity
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (amounts above capacity wait for a full bucket)."""
+        self._refill(now)
+        need = min(amount, self.capacity) - self.tokens
+        return 0.0 if need <= 0 else need / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= amount  # may go negative for oversized requests; later callers wait it out
+
+
+@dataclass
+class RateLimiter:
+    """
+    Requests/min and tokens/min budget for one provider/model. Callers await
+    acquire() before each request. A 429 pauses everyone until retry-after and
+    cuts the rate; successes recover it gradually (AIMD), so a batch settles
+    just under the provider's real limit.
+    """
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    backoff_factor: float = 0.5     # rate multiplier on a 429
+    recovery_step: float = 0.05     # fraction of the configured rate regained per success
+    min_fraction: float = 0.1       # never throttle below this share of the configured rate
+    fraction: float = 1.0           # current share of the configured rate
+    throttled: int = 0              # 429s seen
+    _requests: Optional[TokenBucket] = field(default=None, repr=False)
+    _tokens: Optional[TokenBucket] = field(default=None, repr=False)
+    _blocked_until: float = field(default=0.0, repr=False)
+    _lock: Optional[asyncio.Lock] = field(default=None, repr=False)
+    _prefixes: set = field(default_factory=set, repr=False)
+
+    def __post_init__(self):
+        if self.requests_per_minute:
+            self._requests = TokenBucket(capacity=self.requests_per_minute / 60.0 * 10, rate=self.requests_per_minute / 60.0)
+        if self.tokens_per_minute:
+            self._tokens = TokenBucket(capacity=self.tokens_per_minute, rate=self.tokens_per_minute / 60.0)
+
+    async def acquire(self, tokens: int = 0) -> float:
+        """Wait for budget for one request of ~`tokens` tokens. Returns seconds waited."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        waited = 0.0
+        async with self._lock:  # FIFO: one caller waits for budget at a time
+            while True:
+                now = monotonic()
+                delay = max(0.0, self._blocked_until - now)
+                if self._requests:
+                    delay = max(delay, self._requests.wait_time(1, now))
+                if self._tokens and tokens:
+                    delay = max(delay, self._tokens.wait_time(tokens, now))
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+                waited += delay
+            if self._requests:
+                self._requests.take(1)
+            if self._tokens and tokens:
+                self._tokens.take(tokens)
+        return waited
+
+    def first_use(self, prefix_key: str) -> bool:
+        """True the first time a cached prompt prefix is sent under this budget."""
+        if prefix_key in self._prefixes:
+            return False
+        self._prefixes.add(prefix_key)
+        return True
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        self.throttled += 1
+        self.fraction = max(self.min_fraction, self.fraction * self.backoff_factor)
+        self._apply_fraction()
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, monotonic() + retry_after)
+
+    def on_success(self) -> None:
+        if self.fraction < 1.0:
+            self.fraction = min(1.0, self.fraction + self.recovery_step)
+            self._apply_fraction()
+
+    def _apply_fraction(self) -> None:
+        if self._requests:
+            self._requests.rate = self.requests_per_minute / 60.0 * self.fraction
+        if self._tokens:
+            self._tokens.rate = self.tokens_per_minute / 60.0 * self.fraction
+
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with full jitter; a server retry-after wins when it is longer."""
+    max_attempts: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number `attempt` (1-based)."""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            return min(self.max_delay, max(backoff, retry_after))
+        return backoff
+
+
+@dataclass
+class RateLimiterRegistry:
+    """One RateLimiter per provider/model, shared by every LLMModel (and review) in the process."""
+    limits: Dict[str, Tuple[Optional[float], Optional[float]]] = field(default_factory=lambda: dict(DEFAULT_LIMITS))
+    _limiters: Dict[str, RateLimiter] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def with_overrides(cls, specs: Iterable[str]) -> "RateLimiterRegistry":
+        """DEFAULT_LIMITS with each 'provider[/model]=RPM:TPM' spec applied (see parse_limit)."""
+        return cls(limits={**DEFAULT_LIMITS, **dict(parse_limit(s) for s in specs)})
+
+    def get(self, provider: str, model: str) -> RateLimiter:
+        key = f"{provider}/{model}"
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            rpm, tpm = self.limits.get(key) or self.limits.get(provider) or (None, None)
+            limiter = RateLimiter(requests_per_minute=rpm, tokens_per_minute=tpm)
+            self._limiters[key] = limiter
+        return limiter
+
+    def stats(self) -> Dict[str, Any]:
+        return {k: {"throttled": l.throttled, "rate_fraction": round(l.fraction, 2)}
+                for k, l in self._limiters.items()}
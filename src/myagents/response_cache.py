@@ -0,0 +1,153 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+
+@dataclass
+class ResponseCache:
+    """
+    Content-addressed cache of LLM responses stored in a local SQLite file.
+
+    Keys are a SHA-256 over (model_name, model_type, normalized messages, generation
+    params), so byte-identical prompts hit across runs. Entries expire after
+    ttl_seconds and the least recently used rows are evicted once the stored
+    responses exceed max_bytes. Set bypass=True to force fresh calls for a run
+    (fresh results are still written back).
+    """
+    path: Path = Path(".sdra_cache") / "responses.sqlite3"
+    ttl_seconds: Optional[float] = 7 * 24 * 3600   # None = never expire
+    max_bytes: int = 256 * 1024 * 1024
+    bypass: bool = False
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    _conn: Optional[sqlite3.Connection] = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    # --- keys ---
+    @staticmethod
+    def normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Normalize line endings and trailing whitespace so cosmetic edits don't miss.
+        Text-only block lists are joined, so prompt-caching hints never change a key.
+        """
+        def _norm_text(t: str) -> str:
+            return "\n".join(line.rstrip() for line in t.replace("\r\n", "\n").split("\n")).strip()
+
+        normalized = []
+        for m in messages:
+            content = m.get("content", "")
+            if isinstance(content, list) and all(isinstance(b, dict) and b.get("type") == "text" for b in content):
+                content = "".join(b.get("text", "") for b in content)
+            if isinstance(content, str):
+                content = _norm_text(content)
+            elif isinstance(content, list):
+                content = [
+                    {**b, "text": _norm_text(b["text"])} if isinstance(b, dict) and isinstance(b.get("text"), str) else b
+                    for b in content
+                ]
+            normalized.append({"role": m.get("role", "user"), "content": content})
+        return normalized
+
+    @classmethod
+    def make_key(cls, model_name: str, model_type: str, messages: List[Dict[str, Any]],
+                 params: Optional[Dict[str, Any]] = None) -> str:
+        payload = {
+            "model_name": model_name,
+            "model_type": model_type,
+            "messages": cls.normalize_messages(messages),
+            "params": params or {},
+        }
+        blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    # --- storage ---
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path.as_posix(), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed)")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        if self.bypass:
+            self.misses += 1
+            return None
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created = row
+            if self.ttl_seconds is not None and now - created > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            conn.commit()
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        if not value:
+            return
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            conn = self._connect()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drop least recently used rows until the total stored size fits max_bytes."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall():
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "bypass": self.bypass,
+        }
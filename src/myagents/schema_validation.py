@@ -0,0 +1,313 @@
+import json
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+from .json_merger import SCHEMA_DIR, SECTION_SCHEMAS, load_schemas
+
+# Top-level sections each phase must return (see the v1 prompts)
+PHASE_SECTIONS = {
+    "phase1": ("trust_boundaries", "dfds", "stride_matrix"),
+    "phase2": ("dread", "annotated_dfds", "mitigations"),
+    "inventory": ("trust_boundaries", "dfds"),  # first pass of a sharded phase 1
+}
+FINAL_SCHEMA = "final_deliverables.schema.json"
+SUGGESTIONS_SCHEMA = "suggestions.schema.json"  # the LLM evaluator's answer
+
+MAX_ERRORS = 20
+
+# A compiled check appends "pointer: message" strings to errors
+Check = Callable[[Any, str, List[str]], None]
+
+TYPES: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+FENCE_RE = re.compile(r"^\s*```[a-zA-Z0-9_-]*\s*\n?(.*?)\n?\s*```\s*$", re.S)
+TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+
+
+def compile_schema(schema: Dict[str, Any], schemas: Dict[str, Dict[str, Any]]) -> Check:
+    """
+    Compile the JSON Schema subset used in schemas/ (type, const, enum, pattern,
+    maxLength, minimum/maximum, required, properties, items, $ref by file name)
+    into nested closures, so validating an output does no schema interpretation.
+    """
+    cache: Dict[str, Check] = {}
+
+    def build(node: Dict[str, Any]) -> Check:
+        ref = node.get("$ref")
+        if ref:
+            if ref not in cache:
+                cache[ref] = lambda v, p, e: None  # placeholder for recursive refs
+                cache[ref] = build(schemas.get(ref, {}))
+            return lambda v, p, e: cache[ref](v, p, e)
+
+        checks: List[Check] = []
+        type_name = node.get("type")
+        if type_name:
+            names = type_name if isinstance(type_name, list) else [type_name]
+            preds = [TYPES[n] for n in names if n in TYPES]
+
+            def check_type(v, p, e, preds=preds, label="|".join(names)):
+                if not any(pred(v) for pred in preds):
+                    e.append(f"{p or '/'}: expected {label}, got {type(v).__name__}")
+                    raise _Stop
+            checks.append(check_type)
+        if "const" in node:
+            const = node["const"]
+            checks.append(lambda v, p, e: v == const or e.append(f"{p}: must be {const!r}"))
+        if "enum" in node:
+            allowed = node["enum"]
+            checks.append(lambda v, p, e: v in allowed or e.append(f"{p}: {v!r} not in {allowed}"))
+        if "pattern" in node:
+            rx = re.compile(node["pattern"])
+            checks.append(lambda v, p, e: not isinstance(v, str) or rx.search(v)
+                          or e.append(f"{p}: {v!r} does not match {rx.pattern}"))
+        if "maxLength" in node:
+            n = node["maxLength"]
+            checks.append(lambda v, p, e: not isinstance(v, str) or len(v) <= n
+                          or e.append(f"{p}: longer than {n} characters"))
+        if "minimum" in node:
+            lo = node["minimum"]
+            checks.append(lambda v, p, e: not TYPES["number"](v) or v >= lo or e.append(f"{p}: {v} < {lo}"))
+        if "maximum" in node:
+            hi = node["maximum"]
+            checks.append(lambda v, p, e: not TYPES["number"](v) or v <= hi or e.append(f"{p}: {v} > {hi}"))
+        if node.get("required"):
+            required = tuple(node["required"])
+
+            def check_required(v, p, e):
+                if isinstance(v, dict):
+                    for k in required:
+                        if k not in v:
+                            e.append(f"{p or '/'}: missing required '{k}'")
+            checks.append(check_required)
+        if node.get("properties"):
+            props = {k: build(s) for k, s in node["properties"].items()}
+
+            def check_props(v, p, e):
+                if isinstance(v, dict):
+                    for k, check in props.items():
+                        if k in v:
+                            check(v[k], f"{p}/{k}", e)
+            checks.append(check_props)
+        if isinstance(node.get("items"), dict):
+            item = build(node["items"])
+
+            def check_items(v, p, e):
+                if isinstance(v, list):
+                    for i, x in enumerate(v):
+                        if len(e) >= MAX_ERRORS:
+                            return
+                        item(x, f"{p}/{i}", e)
+            checks.append(check_items)
+
+        def check(v, p, e):
+            try:
+                for c in checks:
+                    c(v, p, e)
+            except _Stop:  # wrong type: the remaining keywords would only add noise
+                pass
+        return check
+
+    return build(schema)
+
+
+class _Stop(Exception):
+    pass
+
+
+@lru_cache(maxsize=None)
+def _schemas(schema_dir: Path) -> Dict[str, Dict[str, Any]]:
+    return load_schemas(schema_dir)
+
+
+def section_schema(sections: Tuple[str, ...], schemas: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Root schema for a phase output: an object holding the given SECTION_SCHEMAS sections."""
+    props = {}
+    for key in sections:
+        ref = {"$ref": SECTION_SCHEMAS[key]}
+        props[key] = {"type": "array", "items": ref} if key == "annotated_dfds" else ref
+    return {"type": "object", "required": list(sections), "properties": props}
+
+
+def _root_schema(kind: str, schemas: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    if kind in PHASE_SECTIONS:
+        return section_schema(PHASE_SECTIONS[kind], schemas)
+    if kind in schemas:
+        return schemas[kind]
+    raise KeyError(f"No schema for '{kind}'. Known: {', '.join(list(PHASE_SECTIONS) + sorted(schemas))}")
+
+
+@lru_cache(maxsize=None)
+def validator_for(kind: str, schema_dir: Path = SCHEMA_DIR) -> Check:
+    """Compiled (and cached) validator for a phase ("phase1", "phase2") or a schema file name."""
+    schemas = _schemas(schema_dir)
+    schema = _root_schema(kind, schemas)
+    return compile_schema(schema, schemas)
+
+
+def _inline(node: Any, schemas: Dict[str, Dict[str, Any]], seen: Tuple[str, ...] = ()) -> Any:
+    """node with every $ref replaced by the schema it names ($id/$schema dropped; a recursive ref becomes {})."""
+    if isinstance(node, list):
+        return [_inline(x, schemas, seen) for x in node]
+    if not isinstance(node, dict):
+        return node
+    ref = node.get("$ref")
+    if ref:
+        return {} if ref in seen else _inline(schemas.get(ref, {}), schemas, seen + (ref,))
+    return {k: _inline(v, schemas, seen) for k, v in node.items() if k not in ("$id", "$schema")}
+
+
+@lru_cache(maxsize=None)
+def response_format(kind: str, schema_dir: Path = SCHEMA_DIR) -> Dict[str, Any]:
+    """
+    {"name", "schema"} for provider-native structured output (see LLMModel.call_json):
+    the schema of a phase or schema file with every $ref inlined, since providers take
+    one self-contained schema. Cached; treat the result as read-only.
+    """
+    schemas = _schemas(schema_dir)
+    schema = _root_schema(kind, schemas)
+    if schema.get("type") != "object":
+        raise ValueError(f"Structured output needs an object schema; '{kind}' is {schema.get('type')!r}")
+    name = re.sub(r"[^a-zA-Z0-9_-]", "_", kind.replace(".schema.json", ""))[:64]
+    return {"name": name, "schema": _inline(schema, schemas)}
+
+
+def validate(doc: Any, kind: str, schema_dir: Path = SCHEMA_DIR) -> List[str]:
+    """Schema errors for doc (empty if valid), at most MAX_ERRORS of them."""
+    errors: List[str] = []
+    validator_for(kind, schema_dir)(doc, "", errors)
+    return errors[:MAX_ERRORS]
+
+
+# --- repair ---
+def _balanced_span(text: str) -> Optional[Tuple[int, int]]:
+    """Start/end of the first complete top-level {...} or [...] (string-aware)."""
+    start = next((i for i, ch in enumerate(text) if ch in "{["), None)
+    if start is None:
+        return None
+    depth, in_str, escaped = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return start, i + 1
+    return None
+
+
+def repair_json(text: str) -> Tuple[Optional[Any], List[str]]:
+    """
+    Parse a model reply, fixing the usual defects: BOM, code fences, prose before or
+    after the JSON, and trailing commas. Returns (parsed or None, repairs made).
+    """
+    if not isinstance(text, str):
+        return text, []
+    repairs: List[str] = []
+    t = text.lstrip("﻿").strip()
+    m = FENCE_RE.match(t)
+    if m:
+        t = m.group(1).strip()
+        repairs.append("code fence")
+    try:
+        return json.loads(t), repairs
+    except ValueError:
+        pass
+    span = _balanced_span(t)
+    if span and (span[0] > 0 or span[1] < len(t)):
+        t = t[span[0]:span[1]]
+        repairs.append("surrounding prose")
+        try:
+            return json.loads(t), repairs
+        except ValueError:
+            pass
+    fixed = TRAILING_COMMA_RE.sub(r"\1", t)
+    if fixed != t:
+        try:
+            return json.loads(fixed), repairs + ["trailing commas"]
+        except ValueError:
+            pass
+    return None, repairs
+
+
+def fill_constants(doc: Any, kind: str, schema_dir: Path = SCHEMA_DIR) -> List[str]:
+    """Insert missing required fields whose value the schema fixes (schema_version: "1.0")."""
+    schemas = _schemas(schema_dir)
+    filled: List[str] = []
+
+    def walk(v: Any, schema: Dict[str, Any], p: str) -> None:
+        schema = schemas.get(schema["$ref"], {}) if "$ref" in schema else schema
+        if isinstance(v, dict):
+            for k in schema.get("required", ()):
+                prop = (schema.get("properties") or {}).get(k) or {}
+                if k not in v and "const" in prop:
+                    v[k] = prop["const"]
+                    filled.append(f"{p}/{k}")
+            for k, sub in (schema.get("properties") or {}).items():
+                if k in v:
+                    walk(v[k], sub, f"{p}/{k}")
+        elif isinstance(v, list) and isinstance(schema.get("items"), dict):
+            for i, x in enumerate(v):
+                walk(x, schema["items"], f"{p}/{i}")
+
+    root = section_schema(PHASE_SECTIONS[kind], schemas) if kind in PHASE_SECTIONS else schemas.get(kind, {})
+    walk(doc, root, "")
+    return filled
+
+
+@dataclass
+class ValidationResult:
+    """Outcome of checking one model output against its schema."""
+    doc: Any = None
+    errors: List[str] = field(default_factory=list)
+    repairs: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.doc is not None and not self.errors
+
+    def text(self) -> str:
+        """The repaired document as canonical JSON."""
+        return json.dumps(self.doc, ensure_ascii=False, indent=2)
+
+
+def check_output(text: Any, kind: str, schema_dir: Path = SCHEMA_DIR) -> ValidationResult:
+    """Repair, then validate, one raw model output (or an already parsed structured output)."""
+    doc, repairs = repair_json(text)
+    if doc is None:
+        return ValidationResult(errors=["/: not parseable as JSON"], repairs=repairs)
+    if isinstance(doc, dict):
+        filled = fill_constants(doc, kind, schema_dir)
+        if filled:
+            repairs.append(f"filled {len(filled)} constant field(s)")
+    return ValidationResult(doc=doc, errors=validate(doc, kind, schema_dir), repairs=repairs)
+
+
+def repair_request(result: ValidationResult) -> str:
+    """Follow-up user turn asking a model to fix its own output."""
+    return (
+        "Your previous answer does not satisfy the required JSON schemas:\n"
+        + "\n".join(f"- {e}" for e in result.errors)
+        + "\n\nReturn the COMPLETE corrected JSON object only (STRICT JSON, no markdown, no commentary)."
+    )
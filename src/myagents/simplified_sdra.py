@@ -4,15 +4,31 @@ import asyncio
 from typing import Optional
 
 from .config import load_config, Config
-from .llm_model import LLMModel
-
-from .document_parser import DocumentParser
+from .llm_model import LLMModel, cacheable, text_block
+from .client_pool import ClientPool, PoolLimits
+from .response_cache import ResponseCache
+from .rate_limiter import RateLimiterRegistry, RetryPolicy
+from .telemetry import Telemetry
+from .context_builder import ContextBuilder, STAGE_QUERIES, count_message_tokens, context_window, query_from_json
+from .json_merger import JSONMerger, extract_json
+from .json_patch import apply_patch, build_patch_request, extract_patches
+from .completion import CompletionPolicy, LatencyTracker, run_with_policy
+from .schema_validation import SUGGESTIONS_SCHEMA, ValidationResult, check_output, repair_request, response_format
+from .pre_evaluator import check_structure
+from .phase2_engine import assemble, assign_threats, plan_slices, run_slices, slice_query, slice_request
+from .phase1_sharding import parse_shard, plan_shards, shard_request, stitch
+from .threat_model import ThreatModel, dumps, render
+from .model_router import API_KEY_FIELDS, ModelRouter, load_history
+from .cassette import Cassette
+from .incremental_json import IncrementalJSONParser, JSONRecord
+from .pipeline_runner import PipelineRunner, Stage, content_hash, folder_fingerprint
+
+from .document_parser import DocumentParser, is_conversion_output
 from .diagram_to_mermaid_converter import DiagramToMermaidConverter
 
 from pathlib import Path
 from datetime import datetime
-from tkinter import Tk, filedialog
-from typing import Optional, Tuple, Dict
+from typing import Optional, Tuple, Dict, Callable, Any
 from typing import List
 import json
 from time import perf_counter
@@ -24,6 +40,9 @@ import openai
 from openai import AsyncOpenAI
 
 
+PIPELINE_STAGES = ("parse", "phase1", "phase2", "report")
+
+
 @dataclass
 class SimplifiedSecurityDesignReviewAgent:
     config: Config
@@ -34,21 +53,159 @@ class SimplifiedSecurityDesignReviewAgent:
 
 
 
+    def make_model(self, model_name: str, api_key: str, model_type: str = "openai") -> LLMModel:
+        """Build an LLMModel that shares this agent's pooled clients and response cache."""
+        return LLMModel(
+            model_name=model_name,
+            api_key=api_key,
+            model_type=model_type,
+            client_pool=self.client_pool,
+            response_cache=self.response_cache,
+            concurrency=self.provider_limits.get(model_type),
+            rate_limiter=self.rate_limiters.get(model_type, model_name),
+            retry_policy=self.retry_policy,
+            telemetry=self.telemetry,
+            cassette=self.cassette,
+            structured_outputs=self.structured_outputs,
+        )
+
+    def requirements_context(self, stage: str, query: Optional[str] = None) -> str:
+        """
+        self.requirements trimmed to the stage's token budget: verbatim when it fits,
+        otherwise the sections most relevant to `query` (BM25), in document order.
+        """
+        if self._context_builder is None or self._context_builder.requirements is not self.requirements:
+            self._context_builder = ContextBuilder(self.requirements)
+        builder = self._context_builder
+        budget = self.context_budgets.get(stage)
+        text = builder.build(query or STAGE_QUERIES.get(stage, ""), budget)
+        if text is not self.requirements:
+            print(f"✂️ {stage}: requirements ~{builder.total_tokens} tokens > budget {budget}; sending the most relevant sections")
+        return text
+
+    def phase1_model(self) -> ThreatModel:
+        """self.phase1_output as a ThreatModel, parsed once per output (empty if it is not JSON)."""
+        if self._phase1_model is None or self._phase1_model[0] is not self.phase1_output:
+            self._phase1_model = (self.phase1_output, ThreatModel.from_json(self.phase1_output or ""))
+        return self._phase1_model[1]
+
+    def available_providers(self) -> List[str]:
+        return [p for p, attr in API_KEY_FIELDS.items() if getattr(self.config, attr, None)]
+
+    def models_for(self, stage: str) -> List[LLMModel]:
+        """The models self.router picks for a stage (only providers with an API key)."""
+        return [self.make_model(c.model, getattr(self.config, API_KEY_FIELDS[c.provider]), c.provider)
+                for c in self.router.select(stage, self.available_providers())]
+
+    def _format_for(self, model: LLMModel, schema: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Structured-output format for a call with a schema, if enabled for the agent and the model."""
+        if not schema or not self.structured_outputs or not getattr(model, "structured_outputs", False):
+            return None
+        return response_format(schema)
+
+    async def call_stage(self, stage: str, messages: List[dict], schema: Optional[str] = None) -> Any:
+        """
+        One call for a single-model stage: the router's best model, then its fallbacks in order.
+        With schema (and structured outputs), returns the parsed object instead of text.
+        """
+        last: Optional[Exception] = None
+        for c in self.router.rank(stage, self.available_providers()):
+            model = self.make_model(c.model, getattr(self.config, API_KEY_FIELDS[c.provider]), c.provider)
+            fmt = self._format_for(model, schema)
+            try:
+                return await model.call_json(messages, fmt) if fmt else await model.callwithmessages(messages)
+            except Exception as e:
+                last = e
+                print(f"⚠️ {stage}: {c} failed ({e.__class__.__name__}); trying the next model")
+        raise last or RuntimeError(f"No usable model for stage '{stage}'")
+
     def build_models(self) -> list[LLMModel]:
-        return [
-            LLMModel(model_name="gpt-5", api_key=self.config.openai_api_key, model_type="openai"),
-            LLMModel(model_name="claude-sonnet-4-20250514", api_key=self.config.anthropic_api_key, model_type="anthropic")
-        ]
+        return self.models_for("fanout")
 
 
-    def __init__(self, config_source: Optional[str] = None):
-        self.config = load_config()
+    def __init__(
+        self,
+        config_source: Optional[str] = None,
+        pool_limits: Optional[PoolLimits] = None,
+        client_pool: Optional[ClientPool] = None,
+        response_cache: Optional[ResponseCache] = None,
+        provider_limits: Optional[Dict[str, asyncio.Semaphore]] = None,
+        output_dir: Optional[str | Path] = None,
+        rate_limiters: Optional[RateLimiterRegistry] = None,
+        config: Optional[Config] = None,
+    ):
+        """
+        client_pool / response_cache / provider_limits / rate_limiters may be shared by several agents
+        (batch mode); shared resources are left open by aclose() for their owner to close.
+        config defaults to the API keys in the environment (see load_config).
+        """
+        self.config = config or load_config()
         self.requirements = None
         self.phase1_output = None
         self.phase2_output = None
         self.final_report = None
+        self._owns_pool = client_pool is None
+        self._owns_cache = response_cache is None
+        # warm connections reused across every phase; closed by aclose()
+        self.client_pool = client_pool if client_pool is not None else ClientPool(limits=pool_limits or PoolLimits())
+        self.response_cache = response_cache or ResponseCache()  # identical prompts are served from disk on re-runs
+        self.provider_limits = provider_limits or {}  # model_type -> semaphore capping in-flight requests
+        self.output_dir = Path(output_dir) if output_dir else Path(".")  # where intermediate files and the report are written
+        self.rate_limiters = rate_limiters or RateLimiterRegistry()  # per provider/model RPM+TPM budgets, adapt to 429s
+        self.retry_policy = RetryPolicy()  # jittered exponential retries for transient errors
+        self.telemetry = Telemetry()  # per-call tokens/latency; written to analytics_manifest.json per run
+        self.context_budgets = {"phase1": 100_000, "evaluate": 30_000, "phase2": 30_000}  # max requirement tokens per prompt
+        self._context_builder: Optional[ContextBuilder] = None
+        self._phase1_model: Optional[Tuple[Optional[str], ThreatModel]] = None
+        self.json_merger = JSONMerger()        # local merge of model outputs by stable ID
+        self.stream_outputs = True             # stream model answers and report records as they arrive
+        self.stream_progress_interval = 10.0   # seconds between streaming progress lines
+        self.patch_rounds = True               # rounds 2+ ask for targeted JSON-patch edits, not a full rewrite
+        self.completion_policy = CompletionPolicy()  # when call_models stops waiting (all / first_n / quorum, hedging)
+        self.latencies = LatencyTracker()      # per-model latency history for hedging
+        self._router: Optional[ModelRouter] = None  # built on first use; see the router property
+        self.schema_repair_attempts = 1        # re-requests for a model output that fails its schema
+        self.local_checks = True               # mechanical checks first; the LLM evaluator only reviews clean output
+        self.max_local_suggestions = 25        # cap per round so the follow-up prompt stays small
+        self.phase1_sharding = "auto"          # "auto" | "on" | "off": inventory pass + STRIDE per trust boundary
+        self.phase1_shard_min_tokens = 20_000  # auto: shard when the requirements are at least this large
+        self.phase1_shard_size = 12            # elements per STRIDE shard
+        self.phase1_shard_concurrency = 8
+        self.phase2_fanout = True              # phase 2 as per-element slices instead of one monolithic prompt
+        self.phase2_concurrency = 8            # slices in flight at once
+        self.phase2_elements_per_slice = 1
+        self.phase2_attempts = 3               # tries per slice; only failed slices are re-sent
+        self.cassette: Optional[Cassette] = None  # record every model call of a run, or replay one offline
+        self.structured_outputs = True         # schema'd calls use provider-native JSON (json_schema / forced tool use)
         print("✅ SimplifiedSecurityDesignReviewAgent initialized: config validated.")
 
+    @property
+    def router(self) -> ModelRouter:
+        """
+        Per-stage model choice from recent runs' latency/errors/cost (see model_router.DEFAULT_ROUTES).
+        Unless one is assigned, it is built on first use from the manifests of the runs next to
+        output_dir; without an output_dir there is no history.
+        """
+        if self._router is None:
+            history = load_history(self.output_dir.parent) if self.output_dir != Path(".") else []
+            self._router = ModelRouter(history=history, telemetry=self.telemetry)
+        return self._router
+
+    @router.setter
+    def router(self, router: ModelRouter) -> None:
+        self._router = router
+
+    async def aclose(self) -> None:
+        """Release pooled LLM clients and their keep-alive connections."""
+        if self._owns_pool:
+            await self.client_pool.aclose()
+        if self._owns_cache:
+            self.response_cache.close()
+
+    def output_path(self, filename: str) -> Path:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        return self.output_dir / filename
+
     def load_prompt(self, filename: str, version: Optional[str] = None) -> str:
         """
         Load a prompt file from prompts/<version>/<filename> relative to the project root.
@@ -69,6 +226,8 @@ class SimplifiedSecurityDesignReviewAgent:
         Open a file dialog to let the user pick the folder that contains
         the requirements and design documents. Returns the selected path.
         """
+        from tkinter import Tk, filedialog  # imported here so headless runs never need Tk
+
         # Hide the root Tk window
         root = Tk()
         root.withdraw()
@@ -80,19 +239,51 @@ class SimplifiedSecurityDesignReviewAgent:
             raise ValueError("No folder selected.")
         return folder
 
-    def parse_design_folder(self, folder: str | None = None) -> str:
-        conv = DiagramToMermaidConverter(api_key=self.config.openai_api_key, model_name="gpt-5")
-        dp = DocumentParser(converter=conv)
+    def parse_design_folder(self, folder: str | None = None, incremental: bool = True) -> str:
+        """
+        Parse every document in the folder into self.requirements.
+        With incremental=True, unchanged files and diagrams are reused from the
+        folder's fingerprint cache instead of being re-extracted and re-converted.
+        """
         if folder is None:
             raise ValueError("Provide a folder path (keep this simple in the new repo).")
+        dp = self._design_parser(incremental)
         dp.parse_folder(folder)
-        self.requirements = dp.get_design_as_text()
-        
+        return self._store_requirements(dp.get_design_as_text())
+
+    async def aparse_design_folder(self, folder: str, incremental: bool = True) -> str:
+        """
+        parse_design_folder on the running event loop, so other reviews keep going meanwhile.
+        Diagram conversions share the agent's pooled client, provider cap and rate limiter.
+        """
+        dp = self._design_parser(incremental, on_loop=True)
+        await dp.aparse_folder(folder)
+        return self._store_requirements(dp.get_design_as_text())
+
+    def _design_parser(self, incremental: bool, on_loop: bool = False) -> DocumentParser:
+        vision = self.router.select("vision", ["openai"])  # the converter speaks the OpenAI API only
+        conv = DiagramToMermaidConverter(api_key=self.config.openai_api_key,
+                                         model_name=vision[0].model if vision else "gpt-5")
+        conv.telemetry = self.telemetry  # diagram conversions are recorded as "parse" calls
+        conv.transport = self.client_pool.transport  # same (possibly mock) provider as every other call
+        conv.cassette = self.cassette
+        conv.retry_policy = self.retry_policy  # transient vision failures back off like every other call
+        if on_loop:  # pooled clients and semaphores belong to this loop; parse_folder runs its own
+            conv.async_client = self.client_pool.openai(self.config.openai_api_key)
+            conv.concurrency = self.provider_limits.get("openai")
+            conv.rate_limiter = self.rate_limiters.get("openai", conv.model_name)
+        # incremental parse caches live next to the response cache, never in the design folder
+        return DocumentParser(converter=conv, incremental=incremental,
+                              cache_dir=Path(self.response_cache.path).parent / "parse")
+
+    def _store_requirements(self, text: str) -> str:
+        self.requirements = text
+
         # Save requirements to file
-        with open('parsedrequirements.txt', 'w', encoding='utf-8') as f:
+        with open(self.output_path('parsedrequirements.txt'), 'w', encoding='utf-8') as f:
             f.write(self.requirements)
-        
-        return dp.get_design_as_text()
+
+        return self.requirements
 
 
     async def eval_suggest_improve(
@@ -100,33 +291,50 @@ class SimplifiedSecurityDesignReviewAgent:
         system_prompt: str,
         user_prompt: str,
         models: List[LLMModel],   # <-- was List[str]
+        schema: Optional[str] = None,
     ) -> str:
         """
         Prepare role-based messages, call the models up to 3 rounds,
         merge their outputs, ask for suggested improvements, and stop
         early if no suggestions are returned. Returns the final merged output.
+        With self.patch_rounds, later rounds send only the suggestions and the
+        records they point at; models answer with patches that are applied to
+        the merged document in place (full regeneration if no patch parses).
+        schema ("phase1", "phase2") validates each full model output before it is merged.
         """
         if not self.requirements:
             raise ValueError("Requirements not set. Parse the design folder before evaluation.")
 
-        # Prepare role-based messages (user prompt should already include any placeholders filled in)
+        # Prepare role-based messages (user prompt should already include any placeholders filled in).
+        # System + user prompt form a stable prefix shared by every model and round; only the
+        # suggestions appended after it change, so later rounds hit the provider prompt cache.
         messages = [
             {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
+            {"role": "user", "content": [cacheable(user_prompt)]},
         ]
 
         merged_output: str = ""
+        patch_messages: Optional[List[dict]] = None
         for round_idx in range(1, 3):  # up to 2 iterations
             print(f"🔁 evalSuggestImprove: round {round_idx}")
 
-            # Call all models asynchronously with the same messages
-            outputs = await self.call_models(messages, models)
+            with self.telemetry.span("round", round=round_idx):
+                patched = None
+                if patch_messages is not None:
+                    with self.telemetry.span("patch"):
+                        patched = await self._patch_round(patch_messages, merged_output, models)
+                if patched is not None:
+                    merged_output = patched
+                else:
+                    # Call all models asynchronously with the same messages
+                    outputs = await self.call_models(messages, models, schema=schema)
 
-            merged_output = await self.merge_outputs(outputs)
+                    with self.telemetry.span("merge"):
+                        merged_output = await self.merge_outputs(outputs, schema)
 
-            
-            # Evaluate merged output and ask for suggestions (stub logic for now)
-            suggested = await self.evaluate_merged_output(merged_output)
+                # Evaluate merged output and ask for suggestions (stub logic for now)
+                with self.telemetry.span("evaluate"):
+                    suggested = await self.evaluate_merged_output(merged_output)
 
             if isinstance(suggested, str) and suggested.strip().lower() == "none":
                 print("✅ No further improvements suggested. Stopping.")
@@ -135,49 +343,207 @@ class SimplifiedSecurityDesignReviewAgent:
             # If suggestions exist, append them to the user prompt to guide the next round
             if suggested:
                 # Simple pattern: feed suggestions back into the next user turn
-                improved_user = (
-                    user_prompt
-                    + "\n\n---\nPlease incorporate the following improvement suggestions:\n"
+                improvements = (
+                    "\n\n---\nPlease incorporate the following improvement suggestions:\n"
                     + str(suggested)
                 )
                 messages = [
                     {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": improved_user},
+                    {"role": "user", "content": [cacheable(user_prompt), text_block(improvements)]},
                 ]
+                suggestions, merged_doc = extract_json(suggested), extract_json(merged_output)
+                patch_messages = None
+                if self.patch_rounds and isinstance(suggestions, list) and isinstance(merged_doc, dict):
+                    patch_messages = [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": [cacheable(user_prompt),
+                                                     text_block(build_patch_request(merged_doc, suggestions))]},
+                    ]
 
         return merged_output
 
+    async def _patch_round(self, messages: List[dict], merged_output: str, models: List[LLMModel]) -> Optional[str]:
+        """
+        Ask every model for patches against merged_output and apply them in model order
+        (a path already replaced/removed by an earlier model is left alone).
+        Returns the patched document, or None if no model returned usable patches.
+        """
+        doc = extract_json(merged_output)
+        outputs = await self.call_models(messages, models)
+        touched: set = set()
+        applied = rejected = answered = 0
+        for out in outputs:
+            ops = extract_patches(extract_json(out))
+            if ops is None:
+                continue
+            answered += 1
+            result = apply_patch(doc, ops, touched)
+            doc, touched = result.doc, result.touched
+            applied += len(result.applied)
+            rejected += len(result.rejected)
+            for op, reason in result.rejected[:5]:
+                print(f"🩹 rejected {op.get('op')} {op.get('path')}: {reason}")
+        if not answered:
+            print("⚠️ No model returned usable patches; regenerating the full document")
+            return None
+        print(f"🩹 Patch round: {applied} edits applied, {rejected} rejected ({answered} model(s) answered)")
+        merged = self.json_merger.merge([doc]).merged  # recomputes derived fields (coverage, DREAD severity)
+        return dumps(merged)
+
 
     # --- accept List[LLMModel] and use each instance directly ---
-    async def call_models(self, messages: List[dict], models: List[LLMModel]) -> List[str]:
+    async def call_models(
+        self,
+        messages: List[dict],
+        models: List[LLMModel],
+        on_record: Optional[Callable[[str, JSONRecord], None]] = None,
+        schema: Optional[str] = None,
+    ) -> List[str]:
         """
         Asynchronously call each model with the same prompts.
-        Collect all outputs into a list and return.
+        Collect the successful outputs into a list and return; transient errors are
+        retried inside LLMModel, a model that still fails is dropped, and a
+        RuntimeError is raised only if every model fails.
+        When self.stream_outputs is set, responses are streamed and parsed as they
+        arrive: progress is printed and each completed record (boundary, DFD element,
+        STRIDE row, ...) is passed to on_record(model_name, record) immediately.
+        self.completion_policy decides when to stop waiting; stragglers are cancelled
+        and left out of the returned list.
+        With schema set, each output is repaired and validated locally as soon as it
+        arrives; an invalid one is sent back to its model with the errors (up to
+        self.schema_repair_attempts times) and dropped if it is still invalid, unless
+        no output is valid at all. With self.structured_outputs, schema'd calls also ask
+        the provider for JSON matching the schema and validate the parsed object directly.
         """
         if not models:
             raise ValueError("No models provided to call_models().")
 
-        async def _call_one(model: LLMModel) -> str:
+        for model in models:
+            est = count_message_tokens(messages, model.model_name)
+            window = context_window(model.model_name)
+            if window and est > window:
+                print(f"⚠️ {model.model_name}: prompt is ~{est} tokens, above its {window}-token context window")
+        if messages:
+            print(f"🧮 Prompt size: ~{count_message_tokens(messages)} tokens")
+
+        async def _call_one(i: int, hedge: bool) -> str:
+            model = models[i]
             # SAFE logging: do not print the whole dataclass (it includes the API key)
             try:
-                print(f"🤖 Calling {model.model_name} key={model.short_id()}")
+                print(f"🤖 Calling {model.model_name} key={model.short_id()}{' (hedge)' if hedge else ''}")
             except Exception:
                 print("🤖 Calling model (short_id unavailable)")
+            fmt = self._format_for(model, schema)
             start_time = perf_counter()
             try:
-                return await model.callwithmessages(messages)
-            except Exception as e:
-                # Log the model name only (avoid leaking api_key via dataclass repr)
-                return f"[ERROR from {model.model_name}] {e.__class__.__name__}: {e}"
+                if self.stream_outputs:
+                    # a hedged duplicate must not report the same records twice
+                    answer = await self._stream_one(model, messages, start_time, None if hedge else on_record, fmt)
+                elif fmt:
+                    answer = await model.call_json(messages, fmt)  # already parsed
+                else:
+                    answer = await model.callwithmessages(messages)
             finally:
                 end_time = perf_counter()
                 print(f"🤖 {model.model_name} took {end_time - start_time:.2f} seconds")
+            if schema is None:
+                return answer
+            return await self._validated(model, messages, answer, schema, checks, fmt)
+
+        checks: Dict[str, ValidationResult] = {}  # output text -> its validation result
+
+        results = await run_with_policy(
+            names=[m.model_name for m in models],
+            start=_call_one,
+            policy=self.completion_policy,
+            is_valid=(lambda text: checks[text].ok) if schema else (lambda text: isinstance(extract_json(text), dict)),
+            latencies=self.latencies,
+        )
+        outputs, errors, invalid = [], [], []
+        for model, result in zip(models, results):
+            if result is None:
+                continue  # cancelled straggler
+            if isinstance(result, BaseException):
+                # Log the model name only (avoid leaking api_key via dataclass repr)
+                errors.append(f"{model.model_name}: {result.__class__.__name__}: {result}")
+                print(f"❌ {errors[-1]}")
+            elif schema and not checks[result].ok:
+                invalid.append(result)
+            else:
+                outputs.append(result)
+        if invalid and outputs:
+            print(f"🚫 Rejected {len(invalid)} output(s) that failed {schema} validation")
+        elif invalid:
+            print(f"⚠️ No output passed {schema} validation; keeping all {len(invalid)} for the merge")
+            outputs = invalid
+        if not outputs:
+            raise RuntimeError("All models failed: " + "; ".join(errors))
+        return outputs
 
-        tasks = [_call_one(m) for m in models] #Creates a list of coroutines
-        return await asyncio.gather(*tasks) #Waits for all coroutines to complete and returns a list of results
+    async def _validated(
+        self, model: LLMModel, messages: List[dict], answer: Any, schema: str, checks: Dict[str, ValidationResult],
+        fmt: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        Repair and validate one output (text, or the object of a structured call), re-requesting
+        from the same model while it is invalid.
+        """
+        result = check_output(answer, schema)
+        for _ in range(self.schema_repair_attempts):
+            if result.ok:
+                break
+            print(f"🧾 {model.model_name}: {len(result.errors)} schema error(s) ({result.errors[0]}); asking for a fix")
+            follow_up = messages + [
+                {"role": "assistant", "content": answer if isinstance(answer, str) else json.dumps(answer, ensure_ascii=False)},
+                {"role": "user", "content": repair_request(result)},
+            ]
+            answer = await model.call_json(follow_up, fmt) if fmt else await model.callwithmessages(follow_up)
+            result = check_output(answer, schema)
+        if result.repairs:
+            print(f"🧾 {model.model_name}: repaired {', '.join(result.repairs)}")
+        out = result.text() if result.doc is not None else answer
+        checks[out] = result
+        return out
+
+    async def _stream_one(
+        self,
+        model: LLMModel,
+        messages: List[dict],
+        start_time: float,
+        on_record: Optional[Callable[[str, JSONRecord], None]],
+        fmt: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        """
+        Stream one model's answer through the incremental JSON parser; returns the full text
+        (the parsed object if streaming was unavailable and fmt asked for structured output).
+        """
+        parser = IncrementalJSONParser()
+        first_record = True
+        last_report = start_time
+        stream = model.stream_with_messages(messages, response_format=fmt) if fmt else model.stream_with_messages(messages)
+        try:
+            async for delta in stream:
+                for record in parser.feed(delta):
+                    if first_record:
+                        first_record = False
+                        print(f"📡 {model.model_name}: first record after {perf_counter() - start_time:.2f}s")
+                    if on_record:
+                        on_record(model.model_name, record)
+                now = perf_counter()
+                if now - last_report >= self.stream_progress_interval:
+                    last_report = now
+                    print(f"📡 {model.model_name}: {parser.summary()} ({len(parser.buffer) / 1024:.1f} KB so far)")
+        except Exception as e:
+            if parser.buffer:
+                raise
+            # Some accounts/models cannot stream; a plain call still works
+            print(f"⚠️ {model.model_name} streaming unavailable ({e.__class__.__name__}); using a single response")
+            return await model.call_json(messages, fmt) if fmt else await model.callwithmessages(messages)
+        print(f"📡 {model.model_name} finished: {parser.summary()}")
+        return parser.buffer
 
 
-    async def merge_outputs(self, outputs: List[str]) -> str:
+    async def merge_outputs(self, outputs: List[str], schema: Optional[str] = None) -> str:
         """
         Merge multiple model outputs that share the same JSON schema into a single
         superset without duplicates.  Returns a JSON string.
@@ -186,10 +552,25 @@ class SimplifiedSecurityDesignReviewAgent:
         - Each element in `outputs` should be a JSON string with the SAME top-level schema.
         - This method returns a SINGLE JSON string with the same schema, combining all
             entries across inputs and removing duplicates (semantic duplicates OK).
+        - schema ("phase1", "phase2") constrains the LLM fallback's answer (structured output).
         """
         if not outputs:
             return "{}"
 
+        # Local, schema-driven union first; only unparseable leftovers go to the LLM
+        result = self.json_merger.merge(outputs)
+        if result.conflicts:
+            print(f"🔀 Local merge resolved {len(result.conflicts)} field conflicts by policy")
+        if result.merged is not None and not result.residual_outputs:
+            print(f"🔀 Merged {len(outputs)} outputs locally (no LLM round-trip)")
+            return dumps(result.merged)
+        if result.merged is not None:
+            print(f"🔀 {len(result.residual_outputs)} unparseable output(s); asking the LLM to fold them in")
+            outputs = [dumps(result.merged, indent=False)] + result.residual_outputs
+        return await self._llm_merge(outputs, schema)
+
+    async def _llm_merge(self, outputs: List[str], schema: Optional[str] = None) -> str:
+        """LLM fallback for merge_outputs: used only for inputs the local merger cannot parse."""
         system_prompt = (
             "You are a senior data engineer. You will receive multiple JSON documents "
             "that are intended to share the SAME top-level schema (e.g., { trust_boundaries, dfds, stride, ... } "
@@ -212,33 +593,27 @@ class SimplifiedSecurityDesignReviewAgent:
             "=== WELL-FORMED JSON PAYLOADS ==="
         ]
         for i, p in enumerate(outputs, start=1):
-            prompt_parts.append(f"\n-- JSON #{i} --\n{json.dumps(p, ensure_ascii=False)}")
+            prompt_parts.append(f"\n-- JSON #{i} --\n{p}")  # verbatim: escaping as a JSON string doubles the size
 
         prompt_parts.append("\n\nReturn STRICT JSON only.")
         combined_user_prompt = "\n".join(prompt_parts)
         
         # Save combined_user_prompt to file
-        with open('combined_user_prompt.txt', 'w', encoding='utf-8') as f:
+        with open(self.output_path('combined_user_prompt.txt'), 'w', encoding='utf-8') as f:
             f.write(combined_user_prompt)
         
 
-        # 3) Call GPT-5 to produce the merged superset JSON.
+        # 3) Call the routed merge model to produce the merged superset JSON.
         try:
-            gpt5 = LLMModel(
-                model_name="gpt-5",
-                api_key=self.config.openai_api_key,
-                model_type="openai",
-            )
-
             messages = [
                {"role": "system", "content": system_prompt},
                {"role": "user", "content": combined_user_prompt},
             ]
-            resp = await gpt5.callwithmessages(messages)
-            return resp
+            resp = await self.call_stage("merge", messages, schema=schema)
+            return resp if isinstance(resp, str) else dumps(resp)
 
         except Exception as e:
-            print(f"⚠️ GPT-5 merge failed. Reason: {e}")
+            print(f"⚠️ LLM merge failed. Reason: {e}")
         return "{FAILED TO MERGE}"
 
 
@@ -249,12 +624,25 @@ class SimplifiedSecurityDesignReviewAgent:
         meaningful STRIDE entries. Uses GPT-5 and returns either:
         - a JSON string (list of suggested improvements), or
         - the string "None" if no improvements are needed.
+        With self.local_checks, structural problems (STRIDE coverage, dangling IDs,
+        duplicate threats, DREAD arithmetic) are found locally and returned without
+        calling the model; the LLM review runs only once those checks pass.
         """
         if not self.requirements:
             raise ValueError("Requirements not set. Parse the design folder before evaluation.")
         if not merged_output or not merged_output.strip():
             raise ValueError("Merged output is empty.")
 
+        if self.local_checks:
+            doc = extract_json(merged_output)
+            if isinstance(doc, dict):
+                reference = self.phase1_model().doc if self.phase1_output else None
+                issues = check_structure(doc, reference or None)
+                if issues:
+                    print(f"🧮 Local checks found {len(issues)} structural issue(s); skipping the LLM evaluation this round")
+                    return json.dumps(issues[:self.max_local_suggestions], ensure_ascii=False)
+                print("🧮 Local checks passed; escalating to the LLM for semantic review")
+
         # System prompt: strict JSON, schema + rules
         system_prompt = """
         You are a senior application security reviewer.
@@ -272,31 +660,40 @@ class SimplifiedSecurityDesignReviewAgent:
             "suggested_change": "string"
             }
         ]
+        When the answer must be a JSON object, return {"suggestions": [...]} instead,
+        with an empty array meaning "None".
         """
-        # User prompt includes the inputs verbatim
-        user_prompt = (
+        # User prompt includes the inputs verbatim. Requirements come first so the
+        # static system prompt + requirements form a prefix that is cached across rounds.
+        requirements_part = (
             "REQUIREMENTS_AND_DESIGN_TEXT:\n"
             "------------------------------\n"
-            f"{self.requirements}\n\n"
+            f"{self.requirements_context('evaluate', query_from_json(merged_output))}\n\n"
+        )
+        merged_part = (
             "MERGED_PHASE1_OUTPUT (JSON):\n"
             "----------------------------\n"
-            f"{merged_output}\n\n"
+            f"{render(merged_output)}\n\n"
             "Return STRICT JSON only (either \"None\" or a JSON array following the schema)."
         )
 
-        # Call GPT-5 (flattened to a single prompt string for current LLMModel API)
+        # Call the routed evaluator (GPT-5 by default)
         try:
-            reviewer = LLMModel(
-                model_name="gpt-5",
-                api_key=self.config.openai_api_key,
-                model_type="openai",
-            )
-            prompt = f"[SYSTEM]\n{system_prompt}\n\n[USER]\n{user_prompt}"
-            resp = (await reviewer.call(prompt)).strip()
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": [cacheable(requirements_part), text_block(merged_part)]},
+            ]
+            resp = await self.call_stage("evaluate", messages, schema=SUGGESTIONS_SCHEMA)
         except Exception as e:
             print(f"evaluate_merged_output: model call failed: {e}")
             return "None"
 
+        # Structured output: already parsed against the suggestions schema
+        if not isinstance(resp, str):
+            suggestions = resp.get("suggestions") if isinstance(resp, dict) else resp
+            return json.dumps(suggestions, ensure_ascii=False) if isinstance(suggestions, list) and suggestions else "None"
+        resp = resp.strip()
+
         # Normalize/validate the response:
         # Accept exact "None" (case-sensitive as specified), or a JSON array per schema.
         if resp == "None":
@@ -331,10 +728,19 @@ class SimplifiedSecurityDesignReviewAgent:
             # If we can't validate, err on the side of not looping forever
             return "None"
             
-    async def run_phase1_trust_dfd_stride(self, system_prompt: str, user_prompt: str) -> str:
+    async def run_phase1_trust_dfd_stride(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        inventory_prompts: Optional[Tuple[str, str]] = None,
+        shard_prompt: str = "",
+    ) -> str:
         """
         Phase 1: Produce Trust Boundaries, DFDs, and STRIDE outputs.
         Inserts requirements into the user_prompt placeholder and calls the LLM.
+        For large designs (see self.phase1_sharding) the work is split: an inventory
+        pass (inventory_prompts = (system, user)) produces boundaries and DFDs, then
+        STRIDE rows are generated per trust boundary in parallel with shard_prompt.
         """
         if not self.requirements:
             raise ValueError("Requirements not set. Did you parse the design folder first?")
@@ -342,21 +748,123 @@ class SimplifiedSecurityDesignReviewAgent:
         print("▶️ Phase 1: Trust Boundaries, DFDs, STRIDE")
 
         # Replace placeholder with the requirements text
-        filled_user_prompt = user_prompt.replace("<<REQUIREMENTS_AND_DESIGN_TEXT>>", self.requirements)
+        requirements = self.requirements_context("phase1")
+        filled_user_prompt = user_prompt.replace("<<REQUIREMENTS_AND_DESIGN_TEXT>>", requirements)
 
         models = self.build_models()
-        response = await self.eval_suggest_improve(system_prompt, filled_user_prompt, models)
+        response = None
+        if inventory_prompts and all(inventory_prompts) and shard_prompt and self._should_shard_phase1():
+            response = await self._run_phase1_sharded(inventory_prompts, shard_prompt, requirements, models)
+        if response is None:
+            response = await self.eval_suggest_improve(system_prompt, filled_user_prompt, models, schema="phase1")
         
         self.phase1_output = response
         # Save phase1_output as a single string to file
-        with open("firstphase_output.txt", "w", encoding="utf-8") as f:
+        with open(self.output_path("firstphase_output.txt"), "w", encoding="utf-8") as f:
             f.write(self.phase1_output)
 
         return self.phase1_output
 
-    def run_phase2_dread_annotations_mitigations(self, system_prompt: str, user_prompt: str) -> str:
-        print("▶️ Phase 2: DREAD, Annotated DFDs, Mitigations (stub)")
-        self.phase2_output = "PHASE2: DREAD + Annotated DFDs + Mitigations (TBD)"
+    def _should_shard_phase1(self) -> bool:
+        if self.phase1_sharding == "auto":
+            return ContextBuilder(self.requirements).total_tokens >= self.phase1_shard_min_tokens
+        return self.phase1_sharding == "on"
+
+    async def _run_phase1_sharded(
+        self, inventory_prompts: Tuple[str, str], shard_prompt: str, requirements: str, models: List[LLMModel]
+    ) -> Optional[str]:
+        """
+        Inventory pass (boundaries + DFDs from every model, merged locally), then STRIDE
+        rows per boundary shard, stitched into one stride_matrix. Returns None to fall
+        back to the single-prompt Phase 1 if no usable inventory comes back.
+        """
+        inv_system, inv_user = inventory_prompts
+        with self.telemetry.span("inventory"):
+            outputs = await self.call_models([
+                {"role": "system", "content": inv_system},
+                {"role": "user", "content": inv_user.replace("<<REQUIREMENTS_AND_DESIGN_TEXT>>", requirements)},
+            ], models, schema="inventory")
+            inventory = self.json_merger.merge(outputs).merged
+        shards = plan_shards(inventory or {}, self.phase1_shard_size)
+        if not shards:
+            print("⚠️ Phase 1 inventory has no elements; falling back to a single prompt")
+            return None
+        elements = sum(len(s.elements) for s in shards)
+        print(f"🧩 Phase 1: {elements} elements in {len(shards)} STRIDE shards, {self.phase1_shard_concurrency} at a time")
+
+        requirements_part = f"REQUIREMENTS_AND_DESIGN_TEXT:\n{requirements}\n\n"  # shared, cacheable prefix
+
+        async def ask(s, attempt: int) -> str:
+            model = models[(s.index + attempt - 1) % len(models)]
+            messages = [
+                {"role": "system", "content": shard_prompt},
+                {"role": "user", "content": [cacheable(requirements_part), text_block(shard_request(s))]},
+            ]
+            with self.telemetry.span("shard", **{"sdra.shard": s.label, "sdra.attempt": attempt}):
+                return await model.callwithmessages(messages)
+
+        t0 = perf_counter()
+        results, failures = await run_slices(shards, ask, self.phase1_shard_concurrency, self.phase2_attempts,
+                                             parse=parse_shard, label="Phase 1")
+        for i, error in sorted(failures.items()):
+            print(f"❌ Phase 1 shard {shards[i].label} failed: {error}")
+        doc = self.json_merger.merge([stitch(inventory, shards, results)]).merged  # recomputes coverage_pct
+        print(f"✅ Phase 1: {len(doc['stride_matrix']['rows'])} STRIDE rows from {len(results)}/{len(shards)} shards "
+              f"in {perf_counter() - t0:.1f}s (coverage {doc['stride_matrix'].get('coverage_pct')}%)")
+        issues = check_structure(doc)
+        if issues:
+            print(f"🧮 Phase 1 local checks: {len(issues)} issue(s), e.g. {issues[0]['issue']}")
+        return dumps(doc)
+
+    async def run_phase2_dread_annotations_mitigations(self, slice_prompt: str) -> Optional[str]:
+        """
+        Phase 2 fan-out: every applicable STRIDE threat gets a TH-#### ID, threats are
+        grouped into per-element slices, and each slice is rated (DREAD), mitigated and
+        annotated by its own model call, at most self.phase2_concurrency at a time.
+        Slices go round-robin over the models; a slice whose answer is unusable is
+        re-sent (to the next model) without repeating the others. Results are
+        assembled locally into the dread / annotated_dfds / mitigations schemas.
+        Returns None if Phase 1 has no applicable threats to work from.
+        """
+        phase1 = self.phase1_model()
+        if not phase1.doc:
+            print("⚠️ Phase 2: Phase 1 output is not JSON; cannot slice it")
+            return None
+        threats = assign_threats(phase1)
+        if not threats:
+            print("⚠️ Phase 2: no applicable STRIDE threats in Phase 1")
+            return None
+        slices = plan_slices(phase1, threats, self.phase2_elements_per_slice)
+        print(f"▶️ Phase 2: {len(threats)} threats in {len(slices)} slices, {self.phase2_concurrency} at a time")
+
+        models = self.build_models()
+        # The instructions are the cached prefix. Requirements are retrieved per slice; when they fit the
+        # budget they come back verbatim, are identical for every slice and are cached too.
+        contexts = {s.index: self.requirements_context("phase2", slice_query(s)) for s in slices}
+
+        async def ask(s, attempt: int) -> str:
+            model = models[(s.index + attempt - 1) % len(models)]
+            context = contexts[s.index]
+            block = cacheable if context is self.requirements else text_block
+            messages = [
+                {"role": "system", "content": slice_prompt},
+                {"role": "user", "content": [block(f"REQUIREMENTS_AND_DESIGN_TEXT:\n{context}\n\n"),
+                                             text_block(slice_request(s))]},
+            ]
+            with self.telemetry.span("slice", **{"sdra.slice": s.label, "sdra.attempt": attempt}):
+                return await model.callwithmessages(messages)
+
+        t0 = perf_counter()
+        results, failures = await run_slices(slices, ask, self.phase2_concurrency, self.phase2_attempts)
+        for i, error in sorted(failures.items()):
+            print(f"❌ Phase 2 slice {slices[i].label} failed: {error}")
+        doc = assemble(phase1, slices, results)
+        print(f"✅ Phase 2: {len(doc['dread']['ratings'])}/{len(threats)} threats rated, "
+              f"{len(doc['mitigations']['items'])} mitigations in {perf_counter() - t0:.1f}s")
+        issues = check_structure(doc, phase1.doc)
+        if issues:
+            print(f"🧮 Phase 2 local checks: {len(issues)} issue(s), e.g. {issues[0]['issue']}")
+        self.phase2_output = dumps(doc)
         return self.phase2_output
 
     async def run_phase3_final_report(self, system_prompt: str, user_prompt: str) -> str:
@@ -372,82 +880,160 @@ class SimplifiedSecurityDesignReviewAgent:
             {"role": "user", "content": user_prompt},
         ]
 
-        # Initialize GPT-5 model client
-        gpt5 = LLMModel(
-            model_name="gpt-5",
-            api_key=self.config.openai_api_key,
-            model_type="openai",
-        )
-
         try:
-            # Use the role-aware API
-            self.final_report = await gpt5.callwithmessages(messages)
+            # Routed report writer (GPT-5 by default), falling back to the next candidate on failure
+            self.final_report = await self.call_stage("report", messages)
         except Exception as e:
             print(f"⚠️ Phase 3 final report generation failed: {e}")
             self.final_report = f"ERROR: {e}"
 
         return self.final_report
         
-    async def run_multistep_review(self) -> str:
-        """
-        Top-level multi-step review orchestrator.
-        Prompts the user for the design folder (via file dialog).
-        For now, it just returns 'Done' after capturing the folder path.
-        """
-        folder = self.prompt_for_design_folder()
-        print(f"Selected design folder: {folder}")
-        self.parse_design_folder(folder) #populates self.requirements
-        
-        #Read requirements from file - THIS IS JUST FOR TESTING
-        #with open('parsedrequirements.txt', 'r', encoding='utf-8') as f:
-        #    self.requirements = f.read()
+    # --- pipeline stages (each is checkpointed by PipelineRunner) ---
+    async def _stage_parse(self, folder: str, folder_fingerprint: str) -> str:
+        await self.aparse_design_folder(folder)  # populates self.requirements
         print(f"Parsed requirements: {self.requirements[:1200]}")
-
-        #First phase
-        first_system_prompt = self.load_prompt("Trust_DFD_STRIDE_System_Prompt.txt", "v1")
-        first_user_prompt = self.load_prompt("Trust_DFD_STRIDE_User_Prompt.txt", "v1")
-        print(f"First system prompt: {first_system_prompt}")
-        print(f"First user prompt: {first_user_prompt}")
-        phase1 = await self.run_phase1_trust_dfd_stride(first_system_prompt, first_user_prompt)
+        return self.requirements
+
+    async def _stage_phase1(self, parse: str, system_prompt: str, user_prompt: str,
+                            inventory_system_prompt: str = "", inventory_user_prompt: str = "",
+                            shard_prompt: str = "", sharding: Optional[str] = None) -> str:
+        self.requirements = parse
+        self.phase1_sharding = sharding or self.phase1_sharding
+        print(f"First system prompt: {system_prompt}")
+        print(f"First user prompt: {user_prompt}")
+        phase1 = await self.run_phase1_trust_dfd_stride(
+            system_prompt, user_prompt, (inventory_system_prompt, inventory_user_prompt), shard_prompt)
         print(f"✅ Phase 1 output preview: {str(phase1)[:1400]}")
-        with open("firstphase_output.txt", "w", encoding="utf-8") as f:
-            f.write(phase1)
-
-        #Read firstphase_output.txt file and assign it to phase1
-        #with open("firstphase_output.txt", "r", encoding="utf-8") as f:
-            #phase1 = f.read()
-        
-        
-        #Second phase
-        second_phase_system_prompt = self.load_prompt("DREAD_AnnotatedDFD_Mitigations_System_Prompt.txt", "v1")
-        second_phase_user_prompt = "Context (inputs produced by earlier steps):" + phase1 + "\n\n" + self.load_prompt("DREAD_AnnotatedDFD_Mitigations_User_Prompt.txt", "v1")
-        print(f"second_phase_system_prompt: {second_phase_system_prompt}")
-        print(f"second_phase_user_prompt: {second_phase_user_prompt}")
-        phase2 = self.run_phase2_dread_annotations_mitigations(second_phase_system_prompt, second_phase_user_prompt)
-        models = self.build_models()
-        phase2 = await self.eval_suggest_improve(second_phase_system_prompt, second_phase_user_prompt, models)
-        with open("secondphase_output.txt", "w", encoding="utf-8") as f:
+        return phase1
+
+    async def _stage_phase2(self, parse: str, phase1: str, system_prompt: str, user_prompt: str,
+                            slice_prompt: str = "") -> str:
+        self.requirements = parse
+        self.phase1_output = phase1
+        phase2 = None
+        if self.phase2_fanout and slice_prompt:
+            phase2 = await self.run_phase2_dread_annotations_mitigations(slice_prompt)
+        if phase2 is None:
+            # monolithic fallback: the whole Phase 1 JSON in one prompt, refined over rounds
+            second_phase_user_prompt = "Context (inputs produced by earlier steps):" + render(phase1) + "\n\n" + user_prompt
+            print(f"second_phase_system_prompt: {system_prompt}")
+            print(f"second_phase_user_prompt: {second_phase_user_prompt}")
+            models = self.build_models()
+            phase2 = await self.eval_suggest_improve(system_prompt, second_phase_user_prompt, models, schema="phase2")
+        self.phase2_output = phase2
+        with open(self.output_path("secondphase_output.txt"), "w", encoding="utf-8") as f:
             f.write(phase2)
-        #with open("secondphase_output.txt", "r", encoding="utf-8") as f:
-            #phase2 = f.read()
         print(f"✅ Phase 2 output preview: {str(phase2)[:1400]}")
+        return phase2
 
-        #Third phase
-        finalDeliverySystemPrompt = self.load_prompt("finalDeliverySystemPrompt.txt", "v1")
-        finalDeliveryUserPrompt = self.load_prompt("finalDeliveryUserPrompt.txt", "v1")
-        # Add phase 1+2 to the final delivery user prompt
-        finalDeliveryUserPrompt = finalDeliveryUserPrompt + "\n\n" + phase1 + "\n\n" + phase2
-        with open("finalDeliveryUserPrompt.txt", 'w', encoding='utf-8') as f:
+    async def _stage_report(self, phase1: str, phase2: str, system_prompt: str, user_prompt: str) -> str:
+        # Add phase 1+2 to the final delivery user prompt (minified, without per-section bookkeeping)
+        finalDeliveryUserPrompt = user_prompt + "\n\n" + render(phase1) + "\n\n" + render(phase2)
+        with open(self.output_path("finalDeliveryUserPrompt.txt"), 'w', encoding='utf-8') as f:
             f.write(finalDeliveryUserPrompt)
-          
-        final_report = await self.run_phase3_final_report(finalDeliverySystemPrompt, finalDeliveryUserPrompt)
+        return await self.run_phase3_final_report(system_prompt, finalDeliveryUserPrompt)
+
+    def build_pipeline(self, folder: str, run_dir: str | Path, resume_from: Optional[str] = None) -> PipelineRunner:
+        """parse -> phase1 -> phase2 -> report, with prompts as hashed stage inputs."""
+        stages = [
+            Stage("parse", self._stage_parse, params={
+                "folder": str(folder),
+                # the .mmd files the parse writes next to images must not invalidate the parse itself
+                "folder_fingerprint": folder_fingerprint(folder, ignore=is_conversion_output),
+            }),
+            Stage("phase1", self._stage_phase1, deps=("parse",), params={
+                "system_prompt": self.load_prompt("Trust_DFD_STRIDE_System_Prompt.txt", "v1"),
+                "user_prompt": self.load_prompt("Trust_DFD_STRIDE_User_Prompt.txt", "v1"),
+                "inventory_system_prompt": self.load_prompt("Phase1_Inventory_System_Prompt.txt", "v1"),
+                "inventory_user_prompt": self.load_prompt("Phase1_Inventory_User_Prompt.txt", "v1"),
+                "shard_prompt": self.load_prompt("Phase1_STRIDE_Shard_System_Prompt.txt", "v1"),
+                "sharding": self.phase1_sharding,
+            }),
+            Stage("phase2", self._stage_phase2, deps=("parse", "phase1"), params={
+                "system_prompt": self.load_prompt("DREAD_AnnotatedDFD_Mitigations_System_Prompt.txt", "v1"),
+                "user_prompt": self.load_prompt("DREAD_AnnotatedDFD_Mitigations_User_Prompt.txt", "v1"),
+                "slice_prompt": self.load_prompt("DREAD_Slice_System_Prompt.txt", "v1"),
+            }),
+            Stage("report", self._stage_report, deps=("phase1", "phase2"), params={
+                "system_prompt": self.load_prompt("finalDeliverySystemPrompt.txt", "v1"),
+                "user_prompt": self.load_prompt("finalDeliveryUserPrompt.txt", "v1"),
+            }),
+        ]
+        return PipelineRunner(run_dir=Path(run_dir), stages=stages, resume_from=resume_from, telemetry=self.telemetry)
+
+    @staticmethod
+    def default_run_dir(folder: str) -> Path:
+        """Stable per design folder, so re-running the same folder reuses its checkpoints."""
+        root = Path(folder).expanduser().resolve()
+        return Path("runs") / f"{root.name}-{content_hash(str(root))[:8]}"
+
+    async def run_multistep_review(
+        self,
+        bypass_cache: bool = False,
+        folder: Optional[str] = None,
+        run_dir: Optional[str] = None,
+        resume_from: Optional[str] = None,
+    ) -> str:
+        """
+        Top-level multi-step review orchestrator.
+        Prompts the user for the design folder (via file dialog) unless one is given
+        or can be recovered from an existing run_dir.
+        Each stage (parse, phase1, phase2, report) is checkpointed under run_dir;
+        stages whose inputs are unchanged are reused, and resume_from=<stage>
+        re-runs that stage and everything after it. Intermediate files and the
+        final report are written to run_dir as well.
+        Pass bypass_cache=True to ignore cached LLM responses for this run.
+        Token, latency, retry and cache figures for every model call are written
+        to run_dir/analytics_manifest.json (plus spans.jsonl if telemetry.export_spans).
+        With self.cassette recording, every request/response is saved to it at the end;
+        a replaying cassette answers the calls instead of the providers.
+        """
+        self.response_cache.bypass = bypass_cache
+        if folder is None and run_dir is not None:
+            folder = PipelineRunner(run_dir=Path(run_dir), stages=[Stage("parse", self._stage_parse)]) \
+                .recorded_param("parse", "folder")
+        if folder is None:
+            folder = self.prompt_for_design_folder()
+        print(f"Selected design folder: {folder}")
+        run_dir = Path(run_dir or self.default_run_dir(folder))
+        self.output_dir = run_dir  # intermediate files and the report live next to the checkpoints
+        print(f"📁 Run directory: {run_dir}")
+
+        if self.cassette is not None and not self.cassette.replaying:
+            self.cassette.meta.setdefault("folder", str(folder))
+
+        try:
+            outputs = await self.build_pipeline(folder, run_dir, resume_from).run()
+        finally:
+            extra = {"cassette": self.cassette.stats()} if self.cassette is not None else {}
+            manifest = self.telemetry.write(
+                run_dir,
+                folder=str(folder),
+                response_cache=self.response_cache.stats(),
+                rate_limiters=self.rate_limiters.stats(),
+                **extra,
+            )
+            print(f"📈 Telemetry: {self.telemetry.format_summary()} ({manifest})")
+            if self.cassette is not None and not self.cassette.replaying:
+                print(f"📼 Recorded {len(self.cassette.interactions)} model calls: {self.cassette.save()}")
+            elif self.cassette is not None:
+                print(f"📼 Replayed {self.cassette.played} model calls from {self.cassette.path}"
+                      + (f"; {len(self.cassette.misses)} not on the tape" if self.cassette.misses else ""))
+        self.requirements = outputs["parse"]
+        self.phase1_output = outputs["phase1"]
+        self.phase2_output = outputs["phase2"]
+        self.final_report = outputs["report"]
+        final_report = self.final_report
         
         # Save final report with datetime
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"final_report_{timestamp}.html"
+        filename = self.output_path(f"final_report_{timestamp}.html")
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(final_report)
         print(f"Final report saved to: {filename}")
+        print(f"🗄️ Response cache: {self.response_cache.stats()}")
+        print(f"🚦 Rate limiters: {self.rate_limiters.stats()}")
         
         return "Done"
 
@@ -455,8 +1041,32 @@ class SimplifiedSecurityDesignReviewAgent:
 if __name__ == "__main__":
     
 
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Simplified Security Design Review Agent")
+    arg_parser.add_argument("--folder", help="design folder (a dialog opens if omitted)")
+    arg_parser.add_argument("--run-dir", help="checkpoint directory (default: runs/<folder>-<hash>)")
+    arg_parser.add_argument("--resume-from", choices=PIPELINE_STAGES,
+                            help="re-run this stage and every stage after it")
+    arg_parser.add_argument("--no-cache", action="store_true", help="bypass cached LLM responses")
+    arg_parser.add_argument("--trace", action="store_true", help="also export OpenTelemetry-style spans.jsonl")
+    args = arg_parser.parse_args()
+
     agent = SimplifiedSecurityDesignReviewAgent()
-    result = asyncio.run(agent.run_multistep_review())
+    agent.telemetry.export_spans = args.trace
+
+    async def _main() -> str:
+        try:
+            return await agent.run_multistep_review(
+                bypass_cache=args.no_cache,
+                folder=args.folder,
+                run_dir=args.run_dir,
+                resume_from=args.resume_from,
+            )
+        finally:
+            await agent.aclose()
+
+    result = asyncio.run(_main())
     
     # Read firstphaseunmergedoutputs.json file and reconstruct outputs variable
     #with open('firstphaseunmergedoutputs.json', 'r', encoding='utf-8') as f:
@@ -0,0 +1,221 @@
+import json
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterator
+
+# Ambient labels, inherited by every model call made inside a span (including gathered tasks)
+current_phase: ContextVar[Optional[str]] = ContextVar("sdra_phase", default=None)
+current_round: ContextVar[Optional[int]] = ContextVar("sdra_round", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("sdra_span", default=None)
+
+
+def usage_counts(usage: Any) -> Dict[str, int]:
+    """Normalize OpenAI (prompt/completion) and Anthropic (input/output + cache) usage objects."""
+    if usage is None:
+        return {}
+
+    def get(obj: Any, name: str) -> Any:
+        return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+    if get(usage, "input_tokens") is not None:  # Anthropic: input_tokens excludes cache reads/writes
+        cached = get(usage, "cache_read_input_tokens") or 0
+        prompt = (get(usage, "input_tokens") or 0) + cached + (get(usage, "cache_creation_input_tokens") or 0)
+        completion = get(usage, "output_tokens") or 0
+    else:
+        details = get(usage, "prompt_tokens_details")
+        cached = (get(details, "cached_tokens") if details is not None else 0) or 0
+        prompt = get(usage, "prompt_tokens") or 0
+        completion = get(usage, "completion_tokens") or 0
+    return {"prompt_tokens": int(prompt), "completion_tokens": int(completion), "cached_tokens": int(cached)}
+
+
+@dataclass
+class Span:
+    """One timed operation, serialized in the OpenTelemetry JSON span shape."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def seconds(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def to_otel(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": {k: v for k, v in self.attributes.items() if v is not None},
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+        }
+
+
+@dataclass
+class CallRecord:
+    """One model request as seen by the caller (a cache hit is a call with zero tokens)."""
+    model: str
+    provider: str
+    operation: str                 # "chat" | "stream" | "prompt" | "convert"
+    phase: Optional[str] = None
+    round: Optional[int] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0         # prompt tokens served from the provider's prompt cache
+    latency_s: float = 0.0
+    retries: int = 0
+    cache_hit: bool = False        # served by the local ResponseCache
+    replayed: bool = False         # served from a recorded cassette (tokens are the recorded ones)
+    ok: bool = True
+    error: Optional[str] = None
+
+    def add_usage(self, usage: Any) -> None:
+        for k, v in usage_counts(usage).items():
+            setattr(self, k, getattr(self, k) + v)
+
+
+@dataclass
+class Telemetry:
+    """
+    Collects spans (pipeline stages, rounds, merge/evaluate, model calls) and
+    per-call records for one review. write() emits the analytics manifest and,
+    when export_spans is set, an OTel-style spans.jsonl next to it.
+    """
+    export_spans: bool = False
+    trace_id: str = field(default_factory=lambda: secrets.token_hex(16))
+    started: float = field(default_factory=time.time)
+    calls: List[CallRecord] = field(default_factory=list)
+    spans: List[Span] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @contextmanager
+    def span(self, name: str, phase: Optional[str] = None, round: Optional[int] = None,
+             **attributes: Any) -> Iterator[Span]:
+        parent = _current_span.get()
+        s = Span(
+            name=name,
+            trace_id=self.trace_id,
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            start_ns=time.time_ns(),
+            attributes=dict(attributes),
+        )
+        resets = [(_current_span, _current_span.set(s))]
+        if phase is not None:
+            resets.append((current_phase, current_phase.set(phase)))
+        if round is not None:
+            resets.append((current_round, current_round.set(round)))
+        s.attributes.setdefault("sdra.phase", current_phase.get())
+        s.attributes.setdefault("sdra.round", current_round.get())
+        try:
+            yield s
+        except BaseException as e:
+            s.error = f"{e.__class__.__name__}: {e}"
+            raise
+        finally:
+            s.end_ns = time.time_ns()
+            for var, token in reversed(resets):
+                try:
+                    var.reset(token)
+                except ValueError:
+                    pass  # closed from another context (e.g. an abandoned stream)
+            with self._lock:
+                self.spans.append(s)
+
+    @contextmanager
+    def observe_call(self, model: str, provider: str, operation: str,
+                     phase: Optional[str] = None) -> Iterator[CallRecord]:
+        """Time one model request; the caller fills in tokens, retries and cache_hit."""
+        rec = CallRecord(model=model, provider=provider, operation=operation,
+                         phase=phase or current_phase.get(), round=current_round.get())
+        t0 = time.perf_counter()
+        with self.span(f"llm.{operation}", **{"gen_ai.system": provider, "gen_ai.request.model": model}) as s:
+            try:
+                yield rec
+            except BaseException as e:
+                rec.ok, rec.error = False, f"{e.__class__.__name__}: {e}"
+                raise
+            finally:
+                rec.latency_s = round(time.perf_counter() - t0, 3)
+                s.attributes.update({
+                    "gen_ai.usage.input_tokens": rec.prompt_tokens,
+                    "gen_ai.usage.output_tokens": rec.completion_tokens,
+                    "sdra.cached_tokens": rec.cached_tokens,
+                    "sdra.retries": rec.retries,
+                    "sdra.cache_hit": rec.cache_hit,
+                })
+                if rec.phase and not s.attributes.get("sdra.phase"):
+                    s.attributes["sdra.phase"] = rec.phase
+                with self._lock:
+                    self.calls.append(rec)
+
+    # --- aggregation ---
+    @staticmethod
+    def _totals(calls: List[CallRecord]) -> Dict[str, Any]:
+        return {
+            "calls": len(calls),
+            "cache_hits": sum(c.cache_hit for c in calls),
+            "replayed": sum(c.replayed for c in calls),
+            "failures": sum(not c.ok for c in calls),
+            "retries": sum(c.retries for c in calls),
+            "prompt_tokens": sum(c.prompt_tokens for c in calls),
+            "completion_tokens": sum(c.completion_tokens for c in calls),
+            "cached_tokens": sum(c.cached_tokens for c in calls),
+            "model_seconds": round(sum(c.latency_s for c in calls), 3),
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        by_phase: Dict[str, List[CallRecord]] = {}
+        by_model: Dict[str, List[CallRecord]] = {}
+        for c in self.calls:
+            by_phase.setdefault(c.phase or "unscoped", []).append(c)
+            by_model.setdefault(c.model, []).append(c)
+        return {
+            "totals": self._totals(self.calls),
+            "by_phase": {k: self._totals(v) for k, v in by_phase.items()},
+            "by_model": {k: self._totals(v) for k, v in by_model.items()},
+            "stages": {s.name[len("stage."):]: round(s.seconds, 3)
+                       for s in self.spans if s.name.startswith("stage.")},
+        }
+
+    def manifest(self, **extra: Any) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "trace_id": self.trace_id,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "wall_seconds": round(now - self.started, 3),
+            **self.summary(),
+            **extra,
+            "calls": [asdict(c) for c in self.calls],
+        }
+
+    def write(self, out_dir: str | Path, **extra: Any) -> Path:
+        """Write analytics_manifest.json (and spans.jsonl when exporting) into out_dir."""
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        path = out / "analytics_manifest.json"
+        path.write_text(json.dumps(self.manifest(**extra), indent=2, default=str), encoding="utf-8")
+        if self.export_spans:
+            with open(out / "spans.jsonl", "w", encoding="utf-8") as f:
+                for s in self.spans:
+                    f.write(json.dumps(s.to_otel(), default=str) + "\n")
+        return path
+
+    def format_summary(self) -> str:
+        t = self._totals(self.calls)
+        return (f"{t['calls']} calls ({t['cache_hits']} cached, {t['retries']} retries), "
+                f"{t['prompt_tokens']} prompt ({t['cached_tokens']} from provider cache) + "
+                f"{t['completion_tokens']} completion tokens, "
+                f"{t['model_seconds']}s in models")
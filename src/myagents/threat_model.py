@@ -0,0 +1,241 @@
+import json
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+
+from .json_merger import extract_json, iter_records
+
+try:  # optional: several times faster (de)serialization of phase documents; falls back to json
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# Per-section bookkeeping that carries no information for a model reading the document
+BOILERPLATE_KEYS = frozenset({"schema_version", "run_id"})
+
+
+def loads(text: str) -> Optional[Any]:
+    """Parse a phase document; model replies with fences or prose around the JSON still parse."""
+    if not isinstance(text, str):
+        return text
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return extract_json(text)
+
+
+def dumps(doc: Any, indent: bool = True) -> str:
+    """JSON text of a phase document: 2-space indented like the checkpoints, or minified."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(doc, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+        except TypeError:  # non-string keys, integers beyond 64 bits
+            pass
+    if indent:
+        return json.dumps(doc, ensure_ascii=False, indent=2)
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":"))
+
+
+def compact(doc: Any) -> Any:
+    """doc without BOILERPLATE_KEYS and empty values (None, "", [], {}), recursively."""
+    if isinstance(doc, dict):
+        out = {}
+        for k, v in doc.items():
+            if k in BOILERPLATE_KEYS:
+                continue
+            v = compact(v)
+            if v is not None and v != "" and v != [] and v != {}:
+                out[k] = v
+        return out
+    if isinstance(doc, list):
+        return [compact(v) for v in doc]
+    return doc
+
+
+def render(text: str) -> str:
+    """Minified, key-stripped JSON of a phase output for a prompt; text that is not JSON is returned as is."""
+    doc = loads(text)
+    return dumps(compact(doc), indent=False) if isinstance(doc, (dict, list)) else text
+
+
+@dataclass(slots=True)
+class Element:
+    id: str
+    type: str = ""
+    label: str = ""
+    dfd_id: str = ""
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"id": self.id, "type": self.type, "label": self.label}
+
+
+@dataclass(slots=True)
+class Flow:
+    source: str
+    target: str
+    label: str = ""
+    dfd_id: str = ""
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"from": self.source, "to": self.target, "label": self.label}
+
+
+@dataclass(slots=True)
+class Boundary:
+    id: str
+    name: str = ""
+    description: str = ""
+    elements: Tuple[str, ...] = ()
+
+
+@dataclass(slots=True)
+class StrideRow:
+    element_id: str
+    stride: str
+    applies: bool = False
+    example: str = ""
+
+
+@dataclass(slots=True)
+class Rating:
+    threat_id: str
+    element_id: str
+    stride: str
+    score: int = 0
+    severity: str = ""
+    dread: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class Mitigation:
+    id: str
+    title: str
+    threat_ids: Tuple[str, ...] = ()
+    priority: int = 0
+    effort: str = ""
+
+
+def _str(v: Any) -> str:
+    return v if isinstance(v, str) else ""
+
+
+def _int(v: Any) -> int:
+    try:
+        return int(v or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+@dataclass(slots=True)
+class ThreatModel:
+    """
+    Typed, indexed view of a Phase 1 and/or Phase 2 document: elements, boundaries,
+    flows, STRIDE rows, DREAD ratings and mitigations, with O(1) lookups by
+    element_id / threat_id. Built once per stage from the document, which is kept
+    (doc) for serialization; the view itself is read-only.
+    A repeated ID resolves to its first declaration, in document order.
+    """
+    doc: Dict[str, Any] = field(default_factory=dict)
+    elements: Dict[str, Element] = field(default_factory=dict)
+    boundaries: Dict[str, Boundary] = field(default_factory=dict)
+    flows: List[Flow] = field(default_factory=list)
+    stride: List[StrideRow] = field(default_factory=list)
+    ratings: Dict[str, Rating] = field(default_factory=dict)
+    mitigations: Dict[str, Mitigation] = field(default_factory=dict)
+    _flows: Dict[str, List[int]] = field(default_factory=dict, repr=False)
+    _member_of: Dict[str, List[str]] = field(default_factory=dict, repr=False)
+    _stride: Dict[str, List[StrideRow]] = field(default_factory=dict, repr=False)
+    _rated: Dict[str, List[Rating]] = field(default_factory=dict, repr=False)
+    _mitigated_by: Dict[str, List[Mitigation]] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_dict(cls, doc: Dict[str, Any]) -> "ThreatModel":
+        m = cls(doc=doc if isinstance(doc, dict) else {})
+        doc = m.doc
+        for dfd in iter_records(doc.get("dfds"), ("dfds",)):
+            dfd_id = _str(dfd.get("id"))
+            for n in iter_records(dfd, ("nodes",)):
+                if isinstance(n.get("id"), str) and n["id"] not in m.elements:
+                    m.elements[n["id"]] = Element(n["id"], _str(n.get("type")), _str(n.get("label")), dfd_id)
+            for e in iter_records(dfd, ("edges",)):
+                flow = Flow(_str(e.get("from")), _str(e.get("to")), _str(e.get("label")), dfd_id)
+                m.flows.append(flow)
+                for el in dict.fromkeys((flow.source, flow.target)):
+                    m._flows.setdefault(el, []).append(len(m.flows) - 1)
+        for b in iter_records(doc.get("trust_boundaries"), ("boundaries",)):
+            members = tuple(e for e in b.get("elements") or [] if isinstance(e, str))
+            bid = str(b.get("id"))
+            m.boundaries.setdefault(bid, Boundary(bid, _str(b.get("name")), _str(b.get("description")), members))
+            for el in members:
+                if bid not in m._member_of.setdefault(el, []):
+                    m._member_of[el].append(bid)
+        for r in iter_records(doc.get("stride_matrix"), ("rows",)):
+            if not isinstance(r.get("element_id"), str):
+                continue
+            row = StrideRow(r["element_id"], _str(r.get("stride")), bool(r.get("applies")), _str(r.get("example")))
+            m.stride.append(row)
+            m._stride.setdefault(row.element_id, []).append(row)
+        for r in iter_records(doc.get("dread"), ("ratings",)):
+            tid = r.get("threat_id")
+            if not isinstance(tid, str) or tid in m.ratings:
+                continue
+            rating = Rating(tid, _str(r.get("element_id")), _str(r.get("stride")), _int(r.get("score")),
+                            _str(r.get("severity")),
+                            dict(r["dread"]) if isinstance(r.get("dread"), dict) else {})
+            m.ratings[tid] = rating
+            m._rated.setdefault(rating.element_id, []).append(rating)
+        for i in iter_records(doc.get("mitigations"), ("items",)):
+            mid = i.get("id")
+            if not isinstance(mid, str) or mid in m.mitigations:
+                continue
+            mit = Mitigation(mid, _str(i.get("title")), tuple(t for t in i.get("threat_ids") or [] if isinstance(t, str)),
+                             _int(i.get("priority")), _str(i.get("effort")))
+            m.mitigations[mid] = mit
+            for tid in dict.fromkeys(mit.threat_ids):
+                m._mitigated_by.setdefault(tid, []).append(mit)
+        return m
+
+    @classmethod
+    def from_json(cls, text: str) -> "ThreatModel":
+        return cls.from_dict(loads(text) or {})
+
+    # --- lookups ---
+    def element(self, element_id: str) -> Optional[Element]:
+        return self.elements.get(element_id)
+
+    def flows_for(self, element_ids: Iterable[str]) -> List[Flow]:
+        """Flows touching any of the elements, once each, in document order."""
+        hits = sorted({i for el in element_ids for i in self._flows.get(el, ())})
+        return [self.flows[i] for i in hits]
+
+    def boundaries_of(self, element_id: str) -> List[Boundary]:
+        return [self.boundaries[b] for b in self._member_of.get(element_id, ())]
+
+    def stride_for(self, element_id: str) -> List[StrideRow]:
+        return list(self._stride.get(element_id, ()))
+
+    def ratings_for(self, element_id: str) -> List[Rating]:
+        return list(self._rated.get(element_id, ()))
+
+    def mitigations_for(self, threat_id: str) -> List[Mitigation]:
+        return list(self._mitigated_by.get(threat_id, ()))
+
+    @property
+    def run_id(self) -> str:
+        sections = ("stride_matrix", "dfds", "trust_boundaries", "dread", "mitigations")
+        return next((self.doc[k]["run_id"] for k in sections
+                     if isinstance(self.doc.get(k), dict) and self.doc[k].get("run_id")), "run")
+
+    # --- output ---
+    def dumps(self, indent: bool = True) -> str:
+        return dumps(self.doc, indent)
+
+    def render(self) -> str:
+        """The document as minified, key-stripped JSON for a prompt (see compact)."""
+        return dumps(compact(self.doc), indent=False)
+
+
+def as_model(doc: Any) -> ThreatModel:
+    """doc as a ThreatModel; an existing one is returned unchanged."""
+    return doc if isinstance(doc, ThreatModel) else ThreatModel.from_dict(doc)
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from myagents.benchmark import default_corpus, format_results, review_scenario, run_benchmark
+from myagents.mock_provider import MockBehavior, MockRequest
+
+CORPUS = default_corpus()
+
+
+def _request(system: str, user: str) -> MockRequest:
+    return MockRequest("openai", "gpt-5", system, [{"role": "user", "content": user}], False, {})
+
+
+def test_scenario_answers_slices_for_the_threats_asked():
+    respond = review_scenario(recorded=[])
+    user = 'REQUIREMENTS\n\nSLICE (rate ONLY these threats; keep their threat_id values):\n' \
+           '{"elements": [{"id": "P-001"}], "threats": [{"threat_id": "TH-0007", "element_id": "P-001", "stride": "T"}]}' \
+           '\n\nSeverity follows the DREAD score.'
+    answer = respond(_request("slice prompt", user))
+    assert '"TH-0007"' in answer and '"P-001"' in answer
+    assert respond(_request("You are a senior application security reviewer.", "x")) == "None"
+
+
+@pytest.mark.asyncio
+async def test_full_review_runs_offline(tmp_path):
+    folder = next(p for p in CORPUS if p.name == "OwaspJuiceShop")
+    [result] = await run_benchmark([folder], tmp_path, MockBehavior(latency_s=0.01, seed=1))
+    assert result.status == "ok", result.error
+    assert set(result.stages) == {"parse", "phase1", "phase2", "report"}
+    assert result.calls > 0 and result.completion_tokens > 0 and result.tokens_per_s > 0
+    assert list((tmp_path / "OwaspJuiceShop-1" / "run").glob("final_report_*.html"))
+    assert "phase2_s" in format_results([result])
+
+
+@pytest.mark.benchmark
+@pytest.mark.skipif(not os.getenv("SDRA_BENCHMARK"), reason="set SDRA_BENCHMARK=1 to run the corpus benchmark")
+@pytest.mark.asyncio
+@pytest.mark.parametrize("folder", CORPUS, ids=[p.name for p in CORPUS])
+async def test_corpus_benchmark(folder, tmp_path):
+    behavior = MockBehavior(latency_s=float(os.getenv("SDRA_BENCHMARK_LATENCY", "0.5")), jitter_s=0.2,
+                            tokens_per_s=200, error_rate=0.02, seed=0)
+    results = await run_benchmark([folder], tmp_path, behavior)
+    print("\n" + format_results(results))
+    assert all(r.status == "ok" for r in results)
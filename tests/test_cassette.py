@@ -0,0 +1,107 @@
+import shutil
+
+import pytest
+
+from myagents.benchmark import default_corpus, review_scenario
+from myagents.cassette import Cassette, CassetteMiss, Interaction, ReplayedError
+from myagents.client_pool import ClientPool
+from myagents.config import Config
+from myagents.llm_model import LLMModel
+from myagents.mock_provider import MOCK_API_KEY, MockBehavior, MockProvider, replay
+from myagents.model_router import ModelRouter
+from myagents.response_cache import ResponseCache
+from myagents.simplified_sdra import SimplifiedSecurityDesignReviewAgent
+from myagents.telemetry import Telemetry
+
+MESSAGES = [{"role": "system", "content": "sys"}, {"role": "user", "content": "hi"}]
+
+
+def _offline() -> MockProvider:
+    """A provider that rejects every request, so any call that is not replayed fails."""
+    return MockProvider(behavior=MockBehavior(error_rate=1.0, error_status=400))
+
+
+def test_save_load_and_play_order(tmp_path):
+    tape = Cassette(tmp_path / "c.jsonl.xz", meta={"folder": "x"})
+    for text in ("first", "second"):
+        tape.record(Interaction(key="k", kind="chat", model="m", provider="openai", request=MESSAGES, response=text))
+    tape.save()
+
+    loaded = Cassette.load(tmp_path / "c.jsonl.xz")
+    assert loaded.replaying and loaded.meta == {"folder": "x"}
+    assert [loaded.play("k").response for _ in range(3)] == ["first", "second", "second"]
+    with pytest.raises(CassetteMiss):
+        loaded.play("other")
+    assert loaded.stats()["played"] == 3 and loaded.misses == ["other"[:12]]
+
+
+@pytest.mark.asyncio
+async def test_model_calls_replay_without_the_provider(tmp_path):
+    live = MockProvider(responder=replay(["recorded answer"]))
+    tape = Cassette(tmp_path / "c.jsonl.xz")
+    pool = ClientPool(transport=live.transport())
+    model = LLMModel("m", MOCK_API_KEY, client_pool=pool, cassette=tape)
+    await model.callwithmessages(MESSAGES)
+    assert "".join([c async for c in model.stream_with_messages(MESSAGES)]) == "recorded answer"
+    await pool.aclose()
+    tape.save()
+
+    offline = _offline()
+    pool = ClientPool(transport=offline.transport())
+    telemetry = Telemetry()
+    model = LLMModel("m", MOCK_API_KEY, client_pool=pool, telemetry=telemetry,
+                     cassette=Cassette.load(tmp_path / "c.jsonl.xz"))
+    assert await model.callwithmessages(MESSAGES) == "recorded answer"
+    assert "".join([c async for c in model.stream_with_messages(MESSAGES)]) == "recorded answer"
+    with pytest.raises(CassetteMiss):
+        await model.callwithmessages(MESSAGES + [{"role": "user", "content": "changed"}])
+    await pool.aclose()
+    assert offline.requests == []
+    assert all(c.replayed and c.completion_tokens > 0 for c in telemetry.calls[:2])
+
+
+@pytest.mark.asyncio
+async def test_recorded_failures_fail_again_on_replay(tmp_path):
+    tape = Cassette(tmp_path / "c.jsonl.xz")
+    pool = ClientPool(transport=_offline().transport())
+    model = LLMModel("m", MOCK_API_KEY, client_pool=pool, cassette=tape)
+    with pytest.raises(Exception):
+        await model.callwithmessages(MESSAGES)
+    await pool.aclose()
+    assert tape.interactions[0].error.startswith("BadRequestError")
+
+    tape.mode = "replay"
+    tape.__post_init__()
+    with pytest.raises(ReplayedError):
+        await LLMModel("m", MOCK_API_KEY, cassette=tape).callwithmessages(MESSAGES)
+
+
+async def _review(folder, run_dir, provider, cassette):
+    pool = ClientPool(transport=provider.transport())
+    cache = ResponseCache(path=run_dir.parent / f"{run_dir.name}.sqlite3")
+    agent = SimplifiedSecurityDesignReviewAgent(client_pool=pool, response_cache=cache, output_dir=run_dir,
+                                                config=Config(openai_api_key=MOCK_API_KEY, anthropic_api_key=MOCK_API_KEY))
+    agent.router = ModelRouter(telemetry=agent.telemetry)
+    agent.cassette = cassette
+    try:
+        await agent.run_multistep_review(bypass_cache=True, folder=str(folder), run_dir=str(run_dir), resume_from="parse")
+    finally:
+        await pool.aclose()
+        cache.close()
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_full_review_replays_deterministically(tmp_path):
+    folder = tmp_path / "design"
+    shutil.copytree(next(p for p in default_corpus() if p.name == "OwaspJuiceShop"), folder)
+    recorded = await _review(folder, tmp_path / "live", MockProvider(responder=review_scenario()),
+                             Cassette(tmp_path / "live" / "cassette.jsonl.xz"))
+    offline = _offline()
+    replayed = await _review(folder, tmp_path / "replay", offline, Cassette.load(tmp_path / "live"))
+
+    assert offline.requests == [] and replayed.cassette.misses == []
+    # the diagram comes from the folder's parse cache the second time; every model call is replayed
+    assert replayed.cassette.played == sum(i.kind != "convert" for i in recorded.cassette.interactions)
+    assert (replayed.phase1_output, replayed.phase2_output, replayed.final_report) == \
+           (recorded.phase1_output, recorded.phase2_output, recorded.final_report)
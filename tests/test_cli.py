@@ -0,0 +1,99 @@
+import asyncio
+import json
+from types import SimpleNamespace
+import pytest
+
+import myagents.cli as cli_mod
+from myagents.simplified_sdra import SimplifiedSecurityDesignReviewAgent
+
+
+class FakeAgent:
+    active = 0
+    peak = 0
+    instances = []
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.closed = False
+        self.telemetry = SimpleNamespace(export_spans=False)
+        FakeAgent.instances.append(self)
+
+    async def run_multistep_review(self, bypass_cache=False, folder=None, run_dir=None, resume_from=None):
+        FakeAgent.active += 1
+        FakeAgent.peak = max(FakeAgent.peak, FakeAgent.active)
+        await asyncio.sleep(0.01)
+        FakeAgent.active -= 1
+        if folder.endswith("broken"):
+            raise RuntimeError("parse failed")
+        return "Done"
+
+    async def aclose(self):
+        self.closed = True
+
+    @staticmethod
+    def default_run_dir(folder):
+        return SimplifiedSecurityDesignReviewAgent.default_run_dir(folder)
+
+
+@pytest.fixture
+def fake_agent(monkeypatch, tmp_path):
+    FakeAgent.active = FakeAgent.peak = 0
+    FakeAgent.instances = []
+    monkeypatch.setattr(cli_mod, "SimplifiedSecurityDesignReviewAgent", FakeAgent)
+    monkeypatch.setattr(cli_mod, "ResponseCache", _NullCache)
+    return FakeAgent
+
+
+class _NullCache:
+    def close(self):
+        pass
+
+
+def test_read_manifest_text_and_json(tmp_path):
+    (tmp_path / "list.txt").write_text("a\n# skipped\n\nsub/b  # trailing\n", encoding="utf-8")
+    assert cli_mod.read_manifest(tmp_path / "list.txt") == [str(tmp_path / "a"), str(tmp_path / "sub/b")]
+    (tmp_path / "list.json").write_text(json.dumps(["a", {"folder": "/abs/c"}]), encoding="utf-8")
+    assert cli_mod.read_manifest(tmp_path / "list.json") == [str(tmp_path / "a"), "/abs/c"]
+
+
+@pytest.mark.asyncio
+async def test_run_batch_caps_concurrency_and_isolates_outputs(fake_agent, tmp_path):
+    folders = [str(tmp_path / f"app{i}") for i in range(5)] + [str(tmp_path / "broken")]
+    results = await cli_mod.run_batch(folders, output_root=tmp_path / "runs", concurrency=2)
+
+    assert fake_agent.peak == 2
+    assert [r.folder for r in results] == folders
+    assert [r.status for r in results] == ["ok"] * 5 + ["failed"]
+    assert "parse failed" in results[-1].error
+    assert len({r.run_dir for r in results}) == len(folders)
+    assert all(a.closed for a in fake_agent.instances)
+    # every agent shares one pool and one set of provider semaphores
+    pools = {id(a.kwargs["client_pool"]) for a in fake_agent.instances}
+    sems = {id(a.kwargs["provider_limits"]["openai"]) for a in fake_agent.instances}
+    assert len(pools) == 1 and len(sems) == 1
+
+    summary = json.loads((tmp_path / "runs" / "batch_summary.json").read_text(encoding="utf-8"))
+    assert len(summary["reviews"]) == 6
+
+
+def test_main_rejects_missing_folders(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        cli_mod.main(["review", str(tmp_path / "nope")])
+    assert "not a directory" in capsys.readouterr().err
+
+
+@pytest.mark.asyncio
+async def test_replay_loads_the_cassette_and_reruns_every_stage(fake_agent, tmp_path, monkeypatch):
+    from myagents.cassette import Cassette
+    seen = {}
+
+    async def run(self, bypass_cache=False, folder=None, run_dir=None, resume_from=None):
+        seen.update(cassette=self.cassette, resume_from=resume_from)
+        return "Done"
+    monkeypatch.setattr(FakeAgent, "run_multistep_review", run)
+    Cassette(tmp_path / "tape.jsonl.xz", meta={"folder": "app"}).save()
+
+    await cli_mod.run_batch([str(tmp_path / "app")], output_root=tmp_path / "runs", replay=str(tmp_path / "tape.jsonl.xz"))
+    assert seen["cassette"].replaying and seen["resume_from"] == "parse"
+    with pytest.raises(ValueError):
+        await cli_mod.run_batch(["a", "b"], output_root=tmp_path / "runs", replay=str(tmp_path / "tape.jsonl.xz"))
@@ -0,0 +1,47 @@
+import pytest
+
+from myagents.client_pool import ClientPool, PoolLimits
+from myagents.llm_model import LLMModel
+
+
+def test_pool_reuses_client_per_key():
+    pool = ClientPool()
+    a = pool.openai("sk-test-1234567890")
+    b = pool.openai("sk-test-1234567890")
+    c = pool.openai("sk-test-1234567890", base_url="https://example.invalid/v1")
+    d = pool.anthropic("sk-ant-1234567890")
+    assert a is b
+    assert a is not c
+    assert len(pool) == 3
+    assert d is pool.anthropic("sk-ant-1234567890")
+
+
+def test_pool_limits_are_applied():
+    limits = PoolLimits(max_connections=3, max_keepalive_connections=2, keepalive_expiry=5.0)
+    httpx_limits = limits.to_httpx()
+    assert httpx_limits.max_connections == 3
+    assert httpx_limits.max_keepalive_connections == 2
+    assert httpx_limits.keepalive_expiry == 5.0
+
+
+@pytest.mark.asyncio
+async def test_aclose_closes_and_clears():
+    pool = ClientPool()
+    client = pool.openai("sk-test-1234567890")
+    await pool.aclose()
+    assert len(pool) == 0
+    assert client.is_closed()
+    await pool.aclose()  # idempotent
+
+
+@pytest.mark.asyncio
+async def test_llm_model_uses_pooled_client():
+    pool = ClientPool()
+    model = LLMModel(model_name="gpt-5", api_key="sk-test-1234567890", client_pool=pool)
+    async with model._openai_client() as first:
+        pass
+    async with model._openai_client() as second:
+        pass
+    assert first is second
+    assert not first.is_closed()  # the pool owns the lifecycle
+    await pool.aclose()
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+
+from myagents.completion import CompletionPolicy, LatencyTracker, run_with_policy
+
+
+def _starter(delays, results=None, log=None):
+    async def start(i, hedge):
+        if log is not None:
+            log.append((i, hedge))
+        try:
+            await asyncio.sleep(delays[i] if not hedge else 0.01)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append((i, "cancelled"))
+            raise
+        value = (results or {}).get(i, '{"ok": %d}' % i)
+        if isinstance(value, Exception):
+            raise value
+        return value
+    return start
+
+
+def _valid(text):
+    return text.startswith("{")
+
+
+@pytest.mark.asyncio
+async def test_wait_all_keeps_every_outcome():
+    out = await run_with_policy(["a", "b"], _starter([0.01, 0.03], {1: RuntimeError("x")}),
+                                CompletionPolicy(), _valid, LatencyTracker())
+    assert out[0] == '{"ok": 0}' and isinstance(out[1], RuntimeError)
+
+
+@pytest.mark.asyncio
+async def test_first_n_cancels_stragglers_and_skips_invalid():
+    log = []
+    out = await run_with_policy(["a", "b", "c"], _starter([0.01, 0.02, 5.0], {0: "not json"}, log),
+                                CompletionPolicy(mode="first_n", min_valid=1), _valid, LatencyTracker())
+    assert out == ["not json", '{"ok": 1}', None]
+    assert (2, "cancelled") in log
+
+
+@pytest.mark.asyncio
+async def test_quorum_waits_until_deadline_then_cancels():
+    policy = CompletionPolicy(mode="quorum", min_valid=1, deadline_s=0.1)
+    out = await run_with_policy(["a", "b", "c"], _starter([0.01, 0.05, 5.0]), policy, _valid, LatencyTracker())
+    assert out == ['{"ok": 0}', '{"ok": 1}', None]
+
+
+@pytest.mark.asyncio
+async def test_hedged_duplicate_wins_for_a_stalled_request():
+    log = []
+    latencies = LatencyTracker()
+    for _ in range(5):
+        latencies.add("slow", 0.02)
+    policy = CompletionPolicy(hedge=True, hedge_min_samples=5)
+    assert policy.hedge_delay(latencies, "slow") == pytest.approx(0.02)
+    assert policy.hedge_delay(latencies, "new-model") is None
+
+    out = await run_with_policy(["slow"], _starter([5.0], log=log), policy, _valid, latencies)
+    assert out == ['{"ok": 0}']
+    assert (0, True) in log and (0, "cancelled") in log
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        CompletionPolicy(mode="fastest")
@@ -0,0 +1,52 @@
+from myagents.context_builder import (
+    BM25Index, ContextBuilder, chunk_requirements, count_message_tokens, context_window, query_from_json,
+)
+
+DOC = (
+    "\n\n# [PDF:design.pdf] Page 1\nCover page. Team members and sponsors."
+    "\n\n# [PDF:design.pdf] Page 2\nThe web client authenticates users with OAuth tokens against the login service."
+    "\n[MERMAID DIAGRAM DIAG-001]\nflowchart TD\nA[Browser] --> B[Login Service]\n"
+    "\n\n# [PDF:design.pdf] Page 3\nThe reporting database stores evaluations; nightly batch export to SFTP."
+    "\n[FILE] notes.txt"
+)
+
+
+def test_chunks_follow_page_headers_and_keep_diagrams():
+    chunks = chunk_requirements(DOC)
+    assert [(c.source, c.page) for c in chunks] == [
+        ("design.pdf", 1), ("design.pdf", 2), ("design.pdf", 3), ("notes.txt", None)]
+    assert "DIAG-001" in chunks[1].text
+
+
+def test_long_pages_are_split_on_paragraphs():
+    page = "# [PDF:big.pdf] Page 1\n" + "\n\n".join(f"paragraph {i} " + "x" * 400 for i in range(10))
+    chunks = chunk_requirements(page, max_tokens=250)
+    assert len(chunks) > 1 and all(c.page == 1 for c in chunks)
+    assert all(c.tokens <= 250 for c in chunks)
+
+
+def test_bm25_ranks_relevant_pages_first():
+    index = BM25Index(chunk_requirements(DOC))
+    (score, best), *_ = index.search("login authentication OAuth")
+    assert best.page == 2 and score > 0
+    assert index.search("database export")[0][1].page == 3
+    assert index.search("kubernetes") == []
+
+
+def test_builder_returns_full_text_within_budget_and_trims_otherwise():
+    builder = ContextBuilder(DOC)
+    assert builder.build("anything", budget_tokens=None) is DOC
+    assert builder.build("anything", budget_tokens=builder.total_tokens) is DOC
+
+    page2 = builder.chunks[1]
+    trimmed = builder.build("login OAuth tokens", budget_tokens=page2.tokens)
+    assert "1 of 4 requirement sections" in trimmed
+    assert "OAuth" in trimmed and "reporting database" not in trimmed
+
+
+def test_size_helpers():
+    assert count_message_tokens([{"role": "user", "content": "x" * 400}]) >= 100
+    assert context_window("claude-sonnet-4-20250514") == 200_000
+    assert context_window("unknown-model") is None
+    q = query_from_json('{"dfds": {"nodes": [{"id": "P-001", "label": "Login Service"}]}}')
+    assert q == "Login Service"
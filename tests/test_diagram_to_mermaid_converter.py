@@ -0,0 +1,134 @@
+import asyncio
+import base64
+from types import SimpleNamespace
+
+import pytest
+
+from myagents.diagram_to_mermaid_converter import DiagramToMermaidConverter
+from myagents.rate_limiter import RateLimiter, RetryPolicy
+
+
+class FakeAsyncOpenAI:
+    """Answers with the image's byte length after a delay that reverses completion order."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model, messages, temperature):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        url = messages[1]["content"][1]["image_url"]["url"]
+        await asyncio.sleep(0.05 if "QQ" in url else 0.01)
+        self.in_flight -= 1
+        if "ZZ" in url:
+            raise RuntimeError("vision call failed")
+        content = f"```mermaid\nflowchart TD\nA[{len(url)}] --> B\n```"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _images(tmp_path, payloads):
+    paths = []
+    for i, payload in enumerate(payloads):
+        p = tmp_path / f"img{i}.png"
+        p.write_bytes(payload)
+        paths.append(p)
+    return paths
+
+
+@pytest.mark.asyncio
+async def test_convert_many_preserves_order_and_limits_concurrency(tmp_path):
+    fake = FakeAsyncOpenAI()
+    conv = DiagramToMermaidConverter(client=object(), async_client=fake, max_concurrency=2)
+    paths = _images(tmp_path, [b"A", b"AAAA", b"AAAAAAA", b"A"])
+    outs = [p.with_suffix(".mmd") for p in paths]
+
+    results = await conv.convert_many(paths, outs)
+
+    expected = [len("data:image/png;base64," + base64.b64encode(p.read_bytes()).decode()) for p in paths]
+    assert [r.splitlines()[1] for r in results] == [f"A[{n}] --> B" for n in expected]
+    assert fake.peak == 2
+    assert outs[0].read_text(encoding="utf-8").startswith("flowchart TD")
+
+
+@pytest.mark.asyncio
+async def test_convert_many_returns_exceptions_in_place(tmp_path):
+    conv = DiagramToMermaidConverter(client=object(), async_client=FakeAsyncOpenAI())
+    paths = _images(tmp_path, [b"ok", b"e\x96"])  # second encodes to "ZZY="
+    results = await conv.convert_many(paths)
+    assert isinstance(results[0], str)
+    assert isinstance(results[1], RuntimeError)
+
+
+@pytest.mark.asyncio
+async def test_requests_per_minute_spaces_request_starts(tmp_path):
+    conv = DiagramToMermaidConverter(client=object(), async_client=FakeAsyncOpenAI(),
+                                     max_concurrency=10, requests_per_minute=600)  # 0.1s apart
+    paths = _images(tmp_path, [b"x", b"y", b"z"])
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await conv.convert_many(paths)
+    assert loop.time() - start >= 0.2
+
+
+@pytest.mark.asyncio
+async def test_shared_provider_cap_and_rate_limiter_apply_to_conversions():
+    fake = FakeAsyncOpenAI()
+    acquired = []
+    limiter = RateLimiter(requests_per_minute=6000)
+    limiter_acquire = limiter.acquire
+
+    async def acquire(tokens=0):
+        acquired.append(tokens)
+        return await limiter_acquire(tokens)
+    limiter.acquire = acquire
+    conv = DiagramToMermaidConverter(client=object(), async_client=fake, max_concurrency=4,
+                                     concurrency=asyncio.Semaphore(1), rate_limiter=limiter)
+    results = await conv.convert_many([b"a", b"b", b"c"])
+    assert all(isinstance(r, str) for r in results)
+    assert fake.peak == 1
+    assert len(acquired) == 3
+
+
+class RateLimitedOnce(FakeAsyncOpenAI):
+    """Rejects the first request with a 429 carrying retry-after, then answers."""
+
+    def __init__(self, status=429):
+        super().__init__()
+        self.status, self.calls = status, 0
+
+    async def _create(self, model, messages, temperature):
+        self.calls += 1
+        if self.calls == 1:
+            error = RuntimeError(f"HTTP {self.status}")
+            error.status_code = self.status
+            error.response = SimpleNamespace(status_code=self.status, headers={"retry-after-ms": "10"})
+            raise error
+        return await super()._create(model, messages, temperature)
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_conversion_backs_off_and_retries():
+    fake = RateLimitedOnce()
+    limiter = RateLimiter(requests_per_minute=6000)
+    conv = DiagramToMermaidConverter(client=object(), async_client=fake, rate_limiter=limiter,
+                                     retry_policy=RetryPolicy(base_delay=0.0))
+    [result] = await conv.convert_many([b"a"])
+    assert result.startswith("flowchart TD")
+    assert fake.calls == 2
+    assert limiter.throttled == 1
+
+
+@pytest.mark.asyncio
+async def test_request_errors_are_not_retried():
+    fake = RateLimitedOnce(status=400)
+    conv = DiagramToMermaidConverter(client=object(), async_client=fake, retry_policy=RetryPolicy(base_delay=0.0))
+    [result] = await conv.convert_many([b"a"])
+    assert isinstance(result, RuntimeError)
+    assert fake.calls == 1
+
+
+def test_requires_api_key_without_client():
+    with pytest.raises(ValueError):
+        DiagramToMermaidConverter()
@@ -0,0 +1,193 @@
+import os
+import random
+import shutil
+import threading
+from pathlib import Path
+from time import perf_counter
+
+import fitz
+import pytest
+
+from myagents.document_parser import DocumentParser, PARSE_CACHE_NAME
+
+
+class CountingConverter:
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def convert(self, image_path, output_path=None, extra_instructions=""):
+        with self._lock:
+            self.calls.append(image_path)
+        mermaid = f"flowchart TD\nA[{image_path.stem}] --> B"
+        if output_path:
+            output_path.write_text(mermaid, encoding="utf-8")
+        return mermaid
+
+
+def _noise_pixmap(seed, size=64):
+    """Distinct seeds give visually distinct images; the same seed gives the same image."""
+    data = random.Random(seed).randbytes(size * size * 3)
+    return fitz.Pixmap(fitz.csRGB, size, size, data, False)
+
+
+def _make_pdf(path, pages):
+    """pages: list of (text, image seed or None)"""
+    doc = fitz.open()
+    for text, seed in pages:
+        page = doc.new_page()
+        page.insert_text((72, 72), text)
+        if seed is not None:
+            page.insert_image(fitz.Rect(72, 100, 200, 228), pixmap=_noise_pixmap(seed))
+    doc.save(path.as_posix())
+    doc.close()
+
+
+def test_parse_folder_preserves_page_order(tmp_path):
+    _make_pdf(tmp_path / "design.pdf", [("Page one", 1), ("Page two", 2)])
+    (tmp_path / "notes.txt").write_text("x")
+    dp = DocumentParser(converter=CountingConverter())
+    dp.parse_folder(tmp_path)
+    text = dp.get_design_as_text()
+    assert text.index("Page 1") < text.index("design_p1_i1") < text.index("Page 2") < text.index("design_p2_i1")
+    assert text.index("design.pdf") < text.index("[FILE] notes.txt")
+
+
+def test_incremental_reuses_unchanged_files_and_diagrams(tmp_path):
+    pdf = tmp_path / "design.pdf"
+    _make_pdf(pdf, [("Page one", 1), ("Page two", 2)])
+
+    cache_dir = tmp_path / ".sdra_cache"
+    first = CountingConverter()
+    dp = DocumentParser(converter=first, incremental=True, cache_dir=cache_dir)
+    dp.parse_folder(tmp_path)
+    assert len(first.calls) == 2
+    assert len(list(cache_dir.glob("*.json"))) == 1
+    assert not (tmp_path / PARSE_CACHE_NAME).exists()  # the design folder is not written to
+
+    # Unchanged folder: nothing is re-converted and the text is identical
+    second = CountingConverter()
+    dp2 = DocumentParser(converter=second, incremental=True, cache_dir=cache_dir)
+    dp2.parse_folder(tmp_path)
+    assert second.calls == []
+    assert dp2.get_design_as_text() == dp.get_design_as_text()
+
+    # One page edited: text is re-extracted, only the new diagram is converted
+    _make_pdf(pdf, [("Page one edited", 1), ("Page two", 3)])
+    third = CountingConverter()
+    dp3 = DocumentParser(converter=third, incremental=True, cache_dir=cache_dir)
+    dp3.parse_folder(tmp_path)
+    assert len(third.calls) == 1
+    assert "Page one edited" in dp3.get_design_as_text()
+
+
+class BatchConverter(CountingConverter):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    async def convert_many(self, image_paths, output_paths=None, extra_instructions=""):
+        self.batches.append(list(image_paths))
+        return [self.convert(p, o) for p, o in zip(image_paths, output_paths)]
+
+
+def test_folder_diagrams_are_converted_in_one_batch(tmp_path):
+    _make_pdf(tmp_path / "a.pdf", [("A1", 1), ("A2", 3)])
+    _make_pdf(tmp_path / "b.pdf", [("B1", 2)])
+    conv = BatchConverter()
+    dp = DocumentParser(converter=conv)
+    dp.parse_folder(tmp_path)
+    assert len(conv.batches) == 1
+    assert len(conv.batches[0]) == 3
+    text = dp.get_design_as_text()
+    assert text.index("a_p1_i1") < text.index("a_p2_i1") < text.index("b_p1_i1")
+
+
+def test_repeated_diagrams_are_converted_once_and_referenced(tmp_path):
+    _make_pdf(tmp_path / "design.pdf", [("P1", 7), ("P2", 7), ("P3", 8), ("P4", 7)])
+    conv = CountingConverter()
+    dp = DocumentParser(converter=conv)
+    dp.parse_folder(tmp_path)
+    text = dp.get_design_as_text()
+    assert len(conv.calls) == 2
+    assert text.count("[MERMAID DIAGRAM DIAG-001]\n") == 1
+    assert text.count("[MERMAID DIAGRAM DIAG-001] (repeat; see above)") == 2
+    assert "[MERMAID DIAGRAM DIAG-002]" in text
+
+
+def _boxes_diagram(labels):
+    """Three boxes joined by arrows, rendered like an exported architecture diagram."""
+    doc = fitz.open()
+    page = doc.new_page(width=420, height=120)
+    for i, label in enumerate(labels):
+        box = fitz.Rect(20 + i * 140, 40, 120 + i * 140, 80)
+        page.draw_rect(box, color=(0, 0, 0))
+        page.insert_text((box.x0 + 8, box.y0 + 24), label, fontsize=10)
+        if i:
+            page.draw_line((box.x0 - 40, 60), (box.x0, 60), color=(0, 0, 0))
+    pix = page.get_pixmap()
+    doc.close()
+    return pix
+
+
+def test_same_layout_diagrams_with_different_labels_are_both_converted(tmp_path):
+    doc = fitz.open()
+    for labels in (("Browser", "Web API", "Postgres"), ("Admin CLI", "Auth Svc", "Vault")):
+        page = doc.new_page()
+        page.insert_image(fitz.Rect(72, 100, 492, 220), pixmap=_boxes_diagram(labels))
+    doc.save((tmp_path / "design.pdf").as_posix())
+    doc.close()
+    conv = CountingConverter()
+    dp = DocumentParser(converter=conv)
+    dp.parse_folder(tmp_path)
+    assert len(conv.calls) == 2
+    assert "(repeat; see above)" not in dp.get_design_as_text()
+
+
+def test_invalid_folder_raises(tmp_path):
+    with pytest.raises(ValueError):
+        DocumentParser().parse_folder(tmp_path / "missing")
+
+
+class InMemoryConverter(CountingConverter):
+    in_memory_images = True
+
+    def convert(self, image_path, output_path=None, extra_instructions=""):
+        assert isinstance(image_path, bytes) and output_path is None
+        with self._lock:
+            self.calls.append(image_path)
+        return f"flowchart TD\nA[{len(self.calls)}] --> B"
+
+
+def test_sharded_pdf_extraction_matches_in_process(tmp_path):
+    pages = [(f"Page text {i}", i % 4 if i % 3 else None) for i in range(1, 12)]
+    _make_pdf(tmp_path / "design.pdf", pages)
+    texts = []
+    for processes in (1, 2):
+        conv = InMemoryConverter()
+        dp = DocumentParser(converter=conv, pdf_processes=processes, pages_per_task=3)
+        dp.parse_folder(tmp_path)
+        texts.append(dp.get_design_as_text())
+        assert all(c.startswith(b"\x89PNG") for c in conv.calls) and len(conv.calls) == 4
+    assert texts[0] == texts[1]
+    assert [texts[1].index(f"Page {i}\n") for i in range(1, 12)] == sorted(
+        texts[1].index(f"Page {i}\n") for i in range(1, 12))
+    assert not (tmp_path / "design_assets").exists()
+
+
+REQUIREMENTS_PDF = Path(__file__).resolve().parents[1] / "requirements" / "SoftwareArchitectureDocumentation.pdf"
+
+
+@pytest.mark.benchmark
+@pytest.mark.skipif(not os.getenv("SDRA_BENCHMARK"), reason="set SDRA_BENCHMARK=1 to run the extraction benchmark")
+def test_pdf_extraction_benchmark(tmp_path):
+    shutil.copy(REQUIREMENTS_PDF, tmp_path)  # parse a copy: requirements/ stays untouched
+    timings, texts = {}, {}
+    for processes in (1, 0):
+        dp = DocumentParser(pdf_processes=processes, pages_per_task=4)
+        t0 = perf_counter()
+        dp.parse_folder(tmp_path)
+        timings[processes], texts[processes] = perf_counter() - t0, dp.get_design_as_text()
+    print(f"\n{REQUIREMENTS_PDF.name}: in-process {timings[1]:.2f}s, "
+          f"{os.cpu_count()} processes {timings[0]:.2f}s")
+    assert texts[0] == texts[1]
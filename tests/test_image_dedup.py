@@ -0,0 +1,62 @@
+import random
+from pathlib import Path
+
+import fitz
+
+from myagents.image_dedup import DiagramImage, ImageDeduplicator, describe_png, dhash, hamming
+
+
+def _gradient(seed, size=96):
+    """Smooth random blobs: survive rescaling the way real diagrams do."""
+    rnd = random.Random(seed)
+    cells = [[rnd.randrange(256) for _ in range(4)] for _ in range(4)]
+    data = bytearray()
+    for y in range(size):
+        for x in range(size):
+            v = cells[y * 4 // size][x * 4 // size]
+            data += bytes((v, v, v))
+    return fitz.Pixmap(fitz.csRGB, size, size, bytes(data), False)
+
+
+def test_dhash_tolerates_rescaling_but_separates_different_images():
+    a = _gradient(1)
+    a_small = fitz.Pixmap(a, 60, 60, None)
+    b = _gradient(2)
+    assert hamming(dhash(a), dhash(a_small)) <= 6
+    assert hamming(dhash(a), dhash(b)) > 6
+
+
+def test_assign_ids_groups_exact_repeats_only_by_default():
+    a = _gradient(1)
+    imgs = [
+        describe_png(Path("a.png"), a.tobytes("png")),
+        describe_png(Path("b.png"), _gradient(2).tobytes("png")),
+        describe_png(Path("a_again.png"), a.tobytes("png")),
+        describe_png(Path("a_resized.png"), fitz.Pixmap(a, 60, 60, None).tobytes("png")),
+        describe_png(Path("icon.png"), fitz.Pixmap(a, 16, 16, None).tobytes("png")),
+    ]
+    ids = ImageDeduplicator().assign_ids(imgs)
+    assert ids == ["DIAG-001", "DIAG-002", "DIAG-001", "DIAG-003", None]
+
+
+def test_perceptual_match_is_opt_in_and_needs_equal_dimensions():
+    a = _gradient(1)
+    reencoded = a.tobytes("jpeg")  # same pixels, different bytes
+    imgs = [
+        describe_png(Path("a.png"), a.tobytes("png")),
+        describe_png(Path("a.jpg"), reencoded),
+        describe_png(Path("a_resized.png"), fitz.Pixmap(a, 60, 60, None).tobytes("png")),
+    ]
+    assert ImageDeduplicator().assign_ids(imgs) == ["DIAG-001", "DIAG-002", "DIAG-003"]
+    assert ImageDeduplicator(phash_threshold=2).assign_ids(imgs) == ["DIAG-001", "DIAG-001", "DIAG-002"]
+
+
+def test_negative_threshold_only_merges_exact_copies():
+    a = _gradient(1)
+    imgs = [
+        describe_png(Path("a.png"), a.tobytes("png")),
+        describe_png(Path("a_resized.png"), fitz.Pixmap(a, 61, 57, None).tobytes("png")),
+        DiagramImage(path=Path("undecodable.gif"), sha256="x", dhash=None),
+    ]
+    ids = ImageDeduplicator(phash_threshold=-1).assign_ids(imgs)
+    assert ids == ["DIAG-001", "DIAG-002", "DIAG-003"]
@@ -0,0 +1,47 @@
+import json
+
+from myagents.incremental_json import IncrementalJSONParser
+
+DOC = {
+    "trust_boundaries": {"schema_version": "1.0", "boundaries": [
+        {"id": "TB-001", "name": "Edge {not a bracket}", "elements": ["P-001"]},
+        {"id": "TB-002", "name": "Quote \" and \\ escape", "elements": []},
+    ]},
+    "dfds": {"dfds": [{"id": "DFD-001", "nodes": [{"id": "P-001", "label": "App"}], "edges": []}]},
+    "stride_matrix": {"rows": [{"element_id": "P-001", "stride": s} for s in "STRIDE"], "coverage_pct": 100},
+}
+
+
+def _feed_in_chunks(text, size):
+    parser = IncrementalJSONParser()
+    records = []
+    for i in range(0, len(text), size):
+        records.extend(parser.feed(text[i:i + size]))
+    return parser, records
+
+
+def test_records_emitted_with_paths_regardless_of_chunking():
+    text = "```json\n" + json.dumps(DOC, indent=2) + "\n```"
+    for size in (1, 7, 4096):
+        parser, records = _feed_in_chunks(text, size)
+        assert parser.complete
+        by_path = {}
+        for r in records:
+            by_path.setdefault(r.pattern, []).append(r.value)
+        assert [b["name"] for b in by_path[("trust_boundaries", "boundaries")]] == [
+            "Edge {not a bracket}", 'Quote " and \\ escape']
+        assert by_path[("dfds", "dfds", "*", "nodes")] == [{"id": "P-001", "label": "App"}]
+        assert [r["stride"] for r in by_path[("stride_matrix", "rows")]] == list("STRIDE")
+        assert "6 STRIDE rows" in parser.summary()
+
+
+def test_records_arrive_before_document_completes():
+    text = json.dumps(DOC)
+    cut = text.index('"dfds"')
+    parser = IncrementalJSONParser()
+    early = parser.feed(text[:cut])
+    assert [r.value["id"] for r in early] == ["TB-001", "TB-002"]
+    assert not parser.complete
+    parser.feed(text[cut:])
+    assert parser.complete
+    assert parser.buffer == text
@@ -0,0 +1,97 @@
+import json
+from pathlib import Path
+
+from myagents.json_merger import DREAD_SEVERITY_BINS, JSONMerger, extract_json, severity_for_score
+
+
+def _phase1(nodes, boundaries, rows):
+    return {
+        "trust_boundaries": {"schema_version": "1.0", "run_id": "r1",
+                             "boundaries": boundaries, "evidence": []},
+        "dfds": {"schema_version": "1.0", "run_id": "r1", "dfds": [
+            {"id": "DFD-001", "title": "Context", "mermaid": "flowchart TD", "nodes": nodes,
+             "edges": [], "boundaries": [b["id"] for b in boundaries]},
+        ]},
+        "stride_matrix": {"schema_version": "1.0", "run_id": "r1", "rows": rows, "coverage_pct": 0},
+    }
+
+
+def _row(element_id, stride, applies=True, example="x"):
+    return {"element_id": element_id, "element_type": "process", "stride": stride,
+            "applies": applies, "example": example}
+
+
+def test_unions_by_id_and_folds_semantic_duplicates():
+    a = _phase1(
+        nodes=[{"id": "P-001", "type": "process", "label": "Web App"},
+               {"id": "DS-001", "type": "data_store", "label": "User Database"}],
+        boundaries=[{"id": "TB-001", "name": "Internet boundary", "description": "d", "elements": ["P-001"]}],
+        rows=[_row("P-001", "S", applies=False, example="short")],
+    )
+    # Same things, different IDs / wording; plus a genuinely new element that collides on P-001
+    b = _phase1(
+        nodes=[{"id": "P-007", "type": "process", "label": "Web app"},
+               {"id": "P-001", "type": "process", "label": "Payment Worker"},
+               {"id": "DS-004", "type": "data_store", "label": "User database"}],
+        boundaries=[{"id": "TB-001", "name": "Internet Boundary", "description": "longer desc", "elements": ["P-007", "P-001"]}],
+        rows=[_row("P-007", "S", applies=True, example="a richer example"), _row("P-001", "T")],
+    )
+    result = JSONMerger().merge([json.dumps(a), "```json\n" + json.dumps(b) + "\n```"])
+    merged = result.merged
+    assert result.residual_outputs == []
+    assert result.remapped_ids[1] == {"P-007": "P-001", "P-001": "P-002", "DS-004": "DS-001"}
+
+    nodes = {n["id"]: n["label"] for n in merged["dfds"]["dfds"][0]["nodes"]}
+    assert nodes == {"P-001": "Web App", "DS-001": "User Database", "P-002": "Payment Worker"}
+    boundary = merged["trust_boundaries"]["boundaries"][0]
+    assert boundary["elements"] == ["P-001", "P-002"]
+    assert boundary["description"] == "longer desc"
+
+    rows = {(r["element_id"], r["stride"]): r for r in merged["stride_matrix"]["rows"]}
+    assert rows[("P-001", "S")]["applies"] is True
+    assert rows[("P-001", "S")]["example"] == "a richer example"
+    assert ("P-002", "T") in rows
+    assert merged["stride_matrix"]["coverage_pct"] == round(100 * 2 / 18, 1)
+
+
+def test_dread_ratings_merge_by_stride_cell_and_rescore():
+    def rating(tid, element, stride, damage):
+        return {"threat_id": tid, "element_id": element, "stride": stride,
+                "dread": {"damage": damage, "reproducibility": 8, "exploitability": 8,
+                          "affected_users": 8, "discoverability": 8},
+                "score": 0, "severity": "Info", "rationale": "r"}
+
+    a = {"dread": {"schema_version": "1.0", "run_id": "r", "ratings": [rating("TH-0001", "P-001", "S", 2)]}}
+    b = {"dread": {"schema_version": "1.0", "run_id": "r", "ratings": [
+        rating("TH-0001", "P-002", "T", 1), rating("TH-0002", "P-001", "S", 9)]},
+        "mitigations": {"schema_version": "1.0", "run_id": "r", "items": [
+            {"id": "MIT-0001", "title": "t", "description": "d", "threat_ids": ["TH-0001", "TH-0002"],
+             "priority": 1, "nist_csf": ["PR.AC-1"], "effort": "S", "dependencies": []}]}}
+    merged = JSONMerger().merge([a, b]).merged
+    ratings = {r["threat_id"]: r for r in merged["dread"]["ratings"]}
+    assert set(ratings) == {"TH-0001", "TH-0002"}
+    assert (ratings["TH-0001"]["element_id"], ratings["TH-0001"]["stride"]) == ("P-001", "S")
+    assert ratings["TH-0001"]["dread"]["damage"] == 9
+    assert ratings["TH-0001"]["score"] == 41 and ratings["TH-0001"]["severity"] == "Critical"
+    assert ratings["TH-0002"]["element_id"] == "P-002"
+    # references inside the second model's output follow its renumbered threats
+    assert merged["mitigations"]["items"][0]["threat_ids"] == ["TH-0002", "TH-0001"]
+
+
+def test_unparseable_outputs_are_residual():
+    a = _phase1([], [], [])
+    result = JSONMerger().merge([json.dumps(a), '{"trust_boundaries": {"boundaries": [ {"id": "TB-0'])
+    assert result.merged is not None
+    assert len(result.residual_outputs) == 1
+
+
+def test_helpers():
+    assert extract_json('Here you go:\n{"a": 1}\nThanks') == {"a": 1}
+    assert extract_json("not json") is None
+    assert [severity_for_score(s) for s in (45, 36, 26, 12, 3)] == ["Critical", "High", "Medium", "Low", "Info"]
+
+
+def test_phase2_prompt_states_the_severity_bins_the_merger_applies():
+    prompt = Path(__file__).resolve().parents[1] / "prompts" / "v1" / "DREAD_AnnotatedDFD_Mitigations_User_Prompt.txt"
+    bins = ", ".join(f"{floor}+ {severity}" for floor, severity in DREAD_SEVERITY_BINS)
+    assert f"Severity bins: {bins}\n" in prompt.read_text(encoding="utf-8")
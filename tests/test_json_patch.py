@@ -0,0 +1,66 @@
+from myagents.json_patch import apply_patch, build_patch_request, locate, parse_pointer, patch_targets
+
+DOC = {
+    "trust_boundaries": {"boundaries": [
+        {"id": "TB-001", "name": "Internet", "description": "edge", "elements": ["EXT-001"]},
+    ]},
+    "dfds": {"dfds": [{"id": "DFD-001", "nodes": [{"id": "P-001", "label": "API"}], "edges": []}]},
+    "stride_matrix": {"rows": [
+        {"element_id": "P-001", "stride": "S", "applies": False, "threat": ""},
+        {"element_id": "P-001", "stride": "T", "applies": True, "threat": "tampering"},
+    ]},
+}
+
+
+def test_selectors_address_records_by_identity():
+    result = apply_patch(DOC, [
+        {"op": "replace", "path": "/stride_matrix/rows/[element_id=P-001,stride=S]/applies", "value": True},
+        {"op": "add", "path": "/dfds/dfds/[id=DFD-001]/nodes/-", "value": {"id": "DS-001", "label": "DB"}},
+        {"op": "remove", "path": "/trust_boundaries/boundaries/[id=TB-001]/elements/0"},
+    ])
+    assert not result.rejected
+    doc = result.doc
+    assert doc["stride_matrix"]["rows"][0]["applies"] is True
+    assert [n["id"] for n in doc["dfds"]["dfds"][0]["nodes"]] == ["P-001", "DS-001"]
+    assert doc["trust_boundaries"]["boundaries"][0]["elements"] == []
+    assert DOC["stride_matrix"]["rows"][0]["applies"] is False  # input untouched
+
+
+def test_bad_ops_are_rejected_individually():
+    result = apply_patch(DOC, [
+        {"op": "replace", "path": "/stride_matrix/rows/[element_id=P-009,stride=S]/applies", "value": True},
+        {"op": "add", "path": "/dfds/dfds/[id=DFD-001]/nodes/-", "value": {"id": "P-001", "label": "dup"}},
+        {"op": "move", "path": "/dfds"},
+        {"op": "replace", "path": "/trust_boundaries/boundaries/[id=TB-001]/name", "value": "Public"},
+    ])
+    assert [op.get("op") for op, _ in result.rejected] == ["replace", "add", "move"]
+    assert "matched 0 items" in result.rejected[0][1]
+    assert result.doc["trust_boundaries"]["boundaries"][0]["name"] == "Public"
+
+
+def test_later_patches_do_not_overwrite_earlier_edits():
+    first = apply_patch(DOC, [{"op": "replace", "path": "/stride_matrix/rows/[element_id=P-001,stride=T]",
+                               "value": {"element_id": "P-001", "stride": "T", "applies": True, "threat": "A"}}])
+    second = apply_patch(first.doc, [{"op": "replace", "path": "/stride_matrix/rows/[element_id=P-001,stride=T]/threat",
+                                      "value": "B"}], first.touched)
+    assert second.rejected and second.doc["stride_matrix"]["rows"][1]["threat"] == "A"
+
+
+def test_locate_and_patch_request_include_only_affected_records():
+    assert parse_pointer("/a~1b/[id=x/y]/c") == ["a/b", "[id=x/y]", "c"]
+    pointers = [p for p, _ in locate(DOC, {"P-001"})]
+    assert "/dfds/dfds/[id=DFD-001]/nodes/[id=P-001]" in pointers
+    assert "/stride_matrix/rows/[element_id=P-001,stride=S]" in pointers
+
+    suggestions = [{"category": "trust_boundary", "id_or_location": "TB-001", "issue": "too vague"}]
+    assert list(patch_targets(DOC, suggestions)) == ["/trust_boundaries/boundaries/[id=TB-001]"]
+    request = build_patch_request(DOC, suggestions)
+    assert '"patches"' in request and "TB-001" in request and "tampering" not in request
+
+
+def test_patch_request_shows_the_section_of_suggestions_without_a_record():
+    suggestions = [{"category": "stride", "id_or_location": "stride_matrix", "issue": "no row for the admin API"}]
+    request = build_patch_request(DOC, suggestions)
+    assert '"threat":"tampering"' in request and '"threat":""' not in request  # compact rendering
+    assert "NOT repeated here" in request and "document above" not in request
+    assert "trust_boundaries" not in request.split("SECTIONS CONCERNED")[0].split("(compact):")[1]
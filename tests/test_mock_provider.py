@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from myagents.client_pool import ClientPool
+from myagents.llm_model import LLMModel, cacheable, text_block
+from myagents.mock_provider import MOCK_API_KEY, MockBehavior, MockProvider, replay
+from myagents.rate_limiter import RetryPolicy
+from myagents.telemetry import Telemetry
+
+MESSAGES = [
+    {"role": "system", "content": "You are terse."},
+    {"role": "user", "content": [cacheable("REQUIREMENTS"), text_block("Say hello.")]},
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("provider", ["openai", "anthropic"])
+async def test_sdk_calls_and_streams_through_the_mock(provider):
+    mock = MockProvider(responder=replay(["hello from the mock " * 10]), behavior=MockBehavior(chunk_chars=7))
+    pool = ClientPool(transport=mock.transport())
+    telemetry = Telemetry()
+    model = LLMModel("m", MOCK_API_KEY, model_type=provider, client_pool=pool, telemetry=telemetry)
+    try:
+        assert await model.callwithmessages(MESSAGES) == "hello from the mock " * 10
+        chunks = [c async for c in model.stream_with_messages(MESSAGES)]
+    finally:
+        await pool.aclose()
+
+    assert "".join(chunks) == "hello from the mock " * 10 and len(chunks) > 1
+    assert [r.stream for r in mock.requests] == [False, True]
+    assert mock.requests[0].system == "You are terse."
+    assert mock.requests[0].user == "REQUIREMENTSSay hello."
+    assert all(c.prompt_tokens > 0 and c.completion_tokens == 50 for c in telemetry.calls)
+
+
+@pytest.mark.asyncio
+async def test_injected_errors_are_retried_like_real_ones():
+    mock = MockProvider(responder=replay(["ok"]), behavior=MockBehavior(error_rate=1.0, error_status=429,
+                                                                        retry_after_s=0.01))
+    pool = ClientPool(transport=mock.transport())
+    telemetry = Telemetry()
+    model = LLMModel("m", MOCK_API_KEY, client_pool=pool, telemetry=telemetry,
+                     retry_policy=RetryPolicy(max_attempts=3, base_delay=0.0, max_delay=0.05))
+    try:
+        with pytest.raises(Exception) as err:
+            await model.callwithmessages(MESSAGES)
+    finally:
+        await pool.aclose()
+    assert getattr(err.value, "status_code", None) == 429
+    assert len(mock.requests) == 3 and telemetry.calls[0].retries == 2
+
+
+@pytest.mark.asyncio
+async def test_latency_is_simulated():
+    mock = MockProvider(behavior=MockBehavior(latency_s=0.05))
+    pool = ClientPool(transport=mock.transport())
+    telemetry = Telemetry()
+    model = LLMModel("m", MOCK_API_KEY, model_type="anthropic", client_pool=pool, telemetry=telemetry)
+    try:
+        await model.callwithmessages(MESSAGES)
+    finally:
+        await pool.aclose()
+    assert telemetry.calls[0].latency_s >= 0.05
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("provider", ["openai", "anthropic"])
+async def test_structured_output_is_requested_natively_and_parsed(provider, tmp_path):
+    from myagents.response_cache import ResponseCache
+    from myagents.schema_validation import SUGGESTIONS_SCHEMA, response_format
+
+    answer = {"suggestions": [{"category": "dfd", "id_or_location": "P-001", "issue": "i",
+                               "rationale": "r", "suggested_change": "c"}]}
+    mock = MockProvider(responder=replay([json.dumps(answer)]), behavior=MockBehavior(chunk_chars=9))
+    pool = ClientPool(transport=mock.transport())
+    fmt = response_format(SUGGESTIONS_SCHEMA)
+    cache = ResponseCache(path=tmp_path / "responses.sqlite3")
+    model = LLMModel("m", MOCK_API_KEY, model_type=provider, client_pool=pool, response_cache=cache)
+    try:
+        assert await model.call_json(MESSAGES, fmt) == answer
+        assert await model.callwithmessages(MESSAGES) == json.dumps(answer)  # plain text is cached apart
+        cache.clear()
+        streamed = "".join([c async for c in model.stream_with_messages(MESSAGES, response_format=fmt)])
+        assert await model.call_json(MESSAGES, fmt) == answer  # the completed stream was cached
+    finally:
+        await pool.aclose()
+        cache.close()
+
+    assert json.loads(streamed) == answer
+    assert [r.response_schema for r in mock.requests] == [fmt["schema"], None, fmt["schema"]]
+    if provider == "anthropic":
+        assert mock.requests[0].body["tool_choice"] == {"type": "tool", "name": "suggestions"}
+    else:
+        assert mock.requests[0].body["response_format"]["json_schema"]["name"] == "suggestions"
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from myagents.model_router import ModelRouter, StageRoute, collect_stats, load_history
+from myagents.telemetry import CallRecord, Telemetry
+
+
+def _calls(model, latency, n=3, ok=True, prompt=1000, completion=500, cache_hit=False):
+    return [{"model": model, "latency_s": latency, "ok": ok, "prompt_tokens": prompt,
+             "completion_tokens": completion, "cache_hit": cache_hit} for _ in range(n)]
+
+
+def test_stats_skip_cache_hits_and_price_successful_calls():
+    stats = collect_stats(_calls("gpt-5", 10.0) + _calls("gpt-5", 0.0, cache_hit=True) + _calls("gpt-5", 1.0, n=1, ok=False))
+    s = stats["gpt-5"]
+    assert (s.calls, s.failures, s.latency) == (4, 1, 10.0)
+    assert s.cost_per_call("gpt-5") == pytest.approx((1000 * 1.25 + 500 * 10.0) / 1e6)
+
+
+def test_fixed_routes_keep_order_and_filter_providers():
+    router = ModelRouter()
+    assert [str(c) for c in router.select("fanout", ["openai", "anthropic"])] == [
+        "openai:gpt-5", "anthropic:claude-sonnet-4-20250514"]
+    assert [str(c) for c in router.select("fanout", ["openai"])] == ["openai:gpt-5"]
+
+
+def test_policies_rank_by_observed_latency_and_cost():
+    routes = {
+        "fast": StageRoute(["openai:gpt-5", "openai:gpt-5-mini", "openai:gpt-4o-mini"], "fastest"),
+        "cheap": StageRoute(["openai:gpt-5", "openai:gpt-5-mini"], "cheapest"),
+    }
+    history = _calls("gpt-5", 40.0) + _calls("gpt-5-mini", 8.0)
+    router = ModelRouter(routes=routes, history=history)
+    # gpt-4o-mini has no observations: it takes the median slot instead of jumping ahead
+    assert [c.model for c in router.rank("fast")] == ["gpt-5-mini", "gpt-4o-mini", "gpt-5"]
+    assert [c.model for c in router.rank("cheap")] == ["gpt-5-mini", "gpt-5"]
+
+
+def test_live_failures_demote_a_model():
+    telemetry = Telemetry()
+    router = ModelRouter(routes={"merge": StageRoute(["openai:gpt-5-mini", "openai:gpt-5"], "balanced")},
+                         telemetry=telemetry)
+    assert router.select("merge")[0].model == "gpt-5-mini"
+    telemetry.calls += [CallRecord(model="gpt-5-mini", provider="openai", operation="chat", ok=False)] * 3
+    assert router.select("merge")[0].model == "gpt-5"
+
+
+def test_routes_file_and_history(tmp_path):
+    path = tmp_path / "routes.json"
+    path.write_text(json.dumps({"report": {"candidates": ["anthropic:claude-sonnet-4-20250514"]},
+                                "merge": ["openai:gpt-4o-mini"]}))
+    router = ModelRouter.from_file(path)
+    assert router.select("report")[0].provider == "anthropic"
+    assert router.routes["merge"].candidates == ["openai:gpt-4o-mini"]
+    assert "vision" in router.routes
+    with pytest.raises(ValueError):
+        StageRoute(["openai:gpt-5"], "random")
+
+    run = tmp_path / "runs" / "a-1234"
+    run.mkdir(parents=True)
+    Telemetry(calls=[CallRecord(model="gpt-5", provider="openai", operation="chat")]).write(run)
+    assert [c["model"] for c in load_history(tmp_path / "runs")] == ["gpt-5"]
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from myagents.phase1_sharding import parse_shard, plan_shards, stitch
+
+INVENTORY = {
+    "trust_boundaries": {"run_id": "r1", "boundaries": [
+        {"id": "TB-001", "elements": ["EXT-001", "P-001"]},
+        {"id": "TB-002", "elements": ["P-001", "P-002", "DS-001"]},
+    ]},
+    "dfds": {"run_id": "r1", "dfds": [{"id": "DFD-001", "nodes": [
+        {"id": "EXT-001", "type": "external_entity", "label": "User"},
+        {"id": "P-001", "type": "process", "label": "API"},
+        {"id": "P-002", "type": "process", "label": "Worker"},
+        {"id": "DS-001", "type": "data_store", "label": "DB"},
+        {"id": "P-003", "type": "process", "label": "Cron"}],
+        "edges": [{"from": "EXT-001", "to": "P-001", "label": "login"}, {"from": "P-002", "to": "DS-001", "label": "sql"}]}]},
+}
+
+
+def _rows(elements, skip=()):
+    return json.dumps({"rows": [{"element_id": e, "stride": c, "applies": c == "T", "example": f"{e} {c}",
+                                 "element_type": "wrong", "evidence": [{"source_type": "diagram", "source_id": "d1"},
+                                                                       {"source_type": "guess"}]}
+                                for e in elements for c in "STRIDE" if (e, c) not in skip]})
+
+
+def test_shards_follow_boundaries_and_split_large_ones():
+    shards = plan_shards(INVENTORY, max_elements=2)
+    assert [(s.boundary, [e["id"] for e in s.elements]) for s in shards] == [
+        ("TB-001", ["EXT-001", "P-001"]),
+        ("TB-002", ["P-002", "DS-001"]),          # P-001 is analysed once, with TB-001
+        ("(no boundary)", ["P-003"]),
+    ]
+    assert shards[1].flows == [{"from": "P-002", "to": "DS-001", "label": "sql"}]
+
+
+def test_parse_shard_normalizes_rows_and_requires_every_cell():
+    shard = plan_shards(INVENTORY)[0]
+    rows = parse_shard(_rows(["EXT-001", "P-001", "P-999"]), shard)
+    assert len(rows) == 12 and {r["element_id"] for r in rows} == {"EXT-001", "P-001"}
+    assert rows[0]["element_type"] == "external_entity"
+    assert rows[0]["evidence"] == [{"source_type": "diagram", "source_id": "d1"}]
+    with pytest.raises(ValueError, match="P-001/E"):
+        parse_shard(_rows(["EXT-001", "P-001"], skip={("P-001", "E")}), shard)
+
+
+def test_stitch_orders_rows_by_inventory():
+    shards = plan_shards(INVENTORY)
+    results = {s.index: parse_shard(_rows([e["id"] for e in s.elements]), s) for s in reversed(shards)}
+    doc = stitch(INVENTORY, shards, results)
+    order = [r["element_id"] for r in doc["stride_matrix"]["rows"]][::6]
+    assert order == ["EXT-001", "P-001", "P-002", "DS-001", "P-003"]
+    assert doc["stride_matrix"]["run_id"] == "r1" and doc["dfds"] is INVENTORY["dfds"]
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import pytest
+
+from myagents.phase2_engine import assemble, assign_threats, parse_slice, plan_slices, run_slices
+from myagents.pre_evaluator import check_structure
+from myagents.schema_validation import validate
+
+PHASE1 = {
+    "trust_boundaries": {"run_id": "r1", "boundaries": [{"id": "TB-001", "name": "Edge", "elements": ["P-001"]}]},
+    "dfds": {"run_id": "r1", "dfds": [{"id": "DFD-001", "nodes": [
+        {"id": "EXT-001", "type": "external_entity", "label": "User"},
+        {"id": "P-001", "type": "process", "label": "API"},
+        {"id": "DS-001", "type": "data_store", "label": "DB"}],
+        "edges": [{"from": "EXT-001", "to": "P-001", "label": "login"}, {"from": "P-001", "to": "DS-001", "label": "sql"}]}]},
+    "stride_matrix": {"run_id": "r1", "rows": [
+        {"element_id": "P-001", "stride": "T", "applies": True, "example": "param tampering"},
+        {"element_id": "P-001", "stride": "S", "applies": True, "example": "token replay"},
+        {"element_id": "DS-001", "stride": "I", "applies": True, "example": "dump"},
+        {"element_id": "EXT-001", "stride": "R", "applies": False, "example": ""},
+    ]},
+}
+
+
+def _answer(s, factor=5):
+    return json.dumps({
+        "ratings": [{"threat_id": t.threat_id, "rationale": "r", "dread": dict.fromkeys(
+            ("damage", "reproducibility", "exploitability", "affected_users", "discoverability"), factor)}
+            for t in s.threats],
+        "mitigations": [{"title": "Enforce strong authentication", "description": "MFA",
+                         "threat_ids": [t.threat_id for t in s.threats], "nist_csf": ["PR.AC-1", "bogus"],
+                         "effort": "M"}],
+        "annotations": [{"element_id": e["id"], "note": f"{e['id']} note"} for e in s.elements],
+    })
+
+
+def test_threats_get_stable_ids_and_slices_carry_context():
+    threats = assign_threats(PHASE1)
+    assert [(t.threat_id, t.element_id, t.stride) for t in threats] == [
+        ("TH-0001", "DS-001", "I"), ("TH-0002", "P-001", "S"), ("TH-0003", "P-001", "T")]
+    slices = plan_slices(PHASE1, threats)
+    assert [s.label for s in slices] == ["DS-001", "P-001"]
+    assert slices[1].boundaries == [{"id": "TB-001", "name": "Edge"}]
+    assert len(slices[1].flows) == 2
+
+
+def test_parse_slice_rejects_incomplete_ratings():
+    s = plan_slices(PHASE1, assign_threats(PHASE1))[1]
+    partial = json.loads(_answer(s))
+    partial["ratings"][0]["dread"]["damage"] = 11
+    with pytest.raises(ValueError, match="TH-0002"):
+        parse_slice(json.dumps(partial), s)
+
+
+@pytest.mark.asyncio
+async def test_only_failed_slices_are_retried_and_result_is_schema_valid():
+    slices = plan_slices(PHASE1, assign_threats(PHASE1))
+    calls, in_flight, peak = [], 0, 0
+
+    async def ask(s, attempt):
+        nonlocal in_flight, peak
+        calls.append((s.label, attempt))
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return "not json" if (s.label == "P-001" and attempt == 1) else _answer(s, factor=8 if s.label == "P-001" else 2)
+
+    results, failures = await run_slices(slices, ask, concurrency=1, attempts=2)
+    assert not failures and peak == 1
+    assert calls == [("DS-001", 1), ("P-001", 1), ("P-001", 2)]
+
+    doc = assemble(PHASE1, slices, results)
+    assert validate(doc, "phase2") == []
+    assert check_structure(doc, PHASE1) == []
+    assert [(r["threat_id"], r["score"], r["severity"]) for r in doc["dread"]["ratings"]] == [
+        ("TH-0001", 10, "Low"), ("TH-0002", 40, "Critical"), ("TH-0003", 40, "Critical")]
+    [mitigation] = doc["mitigations"]["items"]  # same title from both slices is merged
+    assert mitigation["threat_ids"] == ["TH-0001", "TH-0002", "TH-0003"] and mitigation["nist_csf"] == ["PR.AC-1"]
+    [annotated] = doc["annotated_dfds"]
+    assert [a["target_id"] for a in annotated["annotations"]] == ["P-001", "DS-001"]
@@ -0,0 +1,90 @@
+import json
+import pytest
+
+from myagents.pipeline_runner import PipelineRunner, Stage, folder_fingerprint
+
+
+def _stages(calls, prompt="P1"):
+    async def parse(folder):
+        calls.append("parse")
+        return f"TEXT({folder})"
+
+    async def phase1(parse, prompt):
+        calls.append("phase1")
+        return f"{prompt}:{parse}"
+
+    async def report(phase1):
+        calls.append("report")
+        return f"<html>{phase1}</html>"
+
+    return [
+        Stage("parse", parse, params={"folder": "design"}),
+        Stage("phase1", phase1, deps=("parse",), params={"prompt": prompt}),
+        Stage("report", report, deps=("phase1",)),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_unchanged_inputs_reuse_checkpoints(tmp_path):
+    calls = []
+    first = await PipelineRunner(tmp_path, _stages(calls)).run()
+    assert calls == ["parse", "phase1", "report"]
+    assert (tmp_path / "02_phase1" / "output.txt").read_text(encoding="utf-8") == first["phase1"]
+
+    calls.clear()
+    second = await PipelineRunner(tmp_path, _stages(calls)).run()
+    assert calls == []
+    assert second == first
+
+
+@pytest.mark.asyncio
+async def test_changed_params_rerun_only_downstream(tmp_path):
+    calls = []
+    await PipelineRunner(tmp_path, _stages(calls)).run()
+    calls.clear()
+    out = await PipelineRunner(tmp_path, _stages(calls, prompt="P2")).run()
+    assert calls == ["phase1", "report"]
+    assert out["report"] == "<html>P2:TEXT(design)</html>"
+
+
+@pytest.mark.asyncio
+async def test_resume_from_forces_rerun(tmp_path):
+    calls = []
+    await PipelineRunner(tmp_path, _stages(calls)).run()
+    calls.clear()
+    await PipelineRunner(tmp_path, _stages(calls), resume_from="phase1").run()
+    assert calls == ["phase1", "report"]
+
+    with pytest.raises(ValueError):
+        PipelineRunner(tmp_path, _stages(calls), resume_from="phase9")
+
+
+@pytest.mark.asyncio
+async def test_corrupted_checkpoint_is_recomputed(tmp_path):
+    calls = []
+    runner = PipelineRunner(tmp_path, _stages(calls))
+    await runner.run()
+    (runner.stage_dir("phase1") / "output.txt").write_text("truncat", encoding="utf-8")
+
+    calls.clear()
+    out = await PipelineRunner(tmp_path, _stages(calls)).run()
+    assert calls == ["phase1"]  # report's input hash matches once phase1 is restored
+    assert out["phase1"] == "P1:TEXT(design)"
+    assert runner.recorded_param("parse", "folder") == "design"
+    meta = json.loads((runner.stage_dir("phase1") / "meta.json").read_text(encoding="utf-8"))
+    assert meta["stage"] == "phase1"
+
+
+def test_folder_fingerprint_tracks_changes(tmp_path):
+    (tmp_path / "a.md").write_text("one", encoding="utf-8")
+    before = folder_fingerprint(tmp_path)
+    (tmp_path / "a.md").write_text("one two", encoding="utf-8")
+    assert folder_fingerprint(tmp_path) != before
+
+
+def test_folder_fingerprint_skips_ignored_outputs(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"png")
+    before = folder_fingerprint(tmp_path, ignore=lambda f: f.suffix == ".mmd")
+    (tmp_path / "a.mmd").write_text("flowchart TD", encoding="utf-8")
+    assert folder_fingerprint(tmp_path, ignore=lambda f: f.suffix == ".mmd") == before
+    assert folder_fingerprint(tmp_path) != before
@@ -0,0 +1,66 @@
+from myagents.pre_evaluator import check_structure
+
+
+def _row(element, letter, applies=False, example="", etype="process"):
+    return {"element_id": element, "element_type": etype, "stride": letter, "applies": applies, "example": example}
+
+
+PHASE1 = {
+    "trust_boundaries": {"boundaries": [{"id": "TB-001", "name": "Edge", "elements": ["EXT-001", "P-001"]}]},
+    "dfds": {"dfds": [{"id": "DFD-001", "boundaries": ["TB-001"],
+                       "nodes": [{"id": "EXT-001", "type": "external_entity", "label": "User"},
+                                 {"id": "P-001", "type": "process", "label": "API"}],
+                       "edges": [{"from": "EXT-001", "to": "P-001", "label": "HTTPS"}]}]},
+    "stride_matrix": {"coverage_pct": 100.0, "rows": (
+        [_row("EXT-001", c, etype="external_entity") for c in "STRIDE"]
+        + [_row("P-001", c, applies=c in "ST", example=f"{c} threat") for c in "STRIDE"])},
+}
+
+
+def _issues(doc, reference=None):
+    return [(s["category"], s["id_or_location"]) for s in check_structure(doc, reference)]
+
+
+def test_consistent_phase1_output_passes():
+    assert check_structure(PHASE1) == []
+
+
+def test_phase1_structural_defects_are_reported():
+    doc = {
+        "trust_boundaries": {"boundaries": [{"id": "TB-001", "elements": ["P-001", "DS-009"]}]},
+        "dfds": {"dfds": [{"id": "DFD-001", "boundaries": ["TB-002"],
+                           "nodes": [{"id": "P-001", "type": "process", "label": "API"}],
+                           "edges": [{"from": "EXT-001", "to": "P-001", "label": "x"}]}]},
+        "stride_matrix": {"coverage_pct": 100, "rows": [
+            _row("P-001", "S", True, "Token replay"), _row("P-001", "S"),
+            _row("P-001", "T", True, "token replay", etype="data_store"), _row("P-002", "S")]},
+    }
+    issues = _issues(doc)
+    assert ("dfd", "DFD-001 edge EXT-001->P-001") in issues
+    assert ("dfd", "DFD-001") in issues
+    assert ("trust_boundary", "TB-001") in issues
+    assert ("stride", "P-002") in issues                          # dangling element
+    assert issues.count(("stride", "P-001")) == 2                 # duplicate S rows + missing R, I, D, E
+    assert ("stride", "P-001/T") in issues                        # wrong element_type and copy-pasted threat
+    assert ("stride", "stride_matrix.coverage_pct") in issues
+
+
+def test_phase2_checks_use_phase1_as_reference():
+    doc = {
+        "dread": {"ratings": [
+            {"threat_id": "TH-0001", "element_id": "P-001", "stride": "S", "score": 30, "severity": "High",
+             "dread": {"damage": 5, "reproducibility": 5, "exploitability": 5, "affected_users": 5, "discoverability": 5}},
+            {"threat_id": "TH-0002", "element_id": "P-001", "stride": "R", "score": 0, "severity": "Info",
+             "dread": {"damage": 0, "reproducibility": 0, "exploitability": 0, "affected_users": 0, "discoverability": 0}},
+        ]},
+        "mitigations": {"items": [{"id": "MIT-0001", "threat_ids": ["TH-0001", "TH-0009"], "dependencies": []}]},
+        "annotated_dfds": [{"dfd_id": "DFD-001", "annotations": [
+            {"annotation_id": "AN-0001", "target_id": "P-404", "threat_ids": ["TH-0001"]}]}],
+    }
+    issues = _issues(doc, PHASE1)
+    assert ("dread", "TH-0001") in issues                          # 25 is High, not 30
+    assert ("dread", "TH-0002") in issues                          # R does not apply to P-001
+    assert ("mitigation", "MIT-0001") in issues
+    assert ("mitigation", "TH-0002") in issues                     # unmitigated
+    assert ("annotation", "AN-0001") in issues
+    assert not any(cat == "stride" for cat, _ in issues)          # phase 1 sections are not re-checked
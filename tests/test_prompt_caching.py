@@ -0,0 +1,41 @@
+from myagents.llm_model import LLMModel, cacheable, text_block
+from myagents.response_cache import ResponseCache
+from myagents.context_builder import count_message_tokens
+
+
+def _model(model_type, **kwargs):
+    return LLMModel(model_name="m", api_key="sk-test-1234567890", model_type=model_type, **kwargs)
+
+
+MESSAGES = [
+    {"role": "system", "content": "SYSTEM RULES"},
+    {"role": "user", "content": [cacheable("SCHEMAS + REQUIREMENTS"), text_block("\n\nround 2 suggestions")]},
+]
+
+
+def test_openai_payload_flattens_blocks_and_keys_on_stable_prefix():
+    model = _model("openai")
+    payload = model._openai_messages(MESSAGES)
+    assert payload[1]["content"] == "SCHEMAS + REQUIREMENTS\n\nround 2 suggestions"
+
+    key = model._openai_cache_params(MESSAGES)["extra_body"]["prompt_cache_key"]
+    other_round = [MESSAGES[0], {"role": "user", "content": [cacheable("SCHEMAS + REQUIREMENTS"), text_block("x")]}]
+    assert model._openai_cache_params(other_round)["extra_body"]["prompt_cache_key"] == key
+    assert _model("deepseek")._openai_cache_params(MESSAGES) == {}
+    assert _model("openai", prompt_caching=False)._openai_cache_params(MESSAGES) == {}
+
+
+def test_claude_payload_marks_system_and_keeps_user_breakpoint():
+    kwargs = _model("anthropic")._claude_payload(MESSAGES)
+    assert kwargs["system"] == [cacheable("SYSTEM RULES")]
+    assert kwargs["messages"][0]["content"][0]["cache_control"] == {"type": "ephemeral"}
+
+    plain = _model("anthropic", prompt_caching=False)._claude_payload(MESSAGES)
+    assert plain["system"] == "SYSTEM RULES"
+    assert plain["messages"][0]["content"] == "SCHEMAS + REQUIREMENTS\n\nround 2 suggestions"
+
+
+def test_cache_hints_do_not_change_response_cache_keys_or_size_estimates():
+    as_string = [MESSAGES[0], {"role": "user", "content": "SCHEMAS + REQUIREMENTS\n\nround 2 suggestions"}]
+    assert ResponseCache.make_key("m", "openai", MESSAGES) == ResponseCache.make_key("m", "openai", as_string)
+    assert count_message_tokens(MESSAGES) == count_message_tokens(as_string)
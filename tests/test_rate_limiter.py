@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+import pytest
+
+from myagents.llm_model import LLMModel, cacheable, text_block
+from myagents.rate_limiter import (
+    RateLimiter, RateLimiterRegistry, RetryPolicy, TokenBucket, is_retryable, parse_limit, retry_after_seconds,
+)
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+        self.response = SimpleNamespace(status_code=status, headers=headers or {})
+
+
+class FlakyModel(LLMModel):
+    """Fails with the queued errors before answering."""
+    def __init__(self, errors, **kwargs):
+        super().__init__(model_name="m", api_key="sk-test-1234567890", **kwargs)
+        self.errors = list(errors)
+        self.attempts = 0
+
+    async def _dispatch_messages(self, messages):
+        self.attempts += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_classifies_errors_and_reads_retry_after():
+    assert is_retryable(FakeAPIError(429))
+    assert is_retryable(FakeAPIError(529))
+    assert not is_retryable(FakeAPIError(400))
+    assert not is_retryable(ValueError("bad prompt"))
+    assert retry_after_seconds(FakeAPIError(429, {"retry-after": "7"})) == 7.0
+    assert retry_after_seconds(FakeAPIError(429, {"retry-after-ms": "250"})) == 0.25
+    assert retry_after_seconds(FakeAPIError(429)) is None
+
+
+def test_token_bucket_wait_time():
+    bucket = TokenBucket(capacity=60, rate=1.0, updated=0.0)
+    assert bucket.wait_time(60, now=0.0) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(10, now=4.0) == pytest.approx(6.0)
+    assert bucket.wait_time(500, now=4.0) == pytest.approx(56.0)  # capped at capacity
+
+
+@pytest.mark.asyncio
+async def test_retries_transient_errors_and_adapts_rate(monkeypatch):
+    monkeypatch.setattr("myagents.llm_model.asyncio.sleep", _no_sleep)
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=600_000)
+    model = FlakyModel([FakeAPIError(429, {"retry-after": "1"}), FakeAPIError(503)],
+                       rate_limiter=limiter, retry_policy=RetryPolicy(base_delay=0.0))
+
+    assert await model.callwithmessages([{"role": "user", "content": "hi"}]) == "ok"
+    assert model.attempts == 3
+    assert limiter.throttled == 1
+    assert limiter.fraction == pytest.approx(0.55)  # halved by the 429, +5% on success
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_errors_and_exhausted_attempts_raise(monkeypatch):
+    monkeypatch.setattr("myagents.llm_model.asyncio.sleep", _no_sleep)
+    bad_request = FlakyModel([FakeAPIError(400)], retry_policy=RetryPolicy(base_delay=0.0))
+    with pytest.raises(FakeAPIError):
+        await bad_request.callwithmessages([])
+    assert bad_request.attempts == 1
+
+    overloaded = FlakyModel([FakeAPIError(529)] * 5, retry_policy=RetryPolicy(max_attempts=3, base_delay=0.0))
+    with pytest.raises(FakeAPIError):
+        await overloaded.callwithmessages([])
+    assert overloaded.attempts == 3
+
+
+def test_registry_shares_limiters_per_model():
+    reg = RateLimiterRegistry(limits={"openai": (100, None), "openai/gpt-5": (10, 1000)})
+    assert reg.get("openai", "gpt-5") is reg.get("openai", "gpt-5")
+    assert reg.get("openai", "gpt-5").requests_per_minute == 10
+    assert reg.get("openai", "gpt-4o").requests_per_minute == 100
+    assert reg.get("unknown", "x").requests_per_minute is None
+
+
+def test_rate_limits_are_overridable_per_provider_or_model():
+    assert parse_limit("anthropic=50:80000") == ("anthropic", (50.0, 80000.0))
+    assert parse_limit("openai/gpt-5=500:") == ("openai/gpt-5", (500.0, None))
+    with pytest.raises(ValueError):
+        parse_limit("anthropic=fast")
+    reg = RateLimiterRegistry.with_overrides(["anthropic=50:80000"])
+    assert reg.get("anthropic", "claude").tokens_per_minute == 80000
+    assert reg.get("openai", "gpt-5").requests_per_minute == 500  # defaults kept
+
+
+def test_tpm_charge_counts_text_and_cached_prefixes_once():
+    prefix = "R" * 4000
+    messages = [{"role": "system", "content": "S" * 400},
+                {"role": "user", "content": [cacheable(prefix), text_block("T" * 400)]}]
+    claude = LLMModel(model_name="m", api_key="sk-test-1234567890", model_type="anthropic",
+                      rate_limiter=RateLimiter())
+    assert claude._budget_tokens(messages) == 1200   # text only: no JSON escaping or cache_control
+    assert claude._budget_tokens(messages) == 200    # cache read: prefix not charged again
+    gpt = LLMModel(model_name="m", api_key="sk-test-1234567890", rate_limiter=RateLimiter())
+    assert gpt._budget_tokens(messages) == gpt._budget_tokens(messages) == 1200
+
+
+async def _no_sleep(_delay):
+    return None
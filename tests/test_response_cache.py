@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from myagents.llm_model import LLMModel
+from myagents.response_cache import ResponseCache
+
+
+def _messages(text: str):
+    return [{"role": "system", "content": "sys"}, {"role": "user", "content": text}]
+
+
+def test_key_ignores_cosmetic_whitespace_but_not_content():
+    a = ResponseCache.make_key("gpt-5", "openai", _messages("hello\r\nworld  "))
+    b = ResponseCache.make_key("gpt-5", "openai", _messages("hello\nworld"))
+    c = ResponseCache.make_key("gpt-5", "openai", _messages("hello there"))
+    d = ResponseCache.make_key("gpt-5", "openai", _messages("hello\nworld"), {"max_tokens": 10})
+    assert a == b
+    assert a != c
+    assert a != d
+
+
+def test_get_put_counts_and_ttl(tmp_path):
+    cache = ResponseCache(path=tmp_path / "c.sqlite3", ttl_seconds=60)
+    assert cache.get("k") is None
+    cache.put("k", "value")
+    assert cache.get("k") == "value"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.ttl_seconds = 0
+    time.sleep(0.01)
+    assert cache.get("k") is None
+    cache.close()
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    cache = ResponseCache(path=tmp_path / "c.sqlite3", max_bytes=10)
+    cache.put("a", "aaaa")
+    time.sleep(0.01)
+    cache.put("b", "bbbb")
+    time.sleep(0.01)
+    assert cache.get("a") == "aaaa"  # refresh a
+    time.sleep(0.01)
+    cache.put("c", "cccc")           # over budget -> evict b
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.evictions == 1
+    cache.close()
+
+
+def test_bypass_skips_reads_but_writes_through(tmp_path):
+    cache = ResponseCache(path=tmp_path / "c.sqlite3", bypass=True)
+    cache.put("k", "v")
+    assert cache.get("k") is None
+    cache.bypass = False
+    assert cache.get("k") == "v"
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_llm_model_serves_second_call_from_cache(tmp_path, monkeypatch):
+    cache = ResponseCache(path=tmp_path / "c.sqlite3")
+    model = LLMModel(model_name="gpt-5", api_key="sk-test-1234567890", response_cache=cache)
+    calls = []
+
+    async def fake_dispatch(messages):
+        calls.append(messages)
+        return "RESULT"
+
+    monkeypatch.setattr(model, "_dispatch_messages", fake_dispatch)
+    assert await model.callwithmessages(_messages("x")) == "RESULT"
+    assert await model.callwithmessages(_messages("x")) == "RESULT"
+    assert len(calls) == 1
+    cache.close()
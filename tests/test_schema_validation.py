@@ -0,0 +1,55 @@
+import json
+
+from myagents.schema_validation import check_output, repair_json, response_format, validate, validator_for
+
+PHASE2 = {
+    "dread": {"schema_version": "1.0", "run_id": "r1", "ratings": []},
+    "annotated_dfds": [],
+    "mitigations": {"schema_version": "1.0", "run_id": "r1", "items": []},
+}
+
+
+def test_validators_are_compiled_once_and_cached():
+    assert validator_for("phase1") is validator_for("phase1")
+    assert validate(PHASE2, "phase2") == []
+
+
+def test_errors_point_at_the_offending_field():
+    doc = {"trust_boundaries": {"schema_version": "2.0", "run_id": "r1", "evidence": [],
+                                "boundaries": [{"id": "TB-1", "name": "Net", "description": "x" * 401,
+                                                "elements": ["P-001", 7]}]},
+           "dfds": [], "stride_matrix": {}}
+    errors = validate(doc, "phase1")
+    assert "/trust_boundaries/schema_version: must be '1.0'" in errors
+    assert any(e.startswith("/trust_boundaries/boundaries/0/id:") for e in errors)
+    assert "/trust_boundaries/boundaries/0/description: longer than 400 characters" in errors
+    assert "/trust_boundaries/boundaries/0/elements/1: expected string, got int" in errors
+    assert "/dfds: expected object, got list" in errors
+    assert "/stride_matrix: missing required 'rows'" in errors
+
+
+def test_repair_handles_fences_prose_and_trailing_commas():
+    assert repair_json('```json\n{"a": 1}\n```') == ({"a": 1}, ["code fence"])
+    assert repair_json('Here it is: {"a": "}", "b": [1, 2,],} Hope this helps!') == (
+        {"a": "}", "b": [1, 2]}, ["surrounding prose", "trailing commas"])
+    assert repair_json("no json here") == (None, [])
+
+
+def test_check_output_fills_constants_and_reports_remaining_errors():
+    doc = json.loads(json.dumps(PHASE2))
+    del doc["dread"]["schema_version"]
+    result = check_output("```\n" + json.dumps(doc) + "\n```", "phase2")
+    assert result.ok and result.doc["dread"]["schema_version"] == "1.0"
+    assert result.repairs == ["code fence", "filled 1 constant field(s)"]
+
+    del doc["mitigations"]["items"]
+    bad = check_output(json.dumps(doc), "phase2")
+    assert not bad.ok and bad.errors == ["/mitigations: missing required 'items'"]
+
+
+def test_response_format_is_self_contained():
+    fmt = response_format("phase2")
+    blob = json.dumps(fmt)
+    assert fmt["name"] == "phase2" and "$ref" not in blob and "$schema" not in blob
+    assert fmt["schema"]["properties"]["annotated_dfds"]["items"]["title"] == "AnnotatedDFDs"
+    assert response_format("suggestions.schema.json")["name"] == "suggestions"
@@ -13,7 +13,7 @@ class DummyDiagramToMermaidConverter:
         self.model_name = model_name
 
 class DummyDocumentParser:
-    def __init__(self, converter):
+    def __init__(self, converter, **kwargs):
         self.converter = converter
         self._parsed_folder = None
         self._text = "DESIGN_TEXT"
@@ -131,3 +131,292 @@ def test_run_once_invokes_async_entrypoint(monkeypatch, capsys, stub_config):
         assert "run_once(): calling model for a joke" in out
     finally:
         monkeypatch.setattr(asyncio, "run", real_asyncio_run)
+
+class StreamingDummyModel:
+    def __init__(self, model_name, chunks, fail_stream=False):
+        self.model_name = model_name
+        self._chunks = chunks
+        self._fail_stream = fail_stream
+
+    def short_id(self) -> str:
+        return "sk-..."
+
+    async def stream_with_messages(self, messages):
+        if self._fail_stream:
+            raise RuntimeError("stream not allowed")
+        for c in self._chunks:
+            yield c
+
+    async def callwithmessages(self, messages):
+        return "".join(self._chunks)
+
+@pytest.mark.asyncio
+async def test_call_models_streams_records_and_falls_back(monkeypatch, stub_config):
+    import myagents.simplified_sdra as sdra_mod
+    monkeypatch.setattr(sdra_mod, "load_config", lambda: stub_config)
+    agent = SimplifiedSecurityDesignReviewAgent()
+
+    doc = '{"stride_matrix": {"rows": [{"element_id": "P-001", "stride": "S"}, {"element_id": "P-001", "stride": "T"}]}}'
+    chunks = [doc[i:i + 10] for i in range(0, len(doc), 10)]
+    models = [StreamingDummyModel("a", chunks), StreamingDummyModel("b", chunks, fail_stream=True)]
+    seen = []
+    outputs = await agent.call_models([], models, on_record=lambda name, rec: seen.append((name, rec.value["stride"])))
+
+    assert outputs == [doc, doc]
+    assert seen == [("a", "S"), ("a", "T")]
+
+class FailingDummyModel(StreamingDummyModel):
+    async def callwithmessages(self, messages):
+        raise RuntimeError("quota exhausted")
+
+@pytest.mark.asyncio
+async def test_call_models_drops_failed_models(monkeypatch, stub_config):
+    import myagents.simplified_sdra as sdra_mod
+    monkeypatch.setattr(sdra_mod, "load_config", lambda: stub_config)
+    agent = SimplifiedSecurityDesignReviewAgent()
+    agent.stream_outputs = False
+
+    ok = StreamingDummyModel("ok", ['{"a": 1}'])
+    bad = FailingDummyModel("bad", [])
+    assert await agent.call_models([], [ok, bad]) == ['{"a": 1}']
+    with pytest.raises(RuntimeError, match="All models failed: bad"):
+        await agent.call_models([], [bad])
+
+class ScriptedModel(StreamingDummyModel):
+    """Answers round 1 with a full document and later rounds with patches."""
+    def __init__(self, model_name, full, patch):
+        super().__init__(model_name, [])
+        self.full, self.patch, self.prompts = full, patch, []
+
+    async def callwithmessages(self, messages):
+        text = "".join(b["text"] for b in messages[-1]["content"])
+        self.prompts.append(text)
+        return self.patch if "PATCH MODE" in text else self.full
+
+@pytest.mark.asyncio
+async def test_eval_suggest_improve_applies_patches_in_later_rounds(monkeypatch, stub_config):
+    import json
+    import myagents.simplified_sdra as sdra_mod
+    monkeypatch.setattr(sdra_mod, "load_config", lambda: stub_config)
+    agent = SimplifiedSecurityDesignReviewAgent()
+    agent.stream_outputs = False
+    agent.requirements = "REQ"
+
+    full = json.dumps({"trust_boundaries": {"boundaries": [{"id": "TB-001", "name": "Net", "description": "x"}]}})
+    patch = json.dumps({"patches": [{"op": "replace", "path": "/trust_boundaries/boundaries/[id=TB-001]/description",
+                                     "value": "Internet to DMZ"}]})
+    model = ScriptedModel("m", full, patch)
+    verdicts = iter(['[{"category": "trust_boundary", "id_or_location": "TB-001", "issue": "vague"}]', "None"])
+
+    async def fake_evaluate(merged):
+        return next(verdicts)
+    monkeypatch.setattr(agent, "evaluate_merged_output", fake_evaluate)
+
+    result = json.loads(await agent.eval_suggest_improve("SYS", "USER", [model]))
+    assert result["trust_boundaries"]["boundaries"][0]["description"] == "Internet to DMZ"
+    assert len(model.prompts) == 2 and "PATCH MODE" in model.prompts[1]
+
+class RepairingModel(StreamingDummyModel):
+    """Returns an invalid document first and the fixed one when shown its errors."""
+    def __init__(self, model_name, bad, good):
+        super().__init__(model_name, [])
+        self.bad, self.good, self.calls = bad, good, []
+
+    async def callwithmessages(self, messages):
+        self.calls.append(messages)
+        return self.good if messages and messages[-1]["role"] == "user" and "schemas" in messages[-1]["content"] else self.bad
+
+@pytest.mark.asyncio
+async def test_call_models_validates_and_rerequests_invalid_outputs(monkeypatch, stub_config):
+    import json
+    import myagents.simplified_sdra as sdra_mod
+    monkeypatch.setattr(sdra_mod, "load_config", lambda: stub_config)
+    agent = SimplifiedSecurityDesignReviewAgent()
+    agent.stream_outputs = False
+
+    good = {"dread": {"schema_version": "1.0", "run_id": "r", "ratings": []}, "annotated_dfds": [],
+            "mitigations": {"schema_version": "1.0", "run_id": "r", "items": []}}
+    fixer = RepairingModel("fixer", '{"dread": {}}', "```json\n" + json.dumps(good) + "\n```")
+    stubborn = RepairingModel("stubborn", '{"dread": {}}', '{"dread": {}}')
+    outputs = await agent.call_models([{"role": "user", "content": "go"}], [fixer, stubborn], schema="phase2")
+
+    assert [json.loads(o) for o in outputs] == [good]
+    assert len(fixer.calls) == 2 and "missing required" in fixer.calls[1][-1]["content"]
+
+@pytest.mark.asyncio
+async def test_evaluate_merged_output_short_circuits_on_local_issues(monkeypatch, stub_config):
+    import json
+    import myagents.simplified_sdra as sdra_mod
+    monkeypatch.setattr(sdra_mod, "load_config", lambda: stub_config)
+    agent = SimplifiedSecurityDesignReviewAgent()
+    agent.requirements = "REQ"
+
+    def no_model(*args, **kwargs):
+        raise AssertionError("the LLM evaluator should not be called")
+    monkeypatch.setattr(agent, "make_model", no_model)
+
+    merged = json.dumps({"dfds": {"dfds": [{"id": "DFD-001", "nodes": [{"id": "P-001", "type": "process"}],
+                                            "edges": []}]},
+                         "stride_matrix": {"rows": [], "coverage_pct": 0}})
+    suggestions = json.loads(await agent.evaluate_merged_output(merged))
+    assert suggestions[0]["category"] == "stride" and suggestions[0]["id_or_location"] == "P-001"
+
+class SliceModel(StreamingDummyModel):
+    """Rates every threat in the slice it is sent."""
+    def __init__(self, model_name):
+        super().__init__(model_name, [])
+        self.slices, self.requirements = 0, []
+
+    async def callwithmessages(self, messages):
+        import json
+        self.slices += 1
+        self.requirements.append(messages[-1]["content"][0])
+        text = messages[-1]["content"][-1]["text"]
+        payload = json.loads(text[text.index("{"):text.rindex("}") + 1])
+        factors = dict.fromkeys(("damage", "reproducibility", "exploitability", "affected_users", "discoverability"), 3)
+        return json.dumps({"ratings": [{"threat_id": t["threat_id"], "dread": factors, "rationale": "r"}
+                                       for t in payload["threats"]]})
+
+@pytest.mark.asyncio
+async def test_phase2_fans_out_one_call_per_element(monkeypatch, stub_config):
+    import json
+    import myagents.simplified_sdra as sdra_mod
+    monkeypatch.setattr(sdra_mod, "load_config", lambda: stub_config)
+    agent = SimplifiedSecurityDesignReviewAgent()
+    agent.requirements = "REQ"
+    agent.phase1_output = json.dumps({
+        "dfds": {"dfds": [{"id": "DFD-001", "nodes": [{"id": "P-001", "type": "process"},
+                                                      {"id": "DS-001", "type": "data_store"}], "edges": []}]},
+        "stride_matrix": {"rows": [{"element_id": "P-001", "stride": "S", "applies": True},
+                                   {"element_id": "DS-001", "stride": "T", "applies": True}]},
+    })
+    models = [SliceModel("a"), SliceModel("b")]
+    monkeypatch.setattr(agent, "build_models", lambda: models)
+
+    doc = json.loads(await agent.run_phase2_dread_annotations_mitigations("SLICE SYSTEM"))
+    assert [r["threat_id"] for r in doc["dread"]["ratings"]] == ["TH-0001", "TH-0002"]
+    assert doc["dread"]["ratings"][0]["severity"] == "Low"
+    assert [m.slices for m in models] == [1, 1]
+    assert all("cache_control" in m.requirements[0] for m in models)  # verbatim requirements stay cacheable
+
+@pytest.mark.asyncio
+async def test_phase2_retrieves_requirements_per_slice(monkeypatch, stub_config):
+    import json
+    import myagents.simplified_sdra as sdra_mod
+    monkeypatch.setattr(sdra_mod, "load_config", lambda: stub_config)
+    agent = SimplifiedSecurityDesignReviewAgent()
+    agent.requirements = ("[FILE] auth.md\nThe login gateway checks passwords and issues tokens.\n"
+                          "[FILE] storage.md\nThe ledger database keeps encrypted invoices.\n"
+                          "[FILE] ops.md\nBackups run nightly.\n")
+    agent.context_budgets = {**agent.context_budgets, "phase2": 20}
+    agent.phase1_output = json.dumps({
+        "dfds": {"dfds": [{"id": "DFD-001", "nodes": [{"id": "P-001", "type": "process", "label": "login gateway"},
+                                                      {"id": "DS-001", "type": "data_store", "label": "ledger database"}],
+                           "edges": []}]},
+        "stride_matrix": {"rows": [{"element_id": "P-001", "stride": "S", "applies": True},
+                                   {"element_id": "DS-001", "stride": "T", "applies": True}]},
+    })
+    models = [SliceModel("a"), SliceModel("b")]
+    monkeypatch.setattr(agent, "build_models", lambda: models)
+
+    await agent.run_phase2_dread_annotations_mitigations("SLICE SYSTEM")
+    gateway, ledger = sorted((m.requirements[0] for m in models), key=lambda b: "passwords" not in b["text"])
+    assert "passwords" in gateway["text"] and "invoices" not in gateway["text"]
+    assert "invoices" in ledger["text"] and "passwords" not in ledger["text"]
+    assert "cache_control" not in gateway and "cache_control" not in ledger
+
+class ShardingModel(StreamingDummyModel):
+    """Answers the inventory pass with a fixed inventory and each shard with full STRIDE rows."""
+    def __init__(self, model_name, inventory):
+        super().__init__(model_name, [])
+        self.inventory, self.shards = inventory, 0
+
+    async def callwithmessages(self, messages):
+        import json
+        content = messages[-1]["content"]
+        if isinstance(content, str):
+            return json.dumps(self.inventory)
+        self.shards += 1
+        text = content[-1]["text"]
+        payload = json.loads(text[text.index("{"):text.rindex("}") + 1])
+        return json.dumps({"rows": [{"element_id": e["id"], "stride": c, "applies": False, "example": "n/a"}
+                                    for e in payload["elements"] for c in "STRIDE"]})
+
+@pytest.mark.asyncio
+async def test_phase1_sharded_inventory_then_stride_per_boundary(monkeypatch, stub_config, tmp_path):
+    import json
+    import myagents.simplified_sdra as sdra_mod
+    monkeypatch.setattr(sdra_mod, "load_config", lambda: stub_config)
+    agent = SimplifiedSecurityDesignReviewAgent()
+    agent.stream_outputs = False
+    agent.requirements = "REQ"
+    agent.phase1_sharding = "on"
+    agent.output_dir = tmp_path
+
+    inventory = {
+        "trust_boundaries": {"schema_version": "1.0", "run_id": "r", "evidence": [], "boundaries": [
+            {"id": "TB-001", "name": "Edge", "description": "d", "elements": ["EXT-001", "P-001"]},
+            {"id": "TB-002", "name": "Data", "description": "d", "elements": ["DS-001"]}]},
+        "dfds": {"schema_version": "1.0", "run_id": "r", "dfds": [{
+            "id": "DFD-001", "title": "t", "mermaid": "graph", "boundaries": ["TB-001", "TB-002"],
+            "nodes": [{"id": "EXT-001", "type": "external_entity", "label": "U"},
+                      {"id": "P-001", "type": "process", "label": "API"},
+                      {"id": "DS-001", "type": "data_store", "label": "DB"}],
+            "edges": [{"from": "EXT-001", "to": "P-001", "label": "req"}, {"from": "P-001", "to": "DS-001", "label": "q"}]}]},
+    }
+    models = [ShardingModel("a", inventory), ShardingModel("b", inventory)]
+    monkeypatch.setattr(agent, "build_models", lambda: models)
+
+    doc = json.loads(await agent.run_phase1_trust_dfd_stride("SYS", "USER <<REQUIREMENTS_AND_DESIGN_TEXT>>",
+                                                             ("INV SYS", "INV <<REQUIREMENTS_AND_DESIGN_TEXT>>"), "SHARD"))
+    assert len(doc["stride_matrix"]["rows"]) == 18 and doc["stride_matrix"]["coverage_pct"] == 100.0
+    assert [m.shards for m in models] == [1, 1]
+
+@pytest.mark.asyncio
+async def test_call_stage_falls_back_to_the_next_routed_model(monkeypatch, stub_config):
+    import myagents.simplified_sdra as sdra_mod
+    from myagents.model_router import StageRoute
+    monkeypatch.setattr(sdra_mod, "load_config", lambda: stub_config)
+    agent = SimplifiedSecurityDesignReviewAgent()
+    agent.router.routes["merge"] = StageRoute(["openai:broken", "anthropic:no-key", "openai:works"])
+
+    def make_model(name, api_key, model_type="openai"):
+        return FailingDummyModel(name, []) if name == "broken" else StreamingDummyModel(name, [name])
+    monkeypatch.setattr(agent, "make_model", make_model)
+
+    assert await agent.call_stage("merge", []) == "works"
+    assert [m.model_name for m in agent.models_for("fanout")] == ["gpt-5"]  # no anthropic key configured
+
+@pytest.mark.asyncio
+async def test_llm_merge_embeds_payloads_verbatim_and_returns_structured_json(monkeypatch, stub_config, tmp_path):
+    import json
+    import myagents.simplified_sdra as sdra_mod
+    monkeypatch.setattr(sdra_mod, "load_config", lambda: stub_config)
+    agent = SimplifiedSecurityDesignReviewAgent()
+    agent.output_dir = tmp_path
+    sent = {}
+
+    async def call_stage(stage, messages, schema=None):
+        sent.update(stage=stage, schema=schema, prompt=messages[-1]["content"])
+        return {"dfds": {"dfds": []}}
+    monkeypatch.setattr(agent, "call_stage", call_stage)
+
+    merged = await agent.merge_outputs(['{"dfds": {"dfds": []}}', "not json"], schema="phase1")
+    assert json.loads(merged) == {"dfds": {"dfds": []}}
+    assert sent["schema"] == "phase1" and '-- JSON #1 --\n{"dfds":{"dfds":[]}}' in sent["prompt"]
+    assert "-- JSON #2 --\nnot json" in sent["prompt"]
+
+def test_router_is_built_lazily_from_the_runs_next_to_output_dir(monkeypatch, stub_config, tmp_path):
+    import json
+    import myagents.simplified_sdra as sdra_mod
+    monkeypatch.setattr(sdra_mod, "load_config", lambda: stub_config)
+    monkeypatch.chdir(tmp_path)  # a runs/ folder in the working directory must not be read
+    (tmp_path / "runs" / "old").mkdir(parents=True)
+    (tmp_path / "runs" / "old" / "analytics_manifest.json").write_text(json.dumps({"calls": [{"model": "cwd"}]}))
+    (tmp_path / "out" / "prev").mkdir(parents=True)
+    (tmp_path / "out" / "prev" / "analytics_manifest.json").write_text(json.dumps({"calls": [{"model": "gpt-5"}]}))
+
+    agent = SimplifiedSecurityDesignReviewAgent()
+    assert agent._router is None and agent.router.history == []
+    agent = SimplifiedSecurityDesignReviewAgent(output_dir=tmp_path / "out" / "this-run")
+    assert [c["model"] for c in agent.router.history] == ["gpt-5"]
@@ -0,0 +1,77 @@
+import json
+from types import SimpleNamespace
+import pytest
+
+from myagents.llm_model import LLMModel, _note_usage
+from myagents.rate_limiter import RetryPolicy
+from myagents.response_cache import ResponseCache
+from myagents.telemetry import Telemetry, usage_counts
+
+
+class UsageModel(LLMModel):
+    def __init__(self, fail_first=False, **kwargs):
+        super().__init__(model_name="gpt-x", api_key="sk-test-1234567890", **kwargs)
+        self.fail_first = fail_first
+
+    async def _dispatch_messages(self, messages):
+        if self.fail_first:
+            self.fail_first = False
+            raise TimeoutError("slow")
+        _note_usage(SimpleNamespace(prompt_tokens=120, completion_tokens=30,
+                                    prompt_tokens_details=SimpleNamespace(cached_tokens=100)))
+        return "answer"
+
+
+def test_usage_counts_normalizes_providers():
+    assert usage_counts(SimpleNamespace(prompt_tokens=10, completion_tokens=5, prompt_tokens_details=None)) == \
+        {"prompt_tokens": 10, "completion_tokens": 5, "cached_tokens": 0}
+    anthropic = {"input_tokens": 20, "output_tokens": 7, "cache_read_input_tokens": 300,
+                 "cache_creation_input_tokens": 0}
+    assert usage_counts(anthropic) == {"prompt_tokens": 320, "completion_tokens": 7, "cached_tokens": 300}
+    assert usage_counts(None) == {}
+
+
+@pytest.mark.asyncio
+async def test_calls_are_recorded_with_phase_round_and_usage(tmp_path, monkeypatch):
+    monkeypatch.setattr("myagents.llm_model.asyncio.sleep", _no_sleep)
+    tel = Telemetry(export_spans=True)
+    cache = ResponseCache(path=tmp_path / "c.sqlite3")
+    model = UsageModel(fail_first=True, telemetry=tel, response_cache=cache, retry_policy=RetryPolicy(base_delay=0))
+    messages = [{"role": "user", "content": "q"}]
+
+    with tel.span("stage.phase1", phase="phase1"):
+        with tel.span("round", round=2):
+            assert await model.callwithmessages(messages) == "answer"
+            assert await model.callwithmessages(messages) == "answer"  # served from cache
+    cache.close()
+
+    first, second = tel.calls
+    assert (first.phase, first.round, first.retries, first.cache_hit) == ("phase1", 2, 1, False)
+    assert (first.prompt_tokens, first.completion_tokens, first.cached_tokens) == (120, 30, 100)
+    assert second.cache_hit and second.prompt_tokens == 0
+
+    summary = tel.summary()
+    assert summary["by_phase"]["phase1"]["calls"] == 2
+    assert summary["totals"]["retries"] == 1
+    assert "phase1" in summary["stages"]
+
+    manifest = json.loads(tel.write(tmp_path, folder="x").read_text(encoding="utf-8"))
+    assert manifest["folder"] == "x" and len(manifest["calls"]) == 2
+    spans = [json.loads(line) for line in (tmp_path / "spans.jsonl").read_text(encoding="utf-8").splitlines()]
+    by_name = {s["name"]: s for s in spans}
+    assert by_name["round"]["parentSpanId"] == by_name["stage.phase1"]["spanId"]
+    assert by_name["llm.chat"]["attributes"]["gen_ai.usage.input_tokens"] in (0, 120)
+    assert {s["traceId"] for s in spans} == {tel.trace_id}
+
+
+def test_failed_calls_are_marked():
+    tel = Telemetry()
+    with pytest.raises(RuntimeError):
+        with tel.observe_call("m", "openai", "chat"):
+            raise RuntimeError("boom")
+    assert tel.calls[0].ok is False and "boom" in tel.calls[0].error
+    assert tel.summary()["totals"]["failures"] == 1
+
+
+async def _no_sleep(_delay):
+    return None
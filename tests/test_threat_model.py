@@ -0,0 +1,55 @@
+import json
+
+from myagents.threat_model import ThreatModel, compact, dumps, loads, render
+
+DOC = {
+    "trust_boundaries": {"schema_version": "1.0", "run_id": "r1", "evidence": [], "boundaries": [
+        {"id": "TB-001", "name": "Edge", "description": "", "elements": ["EXT-001", "P-001"]},
+        {"id": "TB-002", "name": "Data", "description": "d", "elements": ["P-001", "DS-001"]}]},
+    "dfds": {"schema_version": "1.0", "run_id": "r1", "dfds": [{
+        "id": "DFD-001", "title": "t", "mermaid": "graph", "boundaries": ["TB-001"],
+        "nodes": [{"id": "EXT-001", "type": "external_entity", "label": "User"},
+                  {"id": "P-001", "type": "process", "label": "API"},
+                  {"id": "DS-001", "type": "data_store", "label": "DB"}],
+        "edges": [{"from": "EXT-001", "to": "P-001", "label": "login"},
+                  {"from": "P-001", "to": "DS-001", "label": "sql"},
+                  {"from": "P-001", "to": "P-001", "label": "loop"}]}]},
+    "stride_matrix": {"schema_version": "1.0", "run_id": "r1", "coverage_pct": 100, "rows": [
+        {"element_id": "P-001", "stride": "S", "applies": True, "example": "token replay"},
+        {"element_id": "DS-001", "stride": "I", "applies": False, "example": ""}]},
+    "dread": {"schema_version": "1.0", "run_id": "r1", "ratings": [
+        {"threat_id": "TH-0001", "element_id": "P-001", "stride": "S", "score": 30, "severity": "High",
+         "dread": {"damage": 6}}]},
+    "mitigations": {"schema_version": "1.0", "run_id": "r1", "items": [
+        {"id": "MIT-0001", "title": "MFA", "threat_ids": ["TH-0001"], "priority": 1, "effort": "M"}]},
+}
+
+
+def test_lookups_by_element_and_threat_id():
+    m = ThreatModel.from_dict(DOC)
+    assert m.element("P-001").label == "API" and m.element("P-999") is None
+    assert [(f.source, f.target) for f in m.flows_for(["P-001", "DS-001"])] == [
+        ("EXT-001", "P-001"), ("P-001", "DS-001"), ("P-001", "P-001")]
+    assert [b.id for b in m.boundaries_of("P-001")] == ["TB-001", "TB-002"]
+    assert [r.stride for r in m.stride_for("P-001")] == ["S"]
+    assert m.ratings["TH-0001"].severity == "High" and m.ratings_for("P-001")[0].score == 30
+    assert [x.id for x in m.mitigations_for("TH-0001")] == ["MIT-0001"]
+    assert m.run_id == "r1"
+    assert not hasattr(m.element("P-001"), "__dict__")  # slotted records
+
+
+def test_serialization_round_trips_and_tolerates_fences():
+    assert loads(dumps(DOC)) == DOC and loads(dumps(DOC, indent=False)) == DOC
+    assert loads("```json\n" + dumps(DOC) + "\n```") == DOC
+    assert ThreatModel.from_json("not json").doc == {}
+
+
+def test_render_strips_bookkeeping_and_empty_values():
+    text = render(json.dumps(DOC, indent=2))
+    doc = json.loads(text)
+    assert "schema_version" not in text and "run_id" not in text and "evidence" not in text
+    assert doc["trust_boundaries"]["boundaries"][0] == {"id": "TB-001", "name": "Edge", "elements": ["EXT-001", "P-001"]}
+    assert doc["stride_matrix"]["rows"][1] == {"element_id": "DS-001", "stride": "I", "applies": False}
+    assert len(text) < len(json.dumps(DOC, indent=2)) / 2
+    assert render("ERROR: no output") == "ERROR: no output"
+    assert compact({"a": {"b": None}}) == {}